@@ -1,5 +1,7 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
-from typing import List, Dict
+from fastapi import APIRouter, BackgroundTasks, File, Header, Query, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Literal, Optional
+import asyncio
 import os
 import uuid
 import shutil
@@ -12,155 +14,349 @@ import cv2
 import tempfile
 from PIL import Image
 from collections import Counter
+from app.core.config import settings
 from app.services.prediction_service import prediction_service
+from app.services.inference_executor import InferenceOverloadedError, inference_executor
+from app.services.video_analysis import analyze_video, create_dog_tracker, predict_tracked_frames
+from app.services.video_jobs import video_jobs
+from app.services.video_store import video_store
 
 router = APIRouter()
 
+# "full": las 3 arquitecturas; "adaptive": Keras V1 y EfficientNet solo si MobileNetV2 duda
+PredictionMode = Literal["full", "adaptive"]
+
+VIDEO_EXTENSIONS = [".mp4", ".mov", ".avi", ".gif"]
+
+async def run_inference(fn, *args, job_class: str = "photo", **kwargs):
+    """
+    Ejecuta una llamada de inferencia en el executor acotado, fuera del event loop.
+    Si está saturado responde 429 con Retry-After en lugar de encolar sin límite.
+    job_class ("photo", "batch", "video") separa la estimación de espera por tipo de trabajo.
+    """
+    try:
+        return await inference_executor.run(fn, *args, job_class=job_class, **kwargs)
+    except InferenceOverloadedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+def _save_upload(contents: bytes, filename: str):
+    """Guarda la imagen original para el historial. Se ejecuta en segundo plano, tras responder."""
+    try:
+        static_uploads_path = os.path.join("static", "uploads", "images")
+        os.makedirs(static_uploads_path, exist_ok=True)
+        with open(os.path.join(static_uploads_path, filename), "wb") as f:
+            f.write(contents)
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar la imagen {filename}: {e}")
+
+
 @router.post("/")
-async def predict_breed(file: UploadFile = File(...)):
+async def predict_breed(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    mode: PredictionMode = Query("full"),
+    multi_dog: bool = Query(False),
+    tta: bool = Query(False),
+    tta_views: Optional[int] = Query(None, ge=2, le=8)
+):
     """
     ENDPOINT PARA IMÁGENES:
     Devuelve la predicción de raza comparando 3 arquitecturas:
     MobileNetV2, Keras V1 y PyTorch (YOLOv8).
+    Con multi_dog=true clasifica todos los perros de la foto en un único batch
+    y devuelve también una entrada por caja en "dogs".
+    Con tta=true promedia K vistas aumentadas del recorte (tta_views, por defecto
+    TTA_VIEWS) y añade su coste en timing.tta.
     """
-    if not prediction_service.model_loaded:
-        prediction_service.load_model()
+    if tta and multi_dog:
+        raise HTTPException(status_code=400, detail="tta y multi_dog no se pueden combinar")
+    await asyncio.to_thread(prediction_service.ensure_loaded)
 
     # 1. Validar formato de imagen
     file_ext = os.path.splitext(file.filename)[1].lower()
     if file_ext not in [".jpg", ".jpeg", ".png", ".webp", ".bmp"]:
         raise HTTPException(status_code=400, detail="El archivo no es una imagen válida")
 
-    # 2. Crear ruta temporal
-    with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-        shutil.copyfileobj(file.file, tmp)
-        tmp_path = tmp.name
+    # 2. Leer la subida una sola vez y decodificarla en memoria (sin ficheros temporales)
+    contents = await file.read()
+    frame = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise HTTPException(status_code=400, detail="El archivo no es una imagen válida")
 
+    # 3. Llamar al servicio que gestiona todas las arquitecturas (Tu lógica)
+    # Se ejecuta en el executor de inferencia para no bloquear el event loop
     try:
-        # --- MEJORA: Guardar imagen permanentemente para el historial ---
-        static_uploads_path = os.path.join("static", "uploads", "images")
-        os.makedirs(static_uploads_path, exist_ok=True)
-        permanent_path = os.path.join(static_uploads_path, file.filename)
-        shutil.copy2(tmp_path, permanent_path)
-
-        # 3. Llamar al servicio que gestiona todas las arquitecturas (Tu lógica)
-        results = prediction_service.predict_all_architectures(tmp_path)
-        
-        # Añadimos la URL de la imagen al resultado para el frontend
-        results["image_url"] = f"/static/uploads/images/{file.filename}"
-
-        return results
-    
+        if multi_dog:
+            results = await run_inference(prediction_service.predict_multi_dog, image_array=frame, mode=mode)
+        else:
+            views = (tta_views or settings.TTA_VIEWS) if tta else 0
+            results = await run_inference(
+                prediction_service.predict_all_architectures, image_array=frame, mode=mode, tta_views=views
+            )
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"❌ Error en el endpoint de predicción: {e}")
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
-    finally:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
 
-@router.post("/video")
-async def predict_video(file: UploadFile = File(...)):
-    if not prediction_service.model_loaded:
-        prediction_service.load_model()
+    # 4. Guardar la imagen para el historial fuera del camino de la petición
+    if settings.SAVE_UPLOADED_IMAGES:
+        filename = os.path.basename(file.filename)
+        background_tasks.add_task(_save_upload, contents, filename)
+        # Añadimos la URL de la imagen al resultado para el frontend
+        results["image_url"] = f"/static/uploads/images/{filename}"
+
+    return results
+
+@router.post("/batch")
+async def predict_breed_batch(files: List[UploadFile] = File(...), mode: PredictionMode = Query("full")):
+    """
+    ENDPOINT PARA LOTES DE IMÁGENES:
+    Recibe varias fotos en una sola petición y las procesa por lotes
+    (YOLO y los 3 clasificadores). Devuelve una entrada por imagen con el
+    mismo formato que el endpoint de imagen individual.
+    """
+    await asyncio.to_thread(prediction_service.ensure_loaded)
+
+    if len(files) > settings.PREDICT_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Demasiadas imágenes: el máximo por petición es {settings.PREDICT_BATCH_MAX_FILES}"
+        )
+
+    # 1. Validar y decodificar cada imagen en memoria
+    frames = []
+    for file in files:
+        file_ext = os.path.splitext(file.filename)[1].lower()
+        if file_ext not in [".jpg", ".jpeg", ".png", ".webp", ".bmp"]:
+            raise HTTPException(status_code=400, detail=f"El archivo {file.filename} no es una imagen válida")
+
+        contents = await file.read()
+        frames.append(cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR))
+
+    try:
+        # 2. Predicción en lote (las imágenes ilegibles se reportan individualmente)
+        results = await run_inference(prediction_service.predict_many, image_arrays=frames, mode=mode, job_class="batch")
+
+        for file, result in zip(files, results):
+            result["filename"] = file.filename
+
+        return {"success": True, "count": len(results), "results": results}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error en el endpoint de predicción por lotes: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
+def _video_source(file: Optional[UploadFile], video_id: Optional[str]) -> Optional[str]:
+    """Valida que se pida el análisis de un archivo o de un video_id de /input/video (no ambos); devuelve la extensión."""
+    if (file is None) == (video_id is None):
+        raise HTTPException(status_code=400, detail="Indica un archivo de video o un video_id, no ambos")
+    if video_id is not None:
+        if not video_store.exists(video_id):
+            raise HTTPException(status_code=404, detail="Video no encontrado o caducado; súbelo de nuevo a /input/video")
+        return None
     file_ext = os.path.splitext(file.filename)[1].lower()
-    if file_ext not in [".mp4", ".mov", ".avi", ".gif"]:
+    if file_ext not in VIDEO_EXTENSIONS:
         raise HTTPException(status_code=400, detail="Formato de video no válido")
+    return file_ext
+
+@router.post("/video")
+async def predict_video(
+    file: Optional[UploadFile] = File(None),
+    video_id: Optional[str] = Query(None, description="Video ya subido a /input/video: se analizan sus frames guardados"),
+    mode: PredictionMode = Query("full"),
+    sample_fps: Optional[float] = Query(None, gt=0, le=30, description="Frames analizados por segundo de video"),
+    max_frames: Optional[int] = Query(None, ge=1, le=3600, description="Máximo de frames analizados"),
+    early_stop: bool = Query(False, description="Terminar cuando la raza líder converge"),
+    time_budget_ms: Optional[int] = Query(None, ge=100, le=600000, description="Presupuesto de tiempo del análisis"),
+    track: bool = Query(False, description="YOLO cada N frames y tracker entre medias"),
+):
+    file_ext = _video_source(file, video_id)
+    await asyncio.to_thread(prediction_service.ensure_loaded)
+
+    if video_id is not None:
+        # Solo la apertura del artefacto decide si está corrupto; los errores de la
+        # inferencia no deben borrar un video almacenado válido
+        try:
+            source = await asyncio.to_thread(
+                video_store.source, video_id,
+                sample_fps or settings.VIDEO_SAMPLE_FPS, max_frames or settings.VIDEO_MAX_FRAMES,
+            )
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Video no encontrado o caducado; súbelo de nuevo a /input/video")
+        except (ValueError, OSError) as e:
+            # Artefacto corrupto o borrado a medias: se descarta para que la próxima subida lo regenere
+            print(f"❌ Video almacenado {video_id} ilegible: {e}")
+            video_store.remove(video_id)
+            raise HTTPException(status_code=400, detail="El video almacenado no se puede leer; súbelo de nuevo a /input/video")
+
+        try:
+            return await run_inference(
+                analyze_video, None, mode, sample_fps, max_frames, early_stop, time_budget_ms, track,
+                source=source, job_class="video",
+            )
+        except HTTPException:
+            raise
+        except TimeoutError:
+            print(f"❌ Timeout analizando el video almacenado {video_id}")
+            raise HTTPException(status_code=503, detail="La inferencia del video no terminó a tiempo; inténtalo de nuevo")
+        except Exception as e:
+            print(f"❌ Error en predict_video: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
 
+    # La copia de un video de cientos de MB no debe bloquear el event loop
     with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-        shutil.copyfileobj(file.file, tmp)
+        await asyncio.to_thread(shutil.copyfileobj, file.file, tmp)
         tmp_path = tmp.name
 
-    cap = None
     try:
         static_videos_path = os.path.join("static", "uploads", "videos", "raw")
         os.makedirs(static_videos_path, exist_ok=True)
         permanent_video_path = os.path.join(static_videos_path, file.filename)
-        shutil.copy2(tmp_path, permanent_video_path)
-
-        cap = cv2.VideoCapture(tmp_path)
-        fps = cap.get(cv2.CAP_PROP_FPS) or 30
-        step = int(fps) 
-        
-        # Ahora acumulamos usando una clave única (usaremos breed_en como ID)
-        # stats[arch][breed_en] = { "sum": conf, "es": breed_es }
-        stats = {
-            "mobile": {},
-            "keras": {},
-            "pytorch": {}
-        }
-        frames_analizados = 0
+        await asyncio.to_thread(shutil.copy2, tmp_path, permanent_video_path)
 
-        while True:
-            ret, frame = cap.read()
-            if not ret: break
-            
-            if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) % step == 0:
-                preds = prediction_service.predict_breed_from_image_array(frame)
-                
-                if preds["success"]:
-                    frames_analizados += 1
-                    for arch in ["mobile", "keras", "pytorch"]:
-                        for p in preds[arch]:
-                            b_en = p["breed_en"]
-                            b_es = p["breed_es"]
-                            conf = p["confidence"]
-                            api_matched = p.get("matched", False)
-                            api_id = p.get("api_id")
-                            
-                            if b_en not in stats[arch]:
-                                stats[arch][b_en] = {
-                                    "sum": 0, 
-                                    "es": b_es,
-                                    "matched": api_matched,
-                                    "api_id": api_id
-                                }
-                            
-                            stats[arch][b_en]["sum"] += conf
-            
-        cap.release()
-        cap = None
-
-        if frames_analizados == 0:
-            return {"success": False, "message": "No se detectó perro en el video."}
-
-        # Función para promediar corregida para devolver ambos nombres
-        def get_top_averages(arch_stats, n_frames):
-            avg_list = [
-                {
-                    "breed_en": b_en, 
-                    "breed_es": info["es"], 
-                    "confidence": round(info["sum"] / n_frames, 2),
-                    "matched": info["matched"],
-                    "api_id": info["api_id"]
-                }
-                for b_en, info in arch_stats.items()
-            ]
-            return sorted(avg_list, key=lambda x: x["confidence"], reverse=True)[:3]
-
-        return {
-            "success": True,
-            "mobile": get_top_averages(stats["mobile"], frames_analizados),
-            "keras": get_top_averages(stats["keras"], frames_analizados),
-            "pytorch": get_top_averages(stats["pytorch"], frames_analizados),
-            "video_url": f"/static/uploads/videos/raw/{file.filename}"
-        }
+        # El análisis completo es un solo trabajo: o se admite entero o se rechaza con 429
+        result = await run_inference(
+            analyze_video, tmp_path, mode, sample_fps, max_frames, early_stop, time_budget_ms, track,
+            job_class="video",
+        )
+        if result["success"]:
+            result["video_url"] = f"/static/uploads/videos/raw/{file.filename}"
+        return result
 
+    except HTTPException:
+        raise
+    except TimeoutError:
+        print(f"❌ Timeout analizando el video {file.filename}")
+        raise HTTPException(status_code=503, detail="La inferencia del video no terminó a tiempo; inténtalo de nuevo")
+    except ValueError as e:
+        # El contenedor no se pudo abrir
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"❌ Error en predict_video: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        if cap: cap.release()
         if os.path.exists(tmp_path):
             os.remove(tmp_path)
 
+@router.post("/video/jobs", status_code=202)
+async def create_video_job(
+    file: Optional[UploadFile] = File(None),
+    video_id: Optional[str] = Query(None, description="Video ya subido a /input/video: se analizan sus frames guardados"),
+    mode: PredictionMode = Query("full"),
+    sample_fps: Optional[float] = Query(None, gt=0, le=30, description="Frames analizados por segundo de video"),
+    max_frames: Optional[int] = Query(None, ge=1, le=3600, description="Máximo de frames analizados"),
+    early_stop: bool = Query(False, description="Terminar cuando la raza líder converge"),
+    time_budget_ms: Optional[int] = Query(None, ge=100, le=600000, description="Presupuesto de tiempo del análisis"),
+    track: bool = Query(False, description="YOLO cada N frames y tracker entre medias"),
+):
+    """
+    Encola el análisis del video y responde al momento con el id del trabajo.
+    El estado se consulta en /video/jobs/{id} y el progreso llega por SSE en
+    /video/jobs/{id}/events. Mismos parámetros que /video (archivo o video_id).
+    """
+    file_ext = _video_source(file, video_id)
+
+    job_id = video_jobs.new_job_dir()
+    # Con video_id el trabajo lee los frames del almacén y no guarda copia del video
+    video_file = f"video{file_ext}" if file_ext else None
+    try:
+        if video_file:
+            with open(os.path.join(video_jobs.jobs_dir, job_id, video_file), "wb") as f:
+                await asyncio.to_thread(shutil.copyfileobj, file.file, f)
+
+        params = {
+            "mode": mode, "sample_fps": sample_fps, "max_frames": max_frames,
+            "early_stop": early_stop, "time_budget_ms": time_budget_ms, "track": track,
+        }
+        if video_id is not None:
+            params["video_id"] = video_id
+        job = await asyncio.to_thread(video_jobs.submit, job_id, video_file, params)
+    except InferenceOverloadedError as e:
+        video_jobs.discard(job_id)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        video_jobs.discard(job_id)
+        print(f"❌ Error al crear el trabajo de video: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    prefix = f"{settings.API_V1_STR}/predict/video/jobs/{job.id}"
+    return {"job_id": job.id, "status": job.status, "status_url": prefix, "events_url": f"{prefix}/events"}
+
+
+@router.get("/video/jobs/{job_id}")
+async def get_video_job(job_id: str):
+    job = video_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o caducado")
+    return job
+
+
+@router.delete("/video/jobs/{job_id}")
+async def cancel_video_job(job_id: str):
+    """Cancela un trabajo en cola o detiene uno en ejecución al terminar su lote actual."""
+    job = video_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o caducado")
+    return job
+
+
+@router.get("/video/jobs/{job_id}/events")
+async def video_job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """
+    Progreso del trabajo por Server-Sent Events: un evento por lote analizado y uno
+    final con el resultado. Cada evento lleva su id, así que un cliente que se
+    reconecta con Last-Event-ID solo recibe los que le faltan.
+    """
+    if video_jobs.events_since(job_id) is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o caducado")
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+
+    async def event_generator():
+        nonlocal after
+        while True:
+            polled = video_jobs.events_since(job_id, after)
+            if polled is None:
+                yield f"data: {json.dumps({'status': 'error', 'message': 'Trabajo caducado', 'error': True})}\n\n"
+                return
+            events, finished = polled
+            for seq, event in events:
+                after = seq
+                yield f"id: {seq}\ndata: {json.dumps(event)}\n\n"
+            if finished:
+                return
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
 @router.websocket("/ws")
 async def websocket_predict(websocket: WebSocket):
     await websocket.accept()
-    if not prediction_service.model_loaded:
-        prediction_service.load_model()
+    await asyncio.to_thread(prediction_service.ensure_loaded)
+
+    # Modo de predicción por query param: /ws?mode=adaptive
+    mode = websocket.query_params.get("mode", "full")
+    if mode not in prediction_service.PREDICTION_MODES:
+        await websocket.close(code=1008, reason=f"Modo de predicción no válido: {mode}")
+        return
+
+    # /ws?track=true: YOLO cada N frames y tracker entre medias. Un tracker por conexión;
+    # los frames de una conexión se procesan de uno en uno, en orden
+    tracker = create_dog_tracker() if websocket.query_params.get("track") == "true" else None
 
     try:
         while True:
@@ -170,11 +366,24 @@ async def websocket_predict(websocket: WebSocket):
             image = Image.open(io.BytesIO(image_data))
             frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
             
-            result_dict = prediction_service.predict_breed_from_image_array(frame)
+            try:
+                if tracker is not None:
+                    result_dict = (await inference_executor.run(
+                        predict_tracked_frames, tracker, [frame], mode, job_class="frame"
+                    ))[0]
+                else:
+                    result_dict = await inference_executor.run(
+                        prediction_service.predict_breed_from_image_array, frame, mode, job_class="frame"
+                    )
+            except InferenceOverloadedError as e:
+                # Cámara en vivo: se descarta el frame y el cliente envía el siguiente más tarde
+                await websocket.send_text(json.dumps({"found": False, "busy": True, "retry_after": e.retry_after}))
+                continue
             
             if result_dict["success"]:
                 # Tomamos keras como referencia para el stream en vivo
-                top_3 = result_dict["keras"] 
+                # (en modo adaptive, MobileNet si keras no llegó a ejecutarse)
+                top_3 = result_dict["keras"] or result_dict["mobile"]
                 # Nota: get_top_predictions ya devuelve diccionarios con "breed" y "confidence"
                 # y ya vienen multiplicados por 100 y redondeados.
                 
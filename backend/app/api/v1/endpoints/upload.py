@@ -2,11 +2,13 @@ from fastapi import APIRouter, UploadFile, File, HTTPException
 from typing import List
 from PIL import Image
 import io
+import asyncio
 import os
 import cv2
 import tempfile
 import shutil
 import math
+from app.services.video_store import video_store
 
 # Definimos el router (SIN crear otra app = FastAPI() aquí)
 router = APIRouter()
@@ -17,46 +19,14 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__fil
 STATIC_PATH = "static/uploads"
 IMAGES_FOLDER = os.path.join(STATIC_PATH, "images")
 RAW_VIDEOS_FOLDER = os.path.join(STATIC_PATH, "videos/raw")
-FRAMES_VIDEOS_FOLDER = os.path.join(STATIC_PATH, "videos/frames")
 
 # --- FUNCIÓN DE UTILIDAD ---
 def ensure_directories():
     """Crea las carpetas si no existen de forma segura"""
-    for path in [IMAGES_FOLDER, RAW_VIDEOS_FOLDER, FRAMES_VIDEOS_FOLDER]:
+    for path in [IMAGES_FOLDER, RAW_VIDEOS_FOLDER]:
         if not os.path.exists(path):
             os.makedirs(path, exist_ok=True)
 
-# --- Función Auxiliar extraer_frames ---
-def extraer_frames(video_path, frames_base_folder, fps=1):
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise ValueError("No se pudo abrir el vídeo")
-    
-    video_name = os.path.splitext(os.path.basename(video_path))[0]
-    video_folder = os.path.join(frames_base_folder, video_name)
-    os.makedirs(video_folder, exist_ok=True)
-
-    frame_rate = cap.get(cv2.CAP_PROP_FPS)
-    if frame_rate <= 0: frame_rate = 30
-
-    step = max(1, round(frame_rate / fps))
-    count = 0
-    saved = 0
-
-    while True:
-        ret, frame = cap.read()
-        if not ret: break
-
-        if count % step == 0:
-            frame_resized = cv2.resize(frame, (224, 224))
-            frame_path = os.path.join(video_folder, f"{video_name}_frame_{saved}.jpg")
-            cv2.imwrite(frame_path, frame_resized)
-            saved += 1
-        count += 1
-
-    cap.release()
-    return saved, video_folder
-
 # --- Endpoints ---
 
 @router.post("/image")
@@ -142,11 +112,14 @@ async def upload_video(file: UploadFile = File(...)):
         ruta_video = os.path.join(RAW_VIDEOS_FOLDER, file.filename)
         shutil.move(tmp_path, ruta_video)
 
-        total, folder = extraer_frames(ruta_video, FRAMES_VIDEOS_FOLDER, fps=1)
+        # Única decodificación: los frames muestreados quedan en el almacén de video
+        # y /predict/video?video_id=... los analiza sin volver a subir ni decodificar
+        stored = await asyncio.to_thread(video_store.ingest, ruta_video)
 
         return {
             "filename": file.filename, 
-            "frames": total,
+            "frames": stored["count"],
+            "video_id": stored["video_id"],
             "video_url": f"/static/uploads/videos/raw/{file.filename}"
         }
 
@@ -26,6 +26,110 @@ class Settings(BaseSettings):
     # Ejemplo: BACKEND_CORS_ORIGINS=https://mi-app.vercel.app,http://localhost:8100
     BACKEND_CORS_ORIGINS: str = "http://localhost:8100,http://localhost:4200"
 
+    # Guardar las fotos de /predict en static/uploads/images (en segundo plano, tras responder)
+    SAVE_UPLOADED_IMAGES: bool = True
+
+    # Vistas de test-time augmentation por defecto con /predict?tta=true (máximo 8)
+    TTA_VIEWS: int = 4
+
+    # Máximo de perros clasificados por foto con /predict?multi_dog=true
+    MULTI_DOG_MAX_BOXES: int = 10
+
+    # Muestreo de /predict/video: frames por segundo de video y presupuesto máximo de frames.
+    # VIDEO_SAMPLER_STRATEGY: "auto" | "grab" | "seek"; "auto" salta con seek a partir de
+    # VIDEO_SEEK_MIN_STEP frames entre muestras
+    VIDEO_SAMPLE_FPS: float = 1.0
+    VIDEO_MAX_FRAMES: int = 300
+    VIDEO_SAMPLER_STRATEGY: str = "auto"
+    VIDEO_SEEK_MIN_STEP: int = 60
+    # Pipeline de video: frames por pasada de YOLO + clasificadores y tamaño de la cola
+    # entre el hilo decodificador y la inferencia
+    VIDEO_BATCH_SIZE: int = 8
+    VIDEO_DECODE_QUEUE_SIZE: int = 32
+    # Parada temprana de /predict/video?early_stop=true: líder estable durante
+    # VIDEO_EARLY_STOP_STABLE_FRAMES frames y cota inferior (media - z·σ/√n) del margen
+    # top-1/top-2 por encima de VIDEO_EARLY_STOP_MIN_MARGIN
+    VIDEO_EARLY_STOP_MIN_FRAMES: int = 5
+    VIDEO_EARLY_STOP_STABLE_FRAMES: int = 3
+    VIDEO_EARLY_STOP_MIN_MARGIN: float = 0.15
+    VIDEO_EARLY_STOP_Z: float = 1.96
+    # Detect-once-then-track (/predict/video?track=true y /predict/ws?track=true): YOLO cada
+    # VIDEO_TRACK_REDETECT_EVERY frames o si el tracking falla. VIDEO_TRACKER: "kcf" | "csrt" | "mil"
+    VIDEO_TRACKER: str = "kcf"
+    VIDEO_TRACK_REDETECT_EVERY: int = 10
+    VIDEO_TRACK_CONFIDENCE_DROP: float = 0.5
+    # Duración de cada segmento de la línea temporal de /predict/video
+    VIDEO_TIMELINE_SEGMENT_S: float = 5.0
+    # Trabajos de video en segundo plano (/predict/video/jobs): estado y video en
+    # VIDEO_JOBS_DIR/<id>, borrados VIDEO_JOB_TTL_S segundos después de terminar
+    VIDEO_JOBS_DIR: str = "generated_video_jobs"
+    VIDEO_JOB_WORKERS: int = 1
+    VIDEO_JOB_MAX_QUEUE: int = 16
+    VIDEO_JOB_TTL_S: float = 3600
+    # Almacén de frames de /input/video (un .npy memmap por video, clave = hash del contenido):
+    # /predict/video?video_id=... lo analiza sin volver a decodificar. Lado mayor de los frames
+    # limitado a VIDEO_STORE_MAX_SIDE; se borran tras VIDEO_STORE_TTL_S segundos sin usarse
+    VIDEO_STORE_DIR: str = "generated_video_store"
+    VIDEO_STORE_SAMPLE_FPS: float = 1.0
+    VIDEO_STORE_MAX_FRAMES: int = 300
+    VIDEO_STORE_MAX_SIDE: int = 640
+    VIDEO_STORE_TTL_S: float = 86400
+
+    # Predicción por lotes (/predict/batch)
+    PREDICT_BATCH_MAX_FILES: int = 50
+    YOLO_BATCH_SIZE: int = 16
+
+    # Executor acotado de inferencia para los endpoints y los trabajos de video
+    # (429 + Retry-After al saturarse; los trabajos de video esperan su turno)
+    INFERENCE_EXECUTOR_WORKERS: int = 2
+    INFERENCE_EXECUTOR_MAX_QUEUE: int = 32
+    INFERENCE_EXECUTOR_MAX_WAIT_S: float = 10.0
+
+    # Ejecución concurrente de los 3 clasificadores dentro de una predicción
+    PARALLEL_CLASSIFIERS: bool = False
+    CLASSIFIER_POOL_WORKERS: int = 3
+    # Hilos intra-op por framework (0 = valor por defecto del framework)
+    TF_INTRA_OP_THREADS: int = 0
+    TORCH_INTRA_OP_THREADS: int = 0
+
+    # Motor de inferencia: "native" (TensorFlow/PyTorch/Ultralytics) u "onnx" (ONNX Runtime)
+    INFERENCE_ENGINE: str = "native"
+    ONNX_INTRA_OP_THREADS: int = 0
+    # Perfil de modelos: "fp32" u "quantized" (clasificadores INT8, ver app/tools/quantize.py)
+    MODEL_PROFILE: str = "fp32"
+
+    # Micro-batching dinámico de los clasificadores entre peticiones concurrentes.
+    # Las peticiones HTTP llegan por el executor de inferencia, así que un batch no
+    # junta más de INFERENCE_EXECUTOR_WORKERS fotos: sube ambos valores a la vez.
+    # Con la cola llena la API responde 429
+    INFERENCE_SCHEDULER_ENABLED: bool = False
+    INFERENCE_BATCH_MAX_SIZE: int = 16
+    INFERENCE_BATCH_MAX_WAIT_MS: float = 5.0
+    INFERENCE_QUEUE_MAX_DEPTH: int = 256
+
+    # Caché de resultados de predicción por contenido de imagen (LRU + TTL)
+    PREDICTION_CACHE_ENABLED: bool = True
+    PREDICTION_CACHE_MAX_ENTRIES: int = 1024
+    PREDICTION_CACHE_TTL_SECONDS: float = 3600
+
+    # Pool de procesos de inferencia con frames en memoria compartida (0 = en el proceso de la API)
+    INFERENCE_WORKERS: int = 0
+    INFERENCE_WORKER_THREADS: int = 2
+    INFERENCE_WORKER_PIN_CORES: bool = True
+    INFERENCE_WORKER_START_TIMEOUT_S: float = 300
+    INFERENCE_WORKER_TIMEOUT_S: float = 120
+
+    # Cascada de detectores: YOLO pequeño primero, yolov8m solo si la decisión perro/otro animal es dudosa
+    DETECTOR_CASCADE_ENABLED: bool = False
+    DETECTOR_FAST_MODEL: str = "yolov8n.pt"
+    DETECTOR_ESCALATION_LOW: float = 0.25
+    DETECTOR_ESCALATION_HIGH: float = 0.70
+    DETECTOR_CASCADE_LOG_EVERY: int = 100
+
+    # Modo adaptive: Keras V1 y EfficientNet solo se ejecutan si MobileNetV2 duda
+    ADAPTIVE_MIN_CONFIDENCE: float = 0.90   # top-1 mínimo de MobileNet para no escalar
+    ADAPTIVE_MIN_MARGIN: float = 0.50       # diferencia top-1 / top-2 mínima para no escalar
+
     # Propiedad que devuelve la lista parseada
     @property
     def cors_origins(self) -> List[str]:
@@ -0,0 +1,158 @@
+"""
+Métricas Prometheus de la API (expuestas en /metrics).
+
+    - HTTP: latencia, peticiones en curso y errores por endpoint (MetricsMiddleware).
+    - Inferencia: duración por etapa (detección, preprocesado, cada clasificador)
+      y resultado de la detección de perro.
+    - Servicios externos: TheDogAPI, streaming de Gemini y generación de informes.
+
+Con INFERENCE_WORKERS > 0 las etapas de inferencia se ejecutan en los procesos
+worker y no aparecen aquí; el proceso de la API registra el reparto y el
+cómputo de cada petición en pawsense_inference_worker_seconds.
+"""
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from starlette.routing import Match
+
+# Cubos en segundos: de milisegundos (clasificadores) a decenas de segundos (vídeo, PDF)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+# ==========================================================
+# HTTP
+# ==========================================================
+
+HTTP_REQUESTS_TOTAL = Counter(
+    "pawsense_http_requests_total", "Peticiones HTTP atendidas", ["method", "endpoint", "status"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "pawsense_http_request_seconds", "Latencia de las peticiones HTTP (hasta el último byte)",
+    ["method", "endpoint"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "pawsense_http_requests_in_progress", "Peticiones HTTP en curso", ["method", "endpoint"]
+)
+HTTP_REQUEST_ERRORS_TOTAL = Counter(
+    "pawsense_http_request_errors_total", "Peticiones HTTP con respuesta 5xx o excepción", ["method", "endpoint"]
+)
+
+
+# ==========================================================
+# INFERENCE
+# ==========================================================
+
+INFERENCE_STAGE_SECONDS = Histogram(
+    "pawsense_inference_stage_seconds", "Duración de cada etapa de inferencia (por llamada, no por imagen)",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+INFERENCE_BATCH_ITEMS = Histogram(
+    "pawsense_inference_batch_items", "Recortes por pasada de los clasificadores",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+DOG_DETECTIONS_TOTAL = Counter(
+    "pawsense_dog_detections_total", "Resultado de la selección de recorte por imagen", ["outcome"]
+)
+PREDICTION_CACHE_REQUESTS_TOTAL = Counter(
+    "pawsense_prediction_cache_requests_total", "Consultas a la caché de predicciones", ["result"]
+)
+INFERENCE_EXECUTOR_PENDING = Gauge(
+    "pawsense_inference_executor_pending", "Trabajos de inferencia en cola o en ejecución"
+)
+INFERENCE_EXECUTOR_REJECTED_TOTAL = Counter(
+    "pawsense_inference_executor_rejected_total", "Trabajos rechazados con 429 por saturación", ["reason"]
+)
+INFERENCE_WORKER_SECONDS = Histogram(
+    "pawsense_inference_worker_seconds", "Reparto y cómputo de las peticiones enviadas a procesos worker",
+    ["phase"], buckets=LATENCY_BUCKETS
+)
+
+DETECTOR_CASCADE_FRAMES_TOTAL = Counter(
+    "pawsense_detector_cascade_frames_total", "Frames por etapa de la cascada de detección (full / fast = tasa de escalado)",
+    ["stage"]
+)
+VIDEO_TRACKING_FRAMES_TOTAL = Counter(
+    "pawsense_video_tracking_frames_total", "Frames de video y WebSocket localizados por YOLO o por el tracker",
+    ["source"]
+)
+
+
+# ==========================================================
+# EXTERNAL SERVICES
+# ==========================================================
+
+EXTERNAL_REQUEST_SECONDS = Histogram(
+    "pawsense_external_request_seconds", "Latencia de las llamadas HTTP a servicios externos",
+    ["service", "operation"], buckets=LATENCY_BUCKETS
+)
+EXTERNAL_REQUEST_ERRORS_TOTAL = Counter(
+    "pawsense_external_request_errors_total", "Errores en llamadas a servicios externos", ["service", "operation"]
+)
+CHAT_FIRST_CHUNK_SECONDS = Histogram(
+    "pawsense_chat_first_chunk_seconds", "Tiempo hasta el primer fragmento del streaming de Gemini",
+    buckets=LATENCY_BUCKETS
+)
+CHAT_STREAM_SECONDS = Histogram(
+    "pawsense_chat_stream_seconds", "Duración completa del streaming de Gemini", buckets=LATENCY_BUCKETS
+)
+CHAT_REQUESTS_TOTAL = Counter(
+    "pawsense_chat_requests_total", "Intentos de streaming con Gemini por resultado", ["outcome"]
+)
+REPORT_GENERATION_SECONDS = Histogram(
+    "pawsense_report_generation_seconds", "Duración de la generación de informes",
+    ["format", "outcome"], buckets=LATENCY_BUCKETS
+)
+PDF_RENDER_SECONDS = Histogram(
+    "pawsense_pdf_render_seconds", "Renderizado de PDF en el navegador persistente de Playwright",
+    buckets=LATENCY_BUCKETS
+)
+
+
+def render_latest():
+    """Cuerpo y content-type de la respuesta de /metrics."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que registra latencia, peticiones en curso y errores por
+    endpoint. La etiqueta es la plantilla de la ruta (/api/v1/report/{id}), no la
+    URL, para no disparar la cardinalidad. Es ASGI puro para que las respuestas
+    en streaming (SSE de chat e informes) se midan hasta el último byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _endpoint(self, scope) -> str:
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, endpoint = scope["method"], self._endpoint(scope)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method, endpoint)
+        in_progress.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_SECONDS.labels(method, endpoint).observe(time.perf_counter() - t0)
+            HTTP_REQUESTS_TOTAL.labels(method, endpoint, str(status)).inc()
+            if status >= 500:
+                HTTP_REQUEST_ERRORS_TOTAL.labels(method, endpoint).inc()
+            in_progress.dec()
@@ -1,11 +1,17 @@
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 
 from app.core.config import settings
+from app.core.metrics import MetricsMiddleware, render_latest
 from app.api.v1.api import api_router
 from app.services.report_service import PlaywrightPDFGenerator
+from app.services.prediction_service import prediction_service
+from app.services.inference_executor import inference_executor
+from app.services.video_jobs import video_jobs
 import uvicorn
 
 logger = logging.getLogger(__name__)
@@ -19,10 +25,19 @@ async def lifespan(app: FastAPI):
         logger.warning("Playwright no está instalado. El navegador persistente no estará disponible.")
     except Exception as e:
         logger.error(f"Error starting Playwright persistent browser: {e}", exc_info=True)
+
+    # Carga y calentamiento de modelos en segundo plano: la app arranca al momento
+    # y /ready indica cuándo se puede enrutar tráfico de predicción
+    app.state.model_loading = asyncio.create_task(asyncio.to_thread(prediction_service.ensure_loaded))
+    # Trabajos de video en segundo plano (reanuda los que quedaron pendientes en disco)
+    video_jobs.start()
     
     yield
     
     # Shutdown
+    video_jobs.shutdown()
+    inference_executor.shutdown()
+    prediction_service.shutdown()
     try:
         PlaywrightPDFGenerator.stop()
     except Exception as e:
@@ -36,6 +51,9 @@ app = FastAPI(
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+# Latencia, peticiones en curso y errores por endpoint (ver /metrics)
+app.add_middleware(MetricsMiddleware)
+
 # Set all CORS enabled origins
 if settings.cors_origins:
     app.add_middleware(
@@ -56,5 +74,19 @@ def read_root():
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics")
+def metrics():
+    """Métricas en formato de texto de Prometheus."""
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/ready")
+def readiness_check():
+    """Estado de carga y calentamiento de cada modelo. 503 hasta que todos estén listos."""
+    readiness = prediction_service.readiness()
+    readiness["executor"] = inference_executor.stats()
+    readiness["video_jobs"] = video_jobs.stats()
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host=settings.HOST, port=settings.PORT)
@@ -2,10 +2,12 @@ from typing import AsyncGenerator
 import logging
 import asyncio
 import random
+import time
 from fastapi import HTTPException, status
 from google import genai
 from google.genai import types
 from app.core.config import settings
+from app.core.metrics import CHAT_FIRST_CHUNK_SECONDS, CHAT_REQUESTS_TOTAL, CHAT_STREAM_SECONDS
 from app.schemas.chat import ChatRequest
 from app.services.chat_utils import (
     is_dog_domain,
@@ -233,6 +235,7 @@ class ChatService:
                     history=chat_history
                 )
                 
+                stream_start = time.perf_counter()
                 response_stream = await async_chat.send_message_stream(
                     message=request.question,
                     config=types.GenerateContentConfig(response_mime_type="text/plain")
@@ -240,9 +243,15 @@ class ChatService:
                 
                 # Accumulate full response for markdown stripping
                 full_response = ""
+                first_chunk = True
                 async for chunk in response_stream:
+                    if first_chunk:
+                        CHAT_FIRST_CHUNK_SECONDS.observe(time.perf_counter() - stream_start)
+                        first_chunk = False
                     if chunk.text is not None:
                         full_response += chunk.text
+                CHAT_STREAM_SECONDS.observe(time.perf_counter() - stream_start)
+                CHAT_REQUESTS_TOTAL.labels("success").inc()
                 
                 # Post-process: strip any remaining markdown
                 cleaned_response = strip_markdown(full_response)
@@ -260,6 +269,7 @@ class ChatService:
                 is_last_attempt = attempt == max_retries - 1
                 
                 if is_rate_limit_error(e):
+                    CHAT_REQUESTS_TOTAL.labels("rate_limited").inc()
                     if not is_last_attempt:
                         # Exponential backoff + Jitter
                         delay = (base_delay * (2 ** attempt)) + random.uniform(0, 0.5)
@@ -272,6 +282,7 @@ class ChatService:
                         return
                 else:
                     # Non-retriable error (or we decided not to retry other errors)
+                    CHAT_REQUESTS_TOTAL.labels("error").inc()
                     logger.error(f"Error during chat streaming: {e}")
                     yield f"\n\n[System Error: Unable to complete response. Please try again later.]"
                     return
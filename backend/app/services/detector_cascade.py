@@ -0,0 +1,92 @@
+import threading
+from typing import Dict, List, Set
+
+import numpy as np
+
+from app.core.metrics import DETECTOR_CASCADE_FRAMES_TOTAL
+
+
+class CascadeDetector:
+    """
+    Detector en dos etapas con la misma interfaz que los backends de YOLO.
+
+    Un modelo pequeño (nano/small) procesa todos los frames. Solo se escala al
+    modelo medio cuando la decisión perro / otro animal del modelo pequeño cae
+    en la banda de confianza dudosa, usando las mismas clases NON_DOG_ANIMALS y
+    la misma regla del 30% de animal competidor que PredictionService._select_crop.
+    """
+
+    def __init__(
+        self,
+        fast_detector,
+        full_detector,
+        dog_class_id: int,
+        non_dog_animals: Set[int],
+        band_low: float = 0.25,
+        band_high: float = 0.70,
+        competing_ratio: float = 0.3,
+        log_every: int = 100,
+    ):
+        self.fast = fast_detector
+        self.full = full_detector
+        self.dog_class_id = dog_class_id
+        self.non_dog_animals = non_dog_animals
+        self.band_low = band_low
+        self.band_high = band_high
+        self.competing_ratio = competing_ratio
+        self.log_every = max(1, log_every)
+
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.escalated = 0
+
+    def is_ambiguous(self, detections) -> bool:
+        """
+        La decisión es clara si hay un perro con confianza >= band_high sin animal
+        competidor (por debajo del 30% de su confianza), o si no hay perro por
+        encima de band_low y otro animal supera band_high. Todo lo demás se escala.
+        """
+        dog_conf = max((c for cls, c, _ in detections if cls == self.dog_class_id), default=0.0)
+        other_conf = max((c for cls, c, _ in detections if cls in self.non_dog_animals), default=0.0)
+
+        clear_dog = dog_conf >= self.band_high and other_conf < dog_conf * self.competing_ratio
+        clear_other = dog_conf < self.band_low and other_conf >= self.band_high
+        return not (clear_dog or clear_other)
+
+    def detect(self, images: List[np.ndarray], conf: float = 0.15):
+        results = self.fast.detect(images, conf=conf)
+
+        ambiguous = [i for i, detections in enumerate(results) if self.is_ambiguous(detections)]
+        if ambiguous:
+            for i, detections in zip(ambiguous, self.full.detect([images[i] for i in ambiguous], conf=conf)):
+                results[i] = detections
+
+        self._record(len(images), len(ambiguous))
+        return results
+
+    def _record(self, frames: int, escalated: int):
+        with self._lock:
+            before = self.frames
+            self.frames += frames
+            self.escalated += escalated
+            should_log = self.frames // self.log_every > before // self.log_every
+
+        DETECTOR_CASCADE_FRAMES_TOTAL.labels("fast").inc(frames)
+        if escalated:
+            DETECTOR_CASCADE_FRAMES_TOTAL.labels("full").inc(escalated)
+
+        if should_log:
+            stats = self.stats()
+            print(
+                f"📊 Cascada de detección: {stats['escalated']}/{stats['frames']} frames escalados "
+                f"({stats['escalation_rate']:.1%}) con banda [{self.band_low}, {self.band_high})"
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "frames": self.frames,
+                "escalated": self.escalated,
+                "escalation_rate": round(self.escalated / self.frames, 4) if self.frames else 0.0,
+                "band": [self.band_low, self.band_high],
+            }
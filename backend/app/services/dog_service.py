@@ -1,6 +1,7 @@
 import httpx
 from typing import Optional, Dict, Any
 from app.core.config import settings
+from app.core.metrics import EXTERNAL_REQUEST_ERRORS_TOTAL, EXTERNAL_REQUEST_SECONDS
 
 class TheDogAPIError(Exception):
     """Exception para errores de TheDogAPI."""
@@ -34,7 +35,8 @@ class DogService:
                 headers = {"x-api-key": self.api_key}
                 params = {"q": breed_name}
                 
-                response = await client.get(url, headers=headers, params=params)
+                with EXTERNAL_REQUEST_SECONDS.labels("thedogapi", "breed_search").time():
+                    response = await client.get(url, headers=headers, params=params)
                 
                 # Manejar errores HTTP
                 if response.status_code == 401:
@@ -70,9 +72,11 @@ class DogService:
                 
         except httpx.HTTPError as e:
             # Errores de conexión
+            EXTERNAL_REQUEST_ERRORS_TOTAL.labels("thedogapi", "breed_search").inc()
             raise TheDogAPIError(f"Error conectando a TheDogAPI: {str(e)}")
         except Exception as e:
             # Otros errores
+            EXTERNAL_REQUEST_ERRORS_TOTAL.labels("thedogapi", "breed_search").inc()
             raise TheDogAPIError(f"Error inesperado consultando TheDogAPI: {str(e)}")
     
     async def get_detailed_breed_info(self, breed_name: str) -> Optional[Dict[str, Any]]:
@@ -88,7 +92,8 @@ class DogService:
                 headers = {"x-api-key": self.api_key}
                 params = {"q": breed_name}
                 
-                response = await client.get(url, headers=headers, params=params)
+                with EXTERNAL_REQUEST_SECONDS.labels("thedogapi", "breed_detail").time():
+                    response = await client.get(url, headers=headers, params=params)
                 response.raise_for_status()
                 data = response.json()
                 
@@ -110,4 +115,5 @@ class DogService:
                     "weight_metric": breed.get("weight", {}).get("metric"),
                 }
         except Exception as e:
+            EXTERNAL_REQUEST_ERRORS_TOTAL.labels("thedogapi", "breed_detail").inc()
             raise TheDogAPIError(f"Error en detalle: {str(e)}")
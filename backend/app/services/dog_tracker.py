@@ -0,0 +1,174 @@
+import functools
+import logging
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Fábricas por tipo de tracker. KCF y CSRT vienen en opencv-contrib-python (en
+# 4.5.1+ en el espacio de nombres principal o en cv2.legacy); MIL está en el
+# núcleo de OpenCV y sirve de respaldo si contrib no está instalado.
+TRACKER_FACTORIES = {
+    "kcf": ("TrackerKCF_create", "legacy.TrackerKCF_create"),
+    "csrt": ("TrackerCSRT_create", "legacy.TrackerCSRT_create"),
+    "mil": ("TrackerMIL_create", "legacy.TrackerMIL_create"),
+}
+
+
+def _resolve_factory(name: str):
+    for path in TRACKER_FACTORIES[name]:
+        target = cv2
+        for attr in path.split("."):
+            target = getattr(target, attr, None)
+            if target is None:
+                break
+        if target is not None:
+            return target
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _factory_for(kind: str):
+    factory = _resolve_factory(kind)
+    if factory is None:
+        logger.warning("Tracker %s no disponible en esta build de OpenCV (¿falta opencv-contrib?); se usa MIL", kind)
+        factory = _resolve_factory("mil")
+    return factory
+
+
+def create_tracker(kind: str = "kcf"):
+    """Crea un tracker de OpenCV; si el tipo pedido no está disponible, usa MIL."""
+    if kind not in TRACKER_FACTORIES:
+        raise ValueError(f"Tracker no válido: {kind}")
+    return _factory_for(kind)()
+
+
+class DogTracker:
+    """
+    Detecta una vez y sigue al perro en los frames siguientes.
+
+    needs_detection() indica cuándo hay que ejecutar YOLO: sin caja activa, cada
+    redetect_every frames, o si el tracking falló o perdió confianza. Entre medias,
+    update() propaga la caja con un tracker ligero de OpenCV y el recorte va
+    directamente a los clasificadores.
+
+    La mayoría de trackers de OpenCV no dan una puntuación (getTrackingScore solo
+    la tienen algunos), así que la confianza del tracking se aproxima así:
+        - update() devuelve ok=False o una caja vacía o fuera del frame;
+        - el área de la caja cambia más de max_scale_change veces respecto a la detectada;
+        - la confianza top-1 del clasificador en el recorte seguido cae por debajo
+          de confidence_drop veces la del último frame detectado (report_confidence);
+        - OpenCV lanza cv2.error al iniciar o actualizar el tracker.
+    En todos los casos se fuerza una detección en el siguiente frame.
+    """
+
+    def __init__(
+        self,
+        kind: str = "kcf",
+        redetect_every: int = 10,
+        confidence_drop: float = 0.5,
+        max_scale_change: float = 2.0,
+        min_score: float = 0.3,
+    ):
+        self.kind = kind
+        self.redetect_every = max(1, redetect_every)
+        self.confidence_drop = confidence_drop
+        self.max_scale_change = max_scale_change
+        self.min_score = min_score
+
+        self._tracker = None
+        self._box: Optional[List[float]] = None
+        self._detected_area = 0.0
+        self._since_detection = 0
+        self._reference_confidence: Optional[float] = None
+        # Confianza de la detección de YOLO que originó la caja actual
+        self.confidence = 0.0
+
+        self.detections = 0
+        self.tracked = 0
+        self.failures = 0
+
+    def needs_detection(self) -> bool:
+        return self._tracker is None or self._since_detection >= self.redetect_every
+
+    def reset(self, frame_bgr: np.ndarray, box: Optional[List[float]], confidence: float = 1.0):
+        """Reinicia el tracker con la caja detectada por YOLO [x1, y1, x2, y2] (None: no hay perro)."""
+        self.detections += 1
+        self._since_detection = 0
+        self._reference_confidence = None
+        self.confidence = confidence if box is not None else 0.0
+        if box is None:
+            self._tracker, self._box = None, None
+            return
+
+        x1, y1, x2, y2 = (int(round(v)) for v in box)
+        self._tracker = create_tracker(self.kind)
+        try:
+            self._tracker.init(frame_bgr, (x1, y1, x2 - x1, y2 - y1))
+        except cv2.error as e:
+            # MIL no admite una caja que ocupa todo el frame (perro en primer plano):
+            # sin tracker, el siguiente frame vuelve a pasar por YOLO
+            logger.debug("No se pudo iniciar el tracker %s: %s", self.kind, e)
+            self._fail()
+            return
+        self._box = [x1, y1, x2, y2]
+        self._detected_area = float((x2 - x1) * (y2 - y1))
+
+    def _fail(self):
+        self.failures += 1
+        self._tracker, self._box = None, None
+
+    def update(self, frame_bgr: np.ndarray) -> Optional[List[float]]:
+        """Propaga la caja al frame; None si el tracking falla (hay que volver a detectar)."""
+        if self._tracker is None:
+            return None
+
+        try:
+            ok, (x, y, w, h) = self._tracker.update(frame_bgr)
+        except cv2.error as e:
+            logger.debug("Fallo del tracker %s: %s", self.kind, e)
+            self._fail()
+            return None
+        height, width = frame_bgr.shape[:2]
+        x1, y1 = max(0, int(x)), max(0, int(y))
+        x2, y2 = min(width, int(x + w)), min(height, int(y + h))
+        area = float(max(0, x2 - x1) * max(0, y2 - y1))
+
+        # En OpenCV 5 todos los trackers tienen getTrackingScore, pero los que no puntúan devuelven -1
+        score = self._tracker.getTrackingScore() if hasattr(self._tracker, "getTrackingScore") else -1.0
+        scale = area / self._detected_area if self._detected_area > 0 else 0.0
+        if (
+            not ok
+            or area <= 0
+            or 0 <= score < self.min_score
+            or not (1 / self.max_scale_change <= scale <= self.max_scale_change)
+        ):
+            self._fail()
+            return None
+
+        self._since_detection += 1
+        self.tracked += 1
+        self._box = [x1, y1, x2, y2]
+        return self._box
+
+    def report_confidence(self, confidence: float, tracked: bool):
+        """
+        Confianza top-1 del clasificador (0-100) en un recorte ya clasificado.
+        tracked indica si su caja vino del tracker (True) o de YOLO (False).
+        """
+        if not tracked:
+            self._reference_confidence = confidence
+        elif self._reference_confidence and confidence < self._reference_confidence * self.confidence_drop:
+            self._fail()
+
+    def stats(self) -> Dict:
+        frames = self.detections + self.tracked
+        return {
+            "tracker": self.kind,
+            "detections": self.detections,
+            "tracked": self.tracked,
+            "failures": self.failures,
+            "detector_skip_rate": round(self.tracked / frames, 4) if frames else 0.0,
+        }
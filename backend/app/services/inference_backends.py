@@ -0,0 +1,301 @@
+"""
+Backends de inferencia intercambiables para PredictionService.
+
+Todos los clasificadores exponen predict_proba(batch) -> np.ndarray (N, clases)
+y todos los detectores detect(images, conf) -> [[(class_id, confidence, coords)]].
+Los frameworks se importan dentro de cada backend para que el motor ONNX no
+tenga que cargar TensorFlow, PyTorch ni Ultralytics en el proceso.
+"""
+import os
+import threading
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+Detection = Tuple[int, float, List[int]]
+
+EFFICIENTNET_NUM_CLASSES = 120
+
+# Ficheros .onnx generados por `python -m app.tools.export_onnx`
+ONNX_MODEL_FILES = {
+    "yolo": "yolov8m.onnx",
+    "mobile": "pawsense_mobile_model.onnx",
+    "keras": "modelo_prediccion_perros_v1.onnx",
+    "pytorch": "modelo_perros_pytorch.onnx",
+}
+
+# Ficheros del perfil "quantized" generados por `python -m app.tools.quantize`
+QUANTIZED_MODEL_FILES = {
+    "mobile": "pawsense_mobile_model_int8.tflite",
+    "keras": "modelo_prediccion_perros_v1_int8.tflite",
+    "pytorch": "modelo_perros_pytorch_int8.pt",
+}
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+# ==========================================================
+# NATIVE (TensorFlow / PyTorch / Ultralytics)
+# ==========================================================
+
+def configure_native_threads(tf_threads: int = 0, torch_threads: int = 0):
+    """Limita los hilos intra-op de TensorFlow y PyTorch (0 = valor por defecto)."""
+    if tf_threads > 0:
+        import tensorflow as tf
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(tf_threads)
+        except RuntimeError as e:
+            # TensorFlow solo acepta el cambio antes de inicializar el runtime
+            print(f"⚠️ No se pudo fijar TF_INTRA_OP_THREADS: {e}")
+
+    if torch_threads > 0:
+        import torch
+        torch.set_num_threads(torch_threads)
+
+
+class KerasClassifier:
+    """Modelo Keras (.keras) cuya salida ya es softmax."""
+
+    def __init__(self, path: str):
+        import tensorflow as tf
+        self.model = tf.keras.models.load_model(path)
+
+    def predict_proba(self, batch: np.ndarray) -> np.ndarray:
+        return np.asarray(self.model.predict(batch, verbose=0))
+
+
+def build_efficientnet_b0(num_classes: int = EFFICIENTNET_NUM_CLASSES):
+    """Arquitectura EfficientNet-B0 con la cabeza usada en el entrenamiento."""
+    import torch.nn as nn
+    from torchvision import models
+
+    model = models.efficientnet_b0(weights=None)
+    num_ftrs = model.classifier[1].in_features
+    model.classifier[1] = nn.Sequential(
+        nn.Dropout(p=0.2, inplace=True),
+        nn.Linear(num_ftrs, num_classes)
+    )
+    return model
+
+
+class TorchClassifier:
+    """EfficientNet-B0 (.pth). Recibe batches NCHW y devuelve softmax."""
+
+    def __init__(self, pth_path: str):
+        import torch
+        self.model = build_efficientnet_b0()
+        self.model.load_state_dict(torch.load(pth_path, map_location=torch.device("cpu")))
+        self.model.eval()
+
+    def predict_proba(self, batch: np.ndarray) -> np.ndarray:
+        import torch
+        with torch.no_grad():
+            outputs = self.model(torch.from_numpy(np.ascontiguousarray(batch, dtype=np.float32)))
+            return torch.nn.functional.softmax(outputs, dim=1).cpu().numpy()
+
+
+class UltralyticsDetector:
+    """YOLOv8 a través de Ultralytics."""
+
+    def __init__(self, path: str):
+        from ultralytics import YOLO
+        self.model = YOLO(path)
+        # El predictor de Ultralytics guarda estado por llamada y no es thread-safe;
+        # el detector se comparte entre el executor de inferencia y los trabajos de video
+        self._lock = threading.Lock()
+
+    def detect(self, images: List[np.ndarray], conf: float = 0.15) -> List[List[Detection]]:
+        with self._lock:
+            results = self.model(images, verbose=False, conf=conf)
+        detections = []
+        for r in results:
+            boxes = []
+            for box in r.boxes:
+                confidence = float(box.conf[0].cpu().numpy())
+                class_id = int(box.cls)
+                coords = list(map(int, box.xyxy[0].cpu().numpy()))
+                boxes.append((class_id, confidence, coords))
+            detections.append(boxes)
+        return detections
+
+
+# ==========================================================
+# QUANTIZED (TFLite INT8 / TorchScript INT8)
+# ==========================================================
+
+def _tflite_interpreter_class():
+    # LiteRT es el runtime ligero; si no está instalado se usa el de TensorFlow
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteClassifier:
+    """
+    Modelo Keras convertido a TFLite INT8. Las entradas/salidas cuantizadas se
+    (de)cuantizan con la escala y el zero point del propio modelo.
+    """
+
+    def __init__(self, path: str, num_threads: int = 0):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Modelo TFLite no encontrado: {path}. Ejecuta: python -m app.tools.quantize")
+
+        Interpreter = _tflite_interpreter_class()
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads or None)
+        self.interpreter.allocate_tensors()
+        self.input_detail = self.interpreter.get_input_details()[0]
+        self.output_detail = self.interpreter.get_output_details()[0]
+        # El intérprete no es thread-safe
+        self._lock = threading.Lock()
+
+    def predict_proba(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            if tuple(self.input_detail["shape"]) != batch.shape:
+                self.interpreter.resize_tensor_input(self.input_detail["index"], batch.shape)
+                self.interpreter.allocate_tensors()
+                self.input_detail = self.interpreter.get_input_details()[0]
+                self.output_detail = self.interpreter.get_output_details()[0]
+
+            in_dtype = self.input_detail["dtype"]
+            if in_dtype in (np.int8, np.uint8):
+                scale, zero_point = self.input_detail["quantization"]
+                batch = np.clip(np.round(batch / scale + zero_point), np.iinfo(in_dtype).min, np.iinfo(in_dtype).max)
+            self.interpreter.set_tensor(self.input_detail["index"], batch.astype(in_dtype))
+            self.interpreter.invoke()
+            outputs = self.interpreter.get_tensor(self.output_detail["index"])
+
+            if self.output_detail["dtype"] in (np.int8, np.uint8):
+                scale, zero_point = self.output_detail["quantization"]
+                outputs = (outputs.astype(np.float32) - zero_point) * scale
+            return np.asarray(outputs, dtype=np.float32)
+
+
+class TorchScriptClassifier:
+    """EfficientNet-B0 cuantizado y serializado con TorchScript. Devuelve softmax."""
+
+    def __init__(self, path: str):
+        import torch
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Modelo TorchScript no encontrado: {path}. Ejecuta: python -m app.tools.quantize")
+        self.model = torch.jit.load(path, map_location="cpu")
+        self.model.eval()
+
+    def predict_proba(self, batch: np.ndarray) -> np.ndarray:
+        import torch
+        with torch.no_grad():
+            outputs = self.model(torch.from_numpy(np.ascontiguousarray(batch, dtype=np.float32)))
+            return torch.nn.functional.softmax(outputs, dim=1).cpu().numpy()
+
+
+# ==========================================================
+# ONNX RUNTIME
+# ==========================================================
+
+def create_onnx_session(path: str, intra_op_threads: int = 0):
+    """Sesión de ONNX Runtime en CPU con todas las optimizaciones de grafo."""
+    import onnxruntime as ort
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Modelo ONNX no encontrado: {path}. Ejecuta: python -m app.tools.export_onnx")
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if intra_op_threads > 0:
+        options.intra_op_num_threads = intra_op_threads
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+class OnnxClassifier:
+    """Clasificador exportado a ONNX. apply_softmax para grafos que devuelven logits (PyTorch)."""
+
+    def __init__(self, path: str, apply_softmax: bool = False, intra_op_threads: int = 0):
+        self.session = create_onnx_session(path, intra_op_threads)
+        self.input_name = self.session.get_inputs()[0].name
+        self.apply_softmax = apply_softmax
+
+    def predict_proba(self, batch: np.ndarray) -> np.ndarray:
+        outputs = self.session.run(None, {self.input_name: np.ascontiguousarray(batch, dtype=np.float32)})[0]
+        return _softmax(outputs) if self.apply_softmax else outputs
+
+
+class OnnxYoloDetector:
+    """
+    YOLOv8 exportado a ONNX (salida (N, 4 + clases, anchors)) con letterbox y NMS
+    reimplementados en NumPy/OpenCV. Igual que Ultralytics, los arrays de entrada
+    se interpretan como BGR, de modo que las detecciones coinciden con el backend nativo.
+    """
+
+    def __init__(self, path: str, imgsz: int = 640, iou: float = 0.7, max_det: int = 300, intra_op_threads: int = 0):
+        self.session = create_onnx_session(path, intra_op_threads)
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = imgsz
+        self.iou = iou
+        self.max_det = max_det
+
+    def _letterbox(self, img: np.ndarray):
+        h, w = img.shape[:2]
+        r = min(self.imgsz / h, self.imgsz / w)
+        new_w, new_h = int(round(w * r)), int(round(h * r))
+        dw, dh = (self.imgsz - new_w) / 2, (self.imgsz - new_h) / 2
+
+        if (new_w, new_h) != (w, h):
+            img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+        left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+        img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+        return img, r, left, top
+
+    def detect(self, images: List[np.ndarray], conf: float = 0.15) -> List[List[Detection]]:
+        if not images:
+            return []
+
+        batch = np.empty((len(images), 3, self.imgsz, self.imgsz), dtype=np.float32)
+        meta = []
+        for i, img in enumerate(images):
+            boxed, r, left, top = self._letterbox(img)
+            # BGR -> RGB, HWC -> CHW, [0, 1]
+            batch[i] = boxed[..., ::-1].transpose(2, 0, 1) / 255.0
+            meta.append((r, left, top, img.shape[1], img.shape[0]))
+
+        outputs = self.session.run(None, {self.input_name: batch})[0]
+        return [self._postprocess(out, *m, conf) for out, m in zip(outputs, meta)]
+
+    def _postprocess(self, out: np.ndarray, r, left, top, w, h, conf: float) -> List[Detection]:
+        preds = out.T                      # (anchors, 4 + clases)
+        scores = preds[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+
+        keep = confidences > conf
+        if not np.any(keep):
+            return []
+        preds, class_ids, confidences = preds[keep], class_ids[keep], confidences[keep]
+
+        cx, cy, bw, bh = preds[:, 0], preds[:, 1], preds[:, 2], preds[:, 3]
+        boxes_xywh = np.stack([cx - bw / 2, cy - bh / 2, bw, bh], axis=1)
+
+        # NMS por clase, como Ultralytics (agnostic=False)
+        indices = cv2.dnn.NMSBoxesBatched(
+            boxes_xywh.tolist(), confidences.tolist(), class_ids.tolist(), conf, self.iou
+        )
+        indices = np.array(indices, dtype=int).flatten()[:self.max_det]
+
+        detections = []
+        for i in indices:
+            x, y, bw_i, bh_i = boxes_xywh[i]
+            x1 = min(max((x - left) / r, 0), w)
+            y1 = min(max((y - top) / r, 0), h)
+            x2 = min(max((x + bw_i - left) / r, 0), w)
+            y2 = min(max((y + bh_i - top) / r, 0), h)
+            detections.append((int(class_ids[i]), float(confidences[i]), [int(x1), int(y1), int(x2), int(y2)]))
+
+        # Mismo orden que Ultralytics: mayor confianza primero
+        return sorted(detections, key=lambda d: d[1], reverse=True)
@@ -0,0 +1,163 @@
+import asyncio
+import functools
+import math
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict
+
+from app.core.config import settings
+from app.core.metrics import INFERENCE_EXECUTOR_PENDING, INFERENCE_EXECUTOR_REJECTED_TOTAL
+
+
+class InferenceOverloadedError(Exception):
+    """El executor de inferencia no admite más trabajo; reintentar pasados retry_after segundos."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Executor acotado para las llamadas síncronas y pesadas de PredictionService.
+
+    Los endpoints async no ejecutan la inferencia en el event loop ni en el pool
+    por defecto de asyncio (compartido con el resto de la app): la envían aquí.
+    Como mucho max_workers trabajos se ejecutan a la vez y max_queue_depth esperan;
+    si la cola está llena o la espera estimada (media móvil del tiempo de servicio)
+    supera max_wait_s, el trabajo se rechaza con InferenceOverloadedError para que
+    la API responda 429 con Retry-After en lugar de acumular latencia.
+
+    El tiempo de servicio se mide por clase de trabajo (JOB_CLASSES): una foto
+    tarda milisegundos y un video entero decenas de segundos, y con una sola
+    media un video reciente bastaría para rechazar fotos durante un buen rato.
+    La espera estimada usa el tiempo de la clase de cada trabajo pendiente.
+
+    Los trabajos de video en segundo plano (video_jobs) también pasan por aquí,
+    con submit() y la clase "video": comparten los hilos con las peticiones
+    síncronas y su carga entra en la espera estimada de las demás.
+    """
+
+    JOB_CLASSES = ("photo", "batch", "frame", "video")
+
+    # Peso de la última muestra en la media móvil del tiempo de servicio
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, max_workers: int = 2, max_queue_depth: int = 32, max_wait_s: float = 10.0):
+        self.max_workers = max(1, max_workers)
+        self.max_queue_depth = max(0, max_queue_depth)
+        self.max_wait_s = max_wait_s
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._pending = 0              # trabajos en cola + en ejecución
+        # Por clase de trabajo: pendientes y media móvil del tiempo de servicio
+        self._pending_by_class = {job_class: 0 for job_class in self.JOB_CLASSES}
+        self._service_time_s = {job_class: None for job_class in self.JOB_CLASSES}
+        self.completed = 0
+        self.rejected = 0
+
+    def estimated_wait(self) -> float:
+        """Segundos que esperaría en cola un trabajo nuevo."""
+        with self._lock:
+            return self._estimated_wait_locked()
+
+    def _estimated_wait_locked(self) -> float:
+        if self._pending < self.max_workers:
+            return 0.0
+        # Tiempo medio de los trabajos pendientes según su clase (sin medidas aún: no cuentan)
+        known = [(n, self._service_time_s[c]) for c, n in self._pending_by_class.items()
+                 if n and self._service_time_s[c] is not None]
+        count = sum(n for n, _ in known)
+        if not count:
+            return 0.0
+        service_time = sum(n * t for n, t in known) / count
+        # Trabajos por delante divididos entre los hilos, más el que ya ocupa cada hilo
+        ahead = self._pending - self.max_workers + 1
+        return ahead / self.max_workers * service_time
+
+    def _reject(self, reason: str, message: str, wait: float, job_class: str):
+        self.rejected += 1
+        INFERENCE_EXECUTOR_REJECTED_TOTAL.labels(reason).inc()
+        retry_after = max(1, math.ceil(wait if wait > 0 else (self._service_time_s[job_class] or 1.0)))
+        raise InferenceOverloadedError(message, retry_after)
+
+    def submit(self, fn, *args, job_class: str = "photo", **kwargs) -> Future:
+        """
+        Admite fn(*args, **kwargs) en el executor y devuelve su Future, o lanza
+        InferenceOverloadedError. Es la entrada para hilos sin event loop (los
+        trabajos de video en segundo plano); los endpoints usan run().
+        job_class ("photo", "batch", "frame" o "video") selecciona la media de tiempo de servicio.
+        """
+        if job_class not in self.JOB_CLASSES:
+            raise ValueError(f"Clase de trabajo no válida: {job_class}")
+        with self._lock:
+            wait = self._estimated_wait_locked()
+            if self._pending >= self.max_workers + self.max_queue_depth:
+                self._reject("queue_full", "La cola de inferencia está llena", wait, job_class)
+            if wait > self.max_wait_s:
+                self._reject(
+                    "deadline", f"Espera estimada de {wait:.1f}s supera el máximo de {self.max_wait_s}s", wait, job_class
+                )
+            self._pending += 1
+            self._pending_by_class[job_class] += 1
+            INFERENCE_EXECUTOR_PENDING.set(self._pending)
+
+        try:
+            future = self._pool.submit(self._timed, job_class, functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._finished(job_class)
+            raise
+        # El trabajo deja de contar al terminar (o al cancelarse en cola), no cuando el llamante deja de esperar
+        future.add_done_callback(lambda _: self._finished(job_class))
+        return future
+
+    async def run(self, fn, *args, job_class: str = "photo", **kwargs):
+        """Ejecuta fn(*args, **kwargs) en el executor sin bloquear el event loop, o lanza InferenceOverloadedError."""
+        return await asyncio.wrap_future(self.submit(fn, *args, job_class=job_class, **kwargs))
+
+    def _finished(self, job_class: str):
+        with self._lock:
+            self._pending -= 1
+            self._pending_by_class[job_class] -= 1
+            INFERENCE_EXECUTOR_PENDING.set(self._pending)
+
+    def _timed(self, job_class: str, call):
+        t0 = time.perf_counter()
+        try:
+            return call()
+        finally:
+            elapsed = time.perf_counter() - t0
+            with self._lock:
+                self.completed += 1
+                previous = self._service_time_s[job_class]
+                self._service_time_s[job_class] = (
+                    elapsed if previous is None else previous + self.EWMA_ALPHA * (elapsed - previous)
+                )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue_depth": self.max_queue_depth,
+                "max_wait_s": self.max_wait_s,
+                "pending": self._pending,
+                "estimated_wait_s": round(self._estimated_wait_locked(), 3),
+                "pending_by_class": dict(self._pending_by_class),
+                "avg_service_s": {
+                    job_class: round(t, 3) if t is not None else None for job_class, t in self._service_time_s.items()
+                },
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Executor compartido por los endpoints de predicción
+inference_executor = InferenceExecutor(
+    max_workers=settings.INFERENCE_EXECUTOR_WORKERS,
+    max_queue_depth=settings.INFERENCE_EXECUTOR_MAX_QUEUE,
+    max_wait_s=settings.INFERENCE_EXECUTOR_MAX_WAIT_S,
+)
@@ -0,0 +1,138 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from app.services.inference_executor import InferenceOverloadedError
+
+
+class SchedulerQueueFullError(InferenceOverloadedError):
+    """
+    La cola del planificador de inferencia ha alcanzado su profundidad máxima.
+    Es un InferenceOverloadedError: la API responde 429 con Retry-After.
+    """
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message, retry_after)
+
+
+@dataclass
+class _PendingRequest:
+    inputs: Tuple[Any, Any, Any]   # (in_mob, in_v1, in_pt) con N filas
+    rows: int
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class InferenceScheduler:
+    """
+    Planificador de micro-batching dinámico delante de los clasificadores.
+
+    Las peticiones concurrentes (HTTP y WebSocket) encolan sus recortes ya
+    preprocesados; un hilo propio agrupa lo que llega hasta alcanzar
+    max_batch_size filas o max_wait_ms desde la petición más antigua, ejecuta
+    un único batch por clasificador y devuelve a cada llamante su porción.
+
+    Las peticiones HTTP llegan a través del InferenceExecutor, así que como mucho
+    hay INFERENCE_EXECUTOR_WORKERS llamantes a la vez (más las conexiones
+    WebSocket): un batch nunca junta más recortes que llamantes concurrentes.
+    """
+
+    def __init__(self, service, max_batch_size: int = 16, max_wait_ms: float = 5.0, max_queue_depth: int = 256):
+        self.service = service
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue = queue.Queue(maxsize=max(1, max_queue_depth))
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run_loop, name="inference-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+        # Las peticiones que quedaron en cola no se van a atender
+        while True:
+            try:
+                pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            pending.future.set_exception(RuntimeError("El planificador de inferencia se ha detenido"))
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, in_mob, in_v1, in_pt) -> Future:
+        """
+        Encola un batch de N recortes preprocesados. El Future se resuelve con
+        (resultados por arquitectura con N entradas cada uno, métricas de tiempo).
+        """
+        pending = _PendingRequest(inputs=(in_mob, in_v1, in_pt), rows=len(in_mob))
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            raise SchedulerQueueFullError(
+                f"Cola de inferencia llena ({self._queue.maxsize} peticiones en espera)"
+            )
+        return pending.future
+
+    # ==========================================================
+    # WORKER
+    # ==========================================================
+
+    def _run_loop(self):
+        while self._running:
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            rows = first.rows
+            deadline = first.enqueued_at + self.max_wait
+
+            # Seguimos recogiendo hasta llenar el batch o agotar la ventana de espera
+            while rows < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(pending)
+                rows += pending.rows
+
+            self._flush(batch)
+
+    def _flush(self, batch: List[_PendingRequest]):
+        flushed_at = time.perf_counter()
+        try:
+            in_mob, in_v1, in_pt = self.service._concat_inputs([p.inputs for p in batch])
+            results, timing = self.service._run_classifiers(in_mob, in_v1, in_pt, batched=True)
+        except Exception as e:
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+
+        offset = 0
+        for pending in batch:
+            end = offset + pending.rows
+            request_timing: Dict[str, Any] = dict(timing)
+            request_timing["queue_wait_ms"] = round((flushed_at - pending.enqueued_at) * 1000, 2)
+            request_timing["batch_size"] = len(in_mob)
+            pending.future.set_result(
+                ({arch: res[offset:end] for arch, res in results.items()}, request_timing)
+            )
+            offset = end
@@ -0,0 +1,352 @@
+"""
+Pool de procesos de inferencia.
+
+Cada worker es un proceso con su propio PredictionService (modelos cargados una
+vez), fijado a un subconjunto de núcleos y con un número acotado de hilos por
+framework. El proceso de la API solo decodifica y reparte: los frames viajan en
+bloques de multiprocessing.shared_memory y por la cola solo pasan nombres,
+formas y dtypes, nunca los arrays serializados.
+"""
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.core.metrics import INFERENCE_WORKER_SECONDS
+from app.services.inference_executor import InferenceOverloadedError
+
+
+# Métodos de PredictionService que se pueden ejecutar en un worker
+def _call_predict_all(service, arrays, kwargs):
+    return service.predict_all_architectures(image_array=arrays[0], **kwargs)
+
+
+def _call_predict_frame(service, arrays, kwargs):
+    return service.predict_breed_from_image_array(arrays[0], **kwargs)
+
+
+def _call_predict_multi_dog(service, arrays, kwargs):
+    return service.predict_multi_dog(image_array=arrays[0], **kwargs)
+
+
+def _call_predict_many(service, arrays, kwargs):
+    return service.predict_many(image_arrays=arrays, **kwargs)
+
+
+def _call_detect_dog_boxes(service, arrays, kwargs):
+    return service.detect_dog_boxes(arrays)
+
+
+def _call_predict_tracked(service, arrays, kwargs):
+    return service.predict_tracked(arrays, **kwargs)
+
+
+def _call_classify_probs(service, arrays, kwargs):
+    return service.classify_probs(arrays, **kwargs)
+
+
+WORKER_METHODS = {
+    "predict_all_architectures": _call_predict_all,
+    "predict_breed_from_image_array": _call_predict_frame,
+    "predict_multi_dog": _call_predict_multi_dog,
+    "predict_many": _call_predict_many,
+    "detect_dog_boxes": _call_detect_dog_boxes,
+    "predict_tracked": _call_predict_tracked,
+    "classify_probs": _call_classify_probs,
+}
+
+
+def _worker_main(worker_id: int, cores: Optional[List[int]], threads: int, requests, results):
+    """Bucle principal del proceso worker."""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    # Los frameworks se importan al cargar los modelos: fijar los hilos antes
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    from app.core.config import settings
+    from app.services.prediction_service import PredictionService
+
+    settings.INFERENCE_WORKERS = 0  # un worker nunca crea su propio pool
+    settings.TF_INTRA_OP_THREADS = threads
+    settings.TORCH_INTRA_OP_THREADS = threads
+    settings.ONNX_INTRA_OP_THREADS = threads
+
+    service = PredictionService(use_mock=False, load_on_init=False)
+    service.ensure_loaded()
+    results.put(("ready", worker_id, service.readiness(), os.getpid()))
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+
+        request_id, method, shm_name, layout, kwargs, sent_at = message
+        started_at = time.time()
+        shm = None
+        arrays = []
+        result, error = None, None
+        try:
+            # Si la petición caducó en la API, el bloque ya no existe (FileNotFoundError)
+            shm = shared_memory.SharedMemory(name=shm_name)
+            arrays = [
+                np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+                for shape, dtype, offset in layout
+            ]
+            result = WORKER_METHODS[method](service, arrays, kwargs)
+        except Exception as e:
+            # Las excepciones no siempre se pueden serializar: viajan como (tipo, mensaje, retry_after)
+            error = (type(e).__name__, str(e), getattr(e, "retry_after", None))
+        finally:
+            # Soltar las vistas antes de cerrar el bloque compartido
+            del arrays
+            if shm is not None:
+                shm.close()
+
+        results.put(("result", request_id, result, error, started_at, time.time()))
+
+
+def _rebuild_error(worker_id: int, error: tuple) -> Exception:
+    """Excepción equivalente en la API a la que lanzó el worker, para que el llamante la trate igual."""
+    name, message, retry_after = error
+    if retry_after is not None:
+        return InferenceOverloadedError(message, retry_after)
+    if name == "ValueError":
+        return ValueError(message)
+    return RuntimeError(f"Error en worker {worker_id}: {name}: {message}")
+
+
+class InferenceWorkerPool:
+    """
+    Reparte peticiones entre procesos worker por menor número de peticiones en curso.
+
+    Las excepciones de un worker se relanzan en el Future del llamante. Si un
+    worker muere, sus peticiones en curso fallan al momento (sin esperar al
+    timeout) y deja de recibir peticiones; las que caducan liberan su bloque de
+    memoria compartida.
+    """
+
+    # Cada cuánto comprueba el colector que los workers siguen vivos
+    LIVENESS_INTERVAL_S = 1.0
+
+    def __init__(self, num_workers: int, threads_per_worker: int = 2, pin_cores: bool = True):
+        self.num_workers = max(1, num_workers)
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.pin_cores = pin_cores
+
+        self._ctx = mp.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._workers: List[Dict] = []
+        self._pending: Dict[int, tuple] = {}   # request_id -> (future, shm, worker_id, sent_at)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._collector = None
+        self._ready = threading.Event()
+        self._stopping = False
+
+    def _core_sets(self) -> List[Optional[List[int]]]:
+        if not self.pin_cores or not hasattr(os, "sched_getaffinity"):
+            return [None] * self.num_workers
+        cores = sorted(os.sched_getaffinity(0))
+        per_worker = max(1, len(cores) // self.num_workers)
+        return [
+            cores[(i * per_worker) % len(cores):(i * per_worker) % len(cores) + per_worker]
+            for i in range(self.num_workers)
+        ]
+
+    def start(self):
+        for worker_id, cores in enumerate(self._core_sets()):
+            requests = self._ctx.Queue()
+            process = self._ctx.Process(
+                target=_worker_main,
+                args=(worker_id, cores, self.threads_per_worker, requests, self._results),
+                name=f"inference-worker-{worker_id}",
+                daemon=True,
+            )
+            process.start()
+            self._workers.append({
+                "process": process, "requests": requests, "cores": cores, "pid": process.pid,
+                "ready": False, "dead": False, "readiness": None, "in_flight": 0, "completed": 0,
+                "dispatch_ms_total": 0.0, "compute_ms_total": 0.0,
+            })
+
+        self._collector = threading.Thread(target=self._collect_results, name="inference-workers-collector", daemon=True)
+        self._collector.start()
+
+    def wait_ready(self, timeout: float) -> bool:
+        return self._ready.wait(timeout)
+
+    @property
+    def worker_readiness(self) -> List[Dict]:
+        return [w["readiness"] for w in self._workers if w["readiness"] is not None]
+
+    def stop(self):
+        self._stopping = True
+        for worker in self._workers:
+            worker["requests"].put(None)
+        for worker in self._workers:
+            worker["process"].join(timeout=5)
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+        self._results.put(None)
+        if self._collector is not None:
+            self._collector.join(timeout=5)
+
+        with self._lock:
+            for future, shm, _, _ in self._pending.values():
+                future.set_exception(RuntimeError("El pool de inferencia se ha detenido"))
+                shm.close()
+                shm.unlink()
+            self._pending.clear()
+
+    # ==========================================================
+    # DISPATCH
+    # ==========================================================
+
+    def submit(self, method: str, arrays: List[np.ndarray], **kwargs) -> Future:
+        """Copia los arrays a un bloque de memoria compartida y encola la petición en el worker menos cargado."""
+        layout, offset = [], 0
+        for arr in arrays:
+            layout.append((arr.shape, arr.dtype.str, offset))
+            offset += arr.nbytes
+
+        shm = shared_memory.SharedMemory(create=True, size=max(1, offset))
+        for arr, (shape, dtype, start) in zip(arrays, layout):
+            np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=start)[...] = arr
+
+        future = Future()
+        request_id = next(self._ids)
+        with self._lock:
+            alive = [i for i, w in enumerate(self._workers) if not w["dead"]]
+            if not alive:
+                shm.close()
+                shm.unlink()
+                raise RuntimeError("No queda ningún worker de inferencia vivo")
+            worker_id = min(alive, key=lambda i: self._workers[i]["in_flight"])
+            self._workers[worker_id]["in_flight"] += 1
+            sent_at = time.time()
+            self._pending[request_id] = (future, shm, worker_id, sent_at)
+
+        self._workers[worker_id]["requests"].put((request_id, method, shm.name, layout, kwargs, sent_at))
+        return future
+
+    def run(self, method: str, arrays: List[np.ndarray], timeout: Optional[float] = None, **kwargs):
+        future = self.submit(method, arrays, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self._abandon(future)
+            raise
+
+    def _release(self, request_id: int) -> Optional[tuple]:
+        """Saca la petición de las pendientes y libera su bloque compartido. Requiere el lock."""
+        pending = self._pending.pop(request_id, None)
+        if pending is None:
+            return None
+        future, shm, worker_id, sent_at = pending
+        self._workers[worker_id]["in_flight"] -= 1
+        shm.close()
+        shm.unlink()
+        return pending
+
+    def _abandon(self, future: Future):
+        """Petición caducada: su resultado, si llega, se descarta."""
+        with self._lock:
+            for request_id, pending in list(self._pending.items()):
+                if pending[0] is future:
+                    self._release(request_id)
+                    break
+
+    def _check_workers(self):
+        """Marca los workers muertos y falla al momento sus peticiones en curso."""
+        if self._stopping:
+            return
+        with self._lock:
+            for worker_id, worker in enumerate(self._workers):
+                if worker["dead"] or worker["process"].is_alive():
+                    continue
+                worker["dead"] = True
+                print(f"❌ El worker de inferencia {worker_id} ha terminado (exitcode {worker['process'].exitcode})")
+                for request_id, pending in list(self._pending.items()):
+                    if pending[2] == worker_id:
+                        self._release(request_id)
+                        pending[0].set_exception(RuntimeError(f"El worker de inferencia {worker_id} ha terminado"))
+
+    def _collect_results(self):
+        last_check = time.monotonic()
+        while True:
+            # Comprobación por tiempo: con otros workers respondiendo la cola nunca
+            # llega a quedarse vacía un intervalo entero
+            if time.monotonic() - last_check >= self.LIVENESS_INTERVAL_S:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                message = self._results.get(timeout=self.LIVENESS_INTERVAL_S)
+            except queue.Empty:
+                continue
+            if message is None:
+                break
+
+            if message[0] == "ready":
+                _, worker_id, readiness, pid = message
+                self._workers[worker_id].update(ready=True, readiness=readiness, pid=pid)
+                if all(w["ready"] for w in self._workers):
+                    self._ready.set()
+                continue
+
+            _, request_id, result, error, started_at, finished_at = message
+            with self._lock:
+                pending = self._release(request_id)
+                if pending is None:
+                    continue
+                future, _, worker_id, sent_at = pending
+                worker = self._workers[worker_id]
+                worker["completed"] += 1
+                dispatch_ms = (started_at - sent_at) * 1000
+                compute_ms = (finished_at - started_at) * 1000
+                worker["dispatch_ms_total"] += dispatch_ms
+                worker["compute_ms_total"] += compute_ms
+            INFERENCE_WORKER_SECONDS.labels("dispatch").observe(dispatch_ms / 1000)
+            INFERENCE_WORKER_SECONDS.labels("compute").observe(compute_ms / 1000)
+
+            if error is not None:
+                future.set_exception(_rebuild_error(worker_id, error))
+                continue
+
+            # Solo los resultados con formato de predicción llevan los tiempos del worker; el
+            # diccionario por arquitectura de classify_probs no debe ganar claves nuevas
+            if isinstance(result, dict) and "success" in result:
+                result["worker"] = {
+                    "worker_id": worker_id,
+                    "dispatch_ms": round(dispatch_ms, 2),
+                    "compute_ms": round(compute_ms, 2),
+                    "roundtrip_ms": round((time.time() - sent_at) * 1000, 2),
+                }
+            future.set_result(result)
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    "worker_id": i,
+                    "pid": w["pid"],
+                    "alive": w["process"].is_alive(),
+                    "dead": w["dead"],
+                    "ready": w["ready"],
+                    "cores": w["cores"],
+                    "threads": self.threads_per_worker,
+                    "in_flight": w["in_flight"],
+                    "completed": w["completed"],
+                    "avg_dispatch_ms": round(w["dispatch_ms_total"] / w["completed"], 2) if w["completed"] else None,
+                    "avg_compute_ms": round(w["compute_ms_total"] / w["completed"], 2) if w["completed"] else None,
+                }
+                for i, w in enumerate(self._workers)
+            ]
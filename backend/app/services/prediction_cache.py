@@ -0,0 +1,74 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.core.metrics import PREDICTION_CACHE_REQUESTS_TOTAL
+
+
+class PredictionCache:
+    """
+    Caché LRU con TTL de resultados de predicción, indexada por el SHA-256 de los
+    píxeles decodificados y la versión del conjunto de modelos. Así una misma foto
+    reenviada (reintentos, /input/image seguido de /predict, compartidos) no vuelve
+    a pasar por YOLO ni por los 3 clasificadores.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(image: np.ndarray, model_version: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{model_version}|{image.shape}|{image.dtype}".encode())
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                PREDICTION_CACHE_REQUESTS_TOTAL.labels("miss").inc()
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            PREDICTION_CACHE_REQUESTS_TOTAL.labels("hit").inc()
+            value = entry[1]
+        # Copia para que el llamante pueda modificar el resultado sin alterar la caché
+        return copy.deepcopy(value)
+
+    def put(self, key: str, value: Dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
@@ -1,16 +1,34 @@
 import os
 import json
+import hashlib
 import cv2
 import numpy as np
-import tensorflow as tf
-import torch
-import torch.nn as nn
-from torchvision import models, transforms
-from PIL import Image
-from typing import List, Dict
+from typing import List, Dict, Optional
 from dataclasses import dataclass
-from ultralytics import YOLO
 import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.core.metrics import DOG_DETECTIONS_TOTAL, INFERENCE_BATCH_ITEMS, INFERENCE_STAGE_SECONDS
+from app.services.inference_backends import (
+    ONNX_MODEL_FILES,
+    QUANTIZED_MODEL_FILES,
+    KerasClassifier,
+    OnnxClassifier,
+    OnnxYoloDetector,
+    TFLiteClassifier,
+    TorchClassifier,
+    TorchScriptClassifier,
+    UltralyticsDetector,
+    configure_native_threads,
+)
+from app.services.inference_executor import InferenceOverloadedError
+from app.services.inference_scheduler import InferenceScheduler
+from app.services.prediction_cache import PredictionCache
+from app.services.inference_workers import InferenceWorkerPool
+from app.services.detector_cascade import CascadeDetector
 
 
 @dataclass
@@ -22,8 +40,56 @@ class PredictionResult:
     api_id: str = None
 
 
+@dataclass
+class LabelTable:
+    """Metadatos de etiquetas alineados por índice de salida del modelo."""
+    breed_en: List[str]
+    breed_es: List[str]
+    matched: np.ndarray
+    api_id: List[Optional[str]]
+
+    @classmethod
+    def build(cls, labels: List[str], translation: Dict, correlation: Dict) -> "LabelTable":
+        breed_en, breed_es, matched, api_ids = [], [], [], []
+        for name_en in labels:
+            # Use correlation data for precise API name
+            corr_entry = correlation.get(name_en, {})
+            api_matched = corr_entry.get("matched", False)
+            api_name = corr_entry.get("api_name")
+
+            breed_en.append(api_name if api_matched and api_name else name_en)
+            breed_es.append(translation.get(name_en, name_en))
+            matched.append(bool(api_matched))
+            api_ids.append(corr_entry.get("api_id"))
+
+        return cls(breed_en, breed_es, np.array(matched, dtype=bool), api_ids)
+
+
 class PredictionService:
-    def __init__(self, use_mock: bool = False):
+    # Clases COCO: 16=dog
+    DOG_CLASS_ID = 16
+    # Clases COCO de animales que NO son perro
+    # 14=bird, 15=cat, 17=horse, 18=sheep, 19=cow, 20=elephant, 21=bear, 22=zebra, 23=giraffe
+    NON_DOG_ANIMALS = {14, 15, 17, 18, 19, 20, 21, 22, 23}
+
+    # Normalización ImageNet de EfficientNet (equivalente a transforms.Normalize)
+    IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+    IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+    # (x / 255 - mean) / std  ==  x * PT_SCALE - PT_SHIFT
+    PT_SCALE = 1.0 / (255.0 * IMAGENET_STD)
+    PT_SHIFT = IMAGENET_MEAN / IMAGENET_STD
+
+    # Modelos cuyo estado de carga/calentamiento se reporta en /ready
+    MODEL_NAMES = ("yolo", "mobile", "keras", "pytorch")
+    ARCHITECTURES = ("mobile", "keras", "pytorch")
+    # Máximo de vistas de test-time augmentation por recorte
+    MAX_TTA_VIEWS = 8
+    # IoU a partir del cual una caja de otro animal se considera el mismo objeto que un perro
+    SAME_OBJECT_IOU = 0.5
+    # "full": las 3 arquitecturas siempre; "adaptive": MobileNet primero y el resto solo si duda
+    PREDICTION_MODES = ("full", "adaptive")
+
+    def __init__(self, use_mock: bool = False, load_on_init: bool = True):
         self.use_mock = use_mock
 
         # Modelos
@@ -33,6 +99,35 @@ class PredictionService:
         self.model_pytorch = None
 
         self.model_loaded = False
+        self.engine = None
+        self.profile = None
+
+        # Estado de carga: idle -> loading -> warming -> ready (o failed / degraded si un modelo no calienta)
+        self.state = "idle"
+        self.model_status = {
+            name: {"loaded": False, "warm": False, "load_ms": None, "warmup_ms": None, "error": None}
+            for name in self.MODEL_NAMES
+        }
+        self._load_lock = threading.Lock()
+
+        # Pool de hilos propio para solapar los 3 clasificadores (PARALLEL_CLASSIFIERS)
+        self._classifier_pool = None
+
+        # Planificador de micro-batching entre peticiones (INFERENCE_SCHEDULER_ENABLED)
+        self.scheduler = None
+
+        # Caché de resultados por contenido (PREDICTION_CACHE_ENABLED); se vacía al recargar modelos
+        self.cache = None
+        if settings.PREDICTION_CACHE_ENABLED:
+            self.cache = PredictionCache(
+                max_entries=settings.PREDICTION_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.PREDICTION_CACHE_TTL_SECONDS
+            )
+        self.model_version = None
+
+        # Pool de procesos de inferencia (INFERENCE_WORKERS > 0)
+        self.worker_pool = None
+        self._worker_pool_failed = False
 
         # Paths
         self.BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -40,6 +135,10 @@ class PredictionService:
         self.DATA_DIR = os.path.join(self.BASE_DIR, "data")
 
         self.img_size = (224, 224)
+        # Buffer uint8 de recortes redimensionados, reutilizado por hilo
+        self._preprocess_local = threading.local()
+        # Media móvil del tiempo de los clasificadores con una sola vista (referencia del coste de TTA)
+        self._single_view_ms = None
 
         self.breed_labels_355 = []
         self.breed_labels_120 = []
@@ -50,7 +149,11 @@ class PredictionService:
         self.corr_120 = {}
         self.corr_355 = {}
 
-        if not self.use_mock:
+        # Tablas de etiquetas precalculadas (ver LabelTable)
+        self.label_table_355 = LabelTable([], [], np.zeros(0, dtype=bool), [])
+        self.label_table_120 = LabelTable([], [], np.zeros(0, dtype=bool), [])
+
+        if not self.use_mock and load_on_init:
             self.load_model()
 
     # ==========================================================
@@ -58,58 +161,318 @@ class PredictionService:
     # ==========================================================
 
     def load_model(self):
+        self.state = "loading"
         try:
-            device = torch.device("cpu")
+            # Modelos según el motor configurado (INFERENCE_ENGINE).
+            # Con MODEL_PROFILE=quantized los clasificadores se sustituyen por sus versiones INT8
+            quantized = settings.MODEL_PROFILE == "quantized"
+            if settings.INFERENCE_ENGINE == "onnx":
+                try:
+                    self._load_onnx_models(load_classifiers=not quantized)
+                except (ImportError, FileNotFoundError) as e:
+                    print(f"⚠️ Motor ONNX no disponible ({e}). Usando los frameworks nativos.")
+                    self._load_native_models(load_classifiers=not quantized)
+            else:
+                self._load_native_models(load_classifiers=not quantized)
 
-            # YOLO detector
-            self.yolo = YOLO(os.path.join(self.MODELS_DIR, "yolov8m.pt"))
+            if quantized:
+                self._load_quantized_classifiers()
+            self.profile = settings.MODEL_PROFILE
 
-            # Keras models
-            self.model_mobile = tf.keras.models.load_model(
-                os.path.join(self.MODELS_DIR, "pawsense_mobile_model.keras")
-            )
+            if settings.DETECTOR_CASCADE_ENABLED:
+                self._load_detector_cascade()
 
-            self.model_keras_v1 = tf.keras.models.load_model(
-                os.path.join(self.MODELS_DIR, "modelo_prediccion_perros_v1.keras")
-            )
+            self._load_labels()
 
-            # PyTorch EfficientNet-B0
-            self.model_pytorch = models.efficientnet_b0(weights=None)
-            num_ftrs = self.model_pytorch.classifier[1].in_features
-            self.model_pytorch.classifier[1] = nn.Sequential(
-                nn.Dropout(p=0.2, inplace=True),
-                nn.Linear(num_ftrs, 120)
-            )
+            if settings.PARALLEL_CLASSIFIERS and self._classifier_pool is None:
+                self._classifier_pool = ThreadPoolExecutor(
+                    max_workers=max(1, settings.CLASSIFIER_POOL_WORKERS),
+                    thread_name_prefix="classifier"
+                )
+
+            if settings.INFERENCE_SCHEDULER_ENABLED and self.scheduler is None:
+                self.scheduler = InferenceScheduler(
+                    self,
+                    max_batch_size=settings.INFERENCE_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.INFERENCE_BATCH_MAX_WAIT_MS,
+                    max_queue_depth=settings.INFERENCE_QUEUE_MAX_DEPTH
+                )
+                self.scheduler.start()
+                if settings.INFERENCE_BATCH_MAX_SIZE > settings.INFERENCE_EXECUTOR_WORKERS:
+                    print(
+                        f"⚠️ INFERENCE_BATCH_MAX_SIZE={settings.INFERENCE_BATCH_MAX_SIZE} pero solo hay "
+                        f"INFERENCE_EXECUTOR_WORKERS={settings.INFERENCE_EXECUTOR_WORKERS} peticiones HTTP "
+                        "concurrentes: los batches del planificador no pasarán de ese tamaño"
+                    )
 
-            pth_path = os.path.join(self.MODELS_DIR, "modelo_perros_pytorch.pth")
-            self.model_pytorch.load_state_dict(torch.load(pth_path, map_location=device))
-            self.model_pytorch.eval()
-
-            # Labels 355 (MobileNet)
-            with open(os.path.join(self.DATA_DIR, "breed_names_mobile_es.json"), 'r', encoding='utf-8') as f:
-                self.translation_355 = json.load(f)
-                self.breed_labels_355 = list(self.translation_355.keys())
-
-            # Labels 120 (Keras/PyTorch)
-            with open(os.path.join(self.DATA_DIR, "breed_names_es.json"), 'r', encoding='utf-8') as f:
-                self.translation_120 = json.load(f)
-                self.breed_labels_120 = list(self.translation_120.keys())
-
-            # Breed Correlation
-            with open(os.path.join(self.DATA_DIR, "breed_correlation.json"), 'r', encoding='utf-8') as f:
-                corr_data = json.load(f)
-                for entry in corr_data["breeds"]:
-                    if entry["model"] == "keras_pytorch_120":
-                        self.corr_120[entry["model_label"]] = entry
-                    elif entry["model"] == "mobilenet_355":
-                        self.corr_355[entry["model_label"]] = entry
+            # Nueva versión del conjunto de modelos: los resultados cacheados dejan de ser válidos
+            self.model_version = self._compute_model_version()
+            if self.cache is not None:
+                self.cache.clear()
 
             self.model_loaded = True
-            print("Triple AI loaded successfully")
+            self.use_mock = False
+            self.state = "loaded"
+            print(f"Triple AI loaded successfully ({self.engine}, {self.profile})")
 
         except Exception as e:
             print(f"Error loading models: {e}")
             self.use_mock = True
+            self.state = "failed"
+
+    def _load_labels(self):
+        """
+        Etiquetas, traducciones y correlaciones de razas (LabelTable por arquitectura).
+        Con workers de inferencia también se cargan en el proceso de la API, que
+        decodifica las distribuciones agregadas de los videos (decode_probs).
+        """
+        # Labels 355 (MobileNet)
+        with open(os.path.join(self.DATA_DIR, "breed_names_mobile_es.json"), 'r', encoding='utf-8') as f:
+            self.translation_355 = json.load(f)
+            self.breed_labels_355 = list(self.translation_355.keys())
+
+        # Labels 120 (Keras/PyTorch)
+        with open(os.path.join(self.DATA_DIR, "breed_names_es.json"), 'r', encoding='utf-8') as f:
+            self.translation_120 = json.load(f)
+            self.breed_labels_120 = list(self.translation_120.keys())
+
+        # Breed Correlation
+        with open(os.path.join(self.DATA_DIR, "breed_correlation.json"), 'r', encoding='utf-8') as f:
+            corr_data = json.load(f)
+            for entry in corr_data["breeds"]:
+                if entry["model"] == "keras_pytorch_120":
+                    self.corr_120[entry["model_label"]] = entry
+                elif entry["model"] == "mobilenet_355":
+                    self.corr_355[entry["model_label"]] = entry
+
+        self.label_table_355 = LabelTable.build(self.breed_labels_355, self.translation_355, self.corr_355)
+        self.label_table_120 = LabelTable.build(self.breed_labels_120, self.translation_120, self.corr_120)
+
+    def _load_native_models(self, load_classifiers: bool = True):
+        """YOLOv8m (Ultralytics), los 2 modelos Keras y EfficientNet-B0 (PyTorch)."""
+        # Limitar hilos intra-op para que las pasadas concurrentes no sobresuscriban los núcleos
+        configure_native_threads(settings.TF_INTRA_OP_THREADS, settings.TORCH_INTRA_OP_THREADS)
+
+        # YOLO detector
+        self.yolo = self._timed_load("yolo", lambda: UltralyticsDetector(os.path.join(self.MODELS_DIR, "yolov8m.pt")))
+        self.engine = "native"
+
+        if not load_classifiers:
+            return
+
+        # Keras models
+        self.model_mobile = self._timed_load(
+            "mobile", lambda: KerasClassifier(os.path.join(self.MODELS_DIR, "pawsense_mobile_model.keras"))
+        )
+        self.model_keras_v1 = self._timed_load(
+            "keras", lambda: KerasClassifier(os.path.join(self.MODELS_DIR, "modelo_prediccion_perros_v1.keras"))
+        )
+
+        # PyTorch EfficientNet-B0
+        self.model_pytorch = self._timed_load(
+            "pytorch", lambda: TorchClassifier(os.path.join(self.MODELS_DIR, "modelo_perros_pytorch.pth"))
+        )
+
+    def _load_onnx_models(self, load_classifiers: bool = True):
+        """Los 4 modelos como grafos ONNX bajo ONNX Runtime (CPU)."""
+        threads = settings.ONNX_INTRA_OP_THREADS
+        onnx_path = lambda key: os.path.join(self.MODELS_DIR, ONNX_MODEL_FILES[key])
+
+        yolo = self._timed_load("yolo", lambda: OnnxYoloDetector(onnx_path("yolo"), intra_op_threads=threads))
+        if load_classifiers:
+            model_mobile = self._timed_load("mobile", lambda: OnnxClassifier(onnx_path("mobile"), intra_op_threads=threads))
+            model_keras_v1 = self._timed_load("keras", lambda: OnnxClassifier(onnx_path("keras"), intra_op_threads=threads))
+            # El grafo de PyTorch devuelve logits
+            model_pytorch = self._timed_load(
+                "pytorch", lambda: OnnxClassifier(onnx_path("pytorch"), apply_softmax=True, intra_op_threads=threads)
+            )
+            self.model_mobile, self.model_keras_v1, self.model_pytorch = model_mobile, model_keras_v1, model_pytorch
+
+        self.yolo = yolo
+        self.engine = "onnx"
+
+    def _load_quantized_classifiers(self):
+        """Clasificadores INT8: TFLite para los modelos Keras y TorchScript para EfficientNet-B0."""
+        quantized_path = lambda key: os.path.join(self.MODELS_DIR, QUANTIZED_MODEL_FILES[key])
+
+        if settings.TORCH_INTRA_OP_THREADS > 0:
+            configure_native_threads(torch_threads=settings.TORCH_INTRA_OP_THREADS)
+
+        self.model_mobile = self._timed_load(
+            "mobile", lambda: TFLiteClassifier(quantized_path("mobile"), num_threads=settings.TF_INTRA_OP_THREADS)
+        )
+        self.model_keras_v1 = self._timed_load(
+            "keras", lambda: TFLiteClassifier(quantized_path("keras"), num_threads=settings.TF_INTRA_OP_THREADS)
+        )
+        self.model_pytorch = self._timed_load("pytorch", lambda: TorchScriptClassifier(quantized_path("pytorch")))
+
+    def _load_detector_cascade(self):
+        """Antepone un YOLO pequeño (DETECTOR_FAST_MODEL) al detector ya cargado, con el mismo motor."""
+        fast_file = settings.DETECTOR_FAST_MODEL
+        if self.engine == "onnx":
+            fast_path = os.path.join(self.MODELS_DIR, os.path.splitext(fast_file)[0] + ".onnx")
+            fast = self._timed_load(
+                "yolo_fast", lambda: OnnxYoloDetector(fast_path, intra_op_threads=settings.ONNX_INTRA_OP_THREADS)
+            )
+        else:
+            fast = self._timed_load("yolo_fast", lambda: UltralyticsDetector(os.path.join(self.MODELS_DIR, fast_file)))
+
+        self.yolo = CascadeDetector(
+            fast,
+            self.yolo,
+            dog_class_id=self.DOG_CLASS_ID,
+            non_dog_animals=self.NON_DOG_ANIMALS,
+            band_low=settings.DETECTOR_ESCALATION_LOW,
+            band_high=settings.DETECTOR_ESCALATION_HIGH,
+            log_every=settings.DETECTOR_CASCADE_LOG_EVERY,
+        )
+
+    def _compute_model_version(self) -> str:
+        """Huella del conjunto de modelos: motor, perfil y tamaño/fecha de cada fichero de app/models."""
+        digest = hashlib.sha256(f"{self.engine}|{self.profile}".encode())
+        for name in sorted(os.listdir(self.MODELS_DIR)):
+            stat = os.stat(os.path.join(self.MODELS_DIR, name))
+            digest.update(f"|{name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()[:16]
+
+    def _timed_load(self, name: str, factory):
+        """Carga un modelo registrando el tiempo empleado en model_status."""
+        t0 = time.perf_counter()
+        try:
+            model = factory()
+        except Exception as e:
+            self.model_status.setdefault(name, {}).update(loaded=False, warm=False, error=str(e))
+            raise
+        self.model_status.setdefault(name, {}).update(
+            loaded=True, warm=False, load_ms=round((time.perf_counter() - t0) * 1000, 2), warmup_ms=None, error=None
+        )
+        return model
+
+    # ==========================================================
+    # LIFECYCLE (warmup / readiness)
+    # ==========================================================
+
+    def warmup(self):
+        """
+        Ejecuta cada modelo una vez con entradas ficticias (640 para YOLO, 224x224
+        para los clasificadores) para que la primera petición real no pague el
+        trazado de grafos ni la reserva de memoria. El estado final es "ready" solo
+        si todos los modelos calentaron; si no, "degraded".
+        """
+        if not self.model_loaded:
+            return
+
+        self.state = "warming"
+        dummy_frame = np.zeros((640, 640, 3), dtype=np.uint8)
+        in_mob, in_v1, in_pt = self._build_inputs([np.zeros((self.img_size[1], self.img_size[0], 3), dtype=np.uint8)])
+        steps = {
+            "yolo": lambda: self.yolo.detect([dummy_frame], conf=0.15),
+            "mobile": lambda: self._predict_probs(self.model_mobile, in_mob),
+            "keras": lambda: self._predict_probs(self.model_keras_v1, in_v1),
+            "pytorch": lambda: self._predict_probs(self.model_pytorch, in_pt),
+        }
+        if isinstance(self.yolo, CascadeDetector):
+            # Calentar cada etapa por separado para no contar el frame ficticio como escalado
+            steps["yolo"] = lambda: self.yolo.full.detect([dummy_frame], conf=0.15)
+            steps["yolo_fast"] = lambda: self.yolo.fast.detect([dummy_frame], conf=0.15)
+
+        for name, step in steps.items():
+            t0 = time.perf_counter()
+            try:
+                step()
+                self.model_status[name].update(warm=True, warmup_ms=round((time.perf_counter() - t0) * 1000, 2))
+            except Exception as e:
+                print(f"⚠️ Error calentando {name}: {e}")
+                self.model_status[name].update(warm=False, error=str(e))
+
+        # Solo "ready" (200 en /ready) si todos los modelos respondieron; si alguno
+        # falló, "degraded" (503) para no enrutar tráfico a un pod con un modelo roto
+        cold = [name for name, status in self.model_status.items() if not status.get("warm")]
+        if cold:
+            print(f"❌ Modelos sin calentar: {', '.join(cold)}")
+        self.state = "degraded" if cold else "ready"
+
+    def ensure_loaded(self):
+        """
+        Carga y calienta los modelos si aún no lo están. Es seguro llamarlo desde
+        varios hilos: si la carga en segundo plano está en curso, espera a que termine.
+        """
+        with self._load_lock:
+            if settings.INFERENCE_WORKERS > 0:
+                # Si los workers no arrancaron no se reintenta en cada petición (cada intento
+                # bloquearía hasta INFERENCE_WORKER_START_TIMEOUT_S con el lock tomado)
+                if self.worker_pool is None and not self._worker_pool_failed:
+                    self._start_worker_pool()
+                return
+
+            if not self.model_loaded:
+                self.load_model()
+                self.warmup()
+
+    def _start_worker_pool(self):
+        """
+        Modo multiproceso: los modelos viven en INFERENCE_WORKERS procesos y este
+        proceso solo reparte frames a través de memoria compartida.
+        """
+        self.state = "loading"
+        pool = InferenceWorkerPool(
+            num_workers=settings.INFERENCE_WORKERS,
+            threads_per_worker=settings.INFERENCE_WORKER_THREADS,
+            pin_cores=settings.INFERENCE_WORKER_PIN_CORES
+        )
+        pool.start()
+        if not pool.wait_ready(settings.INFERENCE_WORKER_START_TIMEOUT_S):
+            print("❌ Los workers de inferencia no arrancaron a tiempo; se usará el modo mock hasta reiniciar")
+            pool.stop()
+            self._worker_pool_failed = True
+            self.use_mock = True
+            self.state = "failed"
+            return
+
+        # Todos los workers cargan la misma configuración: reportamos la del primero
+        worker_state = pool.worker_readiness[0]
+        self.engine = worker_state["engine"]
+        self.profile = worker_state["profile"]
+        self.model_status = worker_state["models"]
+        self.model_version = worker_state["model_version"]
+        self.worker_pool = pool
+        self.model_loaded = worker_state["ready"]
+        self.use_mock = False
+        self.state = worker_state["state"]
+        if self.model_loaded:
+            self._load_labels()
+
+    def _run_in_worker(self, method: str, arrays: List[np.ndarray], **kwargs):
+        return self.worker_pool.run(method, arrays, timeout=settings.INFERENCE_WORKER_TIMEOUT_S, **kwargs)
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    def readiness(self) -> Dict:
+        """Estado de carga y calentamiento por modelo para el endpoint /ready."""
+        return {
+            "ready": self.is_ready,
+            "state": self.state,
+            "engine": self.engine,
+            "profile": self.profile,
+            "models": self.model_status,
+            "model_version": self.model_version,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "workers": self.worker_pool.stats() if self.worker_pool is not None else None,
+            "detector_cascade": self.yolo.stats() if isinstance(self.yolo, CascadeDetector) else None,
+        }
+
+    def shutdown(self):
+        if self.worker_pool is not None:
+            self.worker_pool.stop()
+            self.worker_pool = None
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            self.scheduler = None
+        if self._classifier_pool is not None:
+            self._classifier_pool.shutdown(wait=False)
+            self._classifier_pool = None
 
     # ==========================================================
     # IMAGE PREPROCESSING
@@ -129,7 +492,7 @@ class PredictionService:
 
         return img[ny1:ny2, nx1:nx2]
 
-    def _get_processed_inputs(self, image_path: str = None, image_array: np.ndarray = None, strict_dog_detection: bool = False):
+    def _load_image(self, image_path: str = None, image_array: np.ndarray = None):
         if image_path:
             img_bgr = cv2.imread(image_path)
         else:
@@ -138,87 +501,191 @@ class PredictionService:
         if img_bgr is None: 
             raise ValueError("No se pudo procesar la imagen")
         
-        img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-        
-        # 1. Detección YOLOv8m (umbral bajo para capturar todas las detecciones)
-        results = self.yolo(img_rgb, verbose=False, conf=0.15)
-        
-        # Clases COCO de animales que NO son perro
-        NON_DOG_ANIMALS = {14, 15, 17, 18, 19, 20, 21, 22, 23}
-        # 14=bird, 15=cat, 17=horse, 18=sheep, 19=cow, 20=elephant, 21=bear, 22=zebra, 23=giraffe
+        return cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
 
+    def _best_dog(self, detections):
+        """Mejor detección de perro (confidence, coords) o None, y los demás animales detectados."""
         best_dog = None       # (confidence, coords)
         other_animals = []    # [(class_id, confidence, coords)]
 
-        for r in results:
-            for box in r.boxes:
-                confidence = float(box.conf[0].cpu().numpy())
-                class_id = int(box.cls)
-                coords = list(map(int, box.xyxy[0].cpu().numpy()))
+        for class_id, confidence, coords in detections:
+            if class_id == self.DOG_CLASS_ID and confidence > 0.40:
+                if best_dog is None or confidence > best_dog[0]:
+                    best_dog = (confidence, coords)
 
-                if class_id == 16 and confidence > 0.40:
-                    if best_dog is None or confidence > best_dog[0]:
-                        best_dog = (confidence, coords)
+            if class_id in self.NON_DOG_ANIMALS and confidence > 0.15:
+                other_animals.append((class_id, confidence, coords))
 
-                if class_id in NON_DOG_ANIMALS and confidence > 0.15:
-                    other_animals.append((class_id, confidence, coords))
+        return best_dog, other_animals
+
+    @staticmethod
+    def _has_competing_animal(best_dog, other_animals) -> bool:
+        # Si el otro animal tiene al menos 30% de la confianza del perro, es sospechoso
+        return any(animal_conf >= best_dog[0] * 0.3 for _, animal_conf, _ in other_animals)
+
+    def _strict_dog_box(self, detections):
+        """(confidence, coords) del perro con la detección estricta, o None si se descarta."""
+        best_dog, other_animals = self._best_dog(detections)
+        if best_dog is None or self._has_competing_animal(best_dog, other_animals):
+            return None
+        return best_dog
+
+    def _select_crop(self, img_rgb: np.ndarray, detections, strict_dog_detection: bool = False):
+        """
+        Decide a partir de las detecciones si hay un perro y devuelve el recorte
+        a clasificar, o None si la imagen se debe descartar.
+        """
+        best_dog, other_animals = self._best_dog(detections)
 
         # Si no hay detección de perro → intentar fallback
         if best_dog is None:
             if strict_dog_detection:
-                return None, None, None
+                return None
 
             # Si YOLO detectó algún animal con alta confianza (>0.60), es seguro que NO es un perro
             max_other_conf = max((c for _, c, _ in other_animals), default=0)
             if max_other_conf > 0.60:
-                return None, None, None
+                return None
             
             # Fallback: YOLO está confuso (solo detecciones de baja confianza)
             # Puede ser un perro de apariencia inusual (ej: Puli, Komondor)
             # Usamos la imagen completa y dejamos que el clasificador de razas decida
-            crop = img_rgb  # Usar imagen completa como fallback
+            return img_rgb  # Usar imagen completa como fallback
 
-        else:
-            # Hay detección de perro → verificar que no haya animal competidor
-            if other_animals:
-                dog_conf = best_dog[0]
-                for animal_cls, animal_conf, animal_coords in other_animals:
-                    # Si el otro animal tiene al menos 30% de la confianza del perro, es sospechoso
-                    if animal_conf >= dog_conf * 0.3:
-                        return None, None, None
+        # Hay detección de perro → verificar que no haya animal competidor
+        if self._has_competing_animal(best_dog, other_animals):
+            return None
 
-            crop = self.aplicar_padding(img_rgb, best_dog[1])
+        return self.aplicar_padding(img_rgb, best_dog[1])
 
-        # --- A partir de aquí solo llegamos si hay perro confirmado o fallback ---
+    @staticmethod
+    def _box_iou(a, b) -> float:
+        ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+        ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+        inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+        union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+        return inter / union if union > 0 else 0.0
 
-        # 2. Preparar inputs para MobileNetV2 (355 razas)
-        img_mob = cv2.resize(crop, self.img_size)
-        in_mob = tf.keras.applications.mobilenet_v2.preprocess_input(
-            np.expand_dims(img_mob, axis=0)
+    def _select_dog_boxes(self, detections) -> List[tuple]:
+        """
+        Todas las cajas de perro válidas, de mayor a menor confianza: [(confidence, coords)].
+        La regla del animal competidor se aplica por caja: solo se descarta un perro
+        si otro animal solapado con él (mismo objeto visto como dos clases) tiene al
+        menos el 30% de su confianza, para que un gato junto a los perros no anule la foto.
+        """
+        dogs = sorted(
+            ((confidence, coords) for class_id, confidence, coords in detections
+             if class_id == self.DOG_CLASS_ID and confidence > 0.40),
+            key=lambda d: d[0], reverse=True
         )
-        
-        # 3. Preparar inputs para Keras V1 y PyTorch (120 razas)
-        img_pil = Image.fromarray(crop).resize(self.img_size)
-        in_v1 = tf.expand_dims(tf.keras.preprocessing.image.img_to_array(img_pil), 0)
-        
-        pt_trans = transforms.Compose([
-            transforms.ToTensor(),
-            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-        ])
-        in_pt = pt_trans(img_pil).unsqueeze(0)
-        
+        others = [(confidence, coords) for class_id, confidence, coords in detections
+                  if class_id in self.NON_DOG_ANIMALS and confidence > 0.15]
+
+        boxes = [
+            (dog_conf, dog_coords) for dog_conf, dog_coords in dogs
+            if not any(
+                other_conf >= dog_conf * 0.3 and self._box_iou(dog_coords, other_coords) >= self.SAME_OBJECT_IOU
+                for other_conf, other_coords in others
+            )
+        ]
+        return boxes[:max(1, settings.MULTI_DOG_MAX_BOXES)]
+
+    def _resize_crops(self, crops: List[np.ndarray]) -> np.ndarray:
+        """
+        Redimensiona todos los recortes a img_size con un único cv2.resize por
+        recorte, escribiendo directamente en un buffer uint8 (N, H, W, 3) reservado
+        de antemano. Devuelve una vista del buffer: no debe guardarse entre llamadas.
+
+        Para quedar cerca del redimensionado bicúbico con antialias de PIL que
+        usaban Keras V1 y PyTorch: INTER_AREA al reducir e INTER_CUBIC al ampliar
+        (bench_preprocess --images mide la coincidencia del top-1).
+        """
+        width, height = self.img_size
+        buf = getattr(self._preprocess_local, "buf", None)
+        if buf is None or len(buf) < len(crops):
+            buf = np.empty((max(len(crops), 1), height, width, 3), dtype=np.uint8)
+            self._preprocess_local.buf = buf
+
+        for i, crop in enumerate(crops):
+            shrink = crop.shape[0] >= height and crop.shape[1] >= width
+            cv2.resize(crop, self.img_size, dst=buf[i],
+                       interpolation=cv2.INTER_AREA if shrink else cv2.INTER_CUBIC)
+        return buf[:len(crops)]
+
+    def _build_inputs(self, crops: List[np.ndarray]):
+        """
+        Prepara un batch por arquitectura a partir de una lista de recortes RGB.
+        Las tres entradas salen del mismo redimensionado; solo cambia la normalización.
+        """
+        pixels = self._resize_crops(crops)
+
+        # Keras V1: NHWC, [0, 255]
+        in_v1 = pixels.astype(np.float32)
+
+        # MobileNetV2 (355 razas): escala [-1, 1]
+        in_mob = in_v1 * np.float32(1 / 127.5)
+        in_mob -= 1.0
+
+        # PyTorch: NCHW con normalización ImageNet
+        in_pt = in_v1 * self.PT_SCALE
+        in_pt -= self.PT_SHIFT
+        in_pt = np.ascontiguousarray(in_pt.transpose(0, 3, 1, 2))
+
         return in_mob, in_v1, in_pt
 
+    def _get_processed_inputs(self, image_path: str = None, image_array: np.ndarray = None, strict_dog_detection: bool = False):
+        img_rgb = self._load_image(image_path, image_array)
+        return self._prepare_inputs(img_rgb, strict_dog_detection)
+
+    def _tta_views(self, crop: np.ndarray, k: int) -> List[np.ndarray]:
+        """
+        Las k primeras vistas de TTA del recorte: original, volteo horizontal,
+        zoom central al 90% (y su volteo) y ventanas del 90% desplazadas a las esquinas.
+        """
+        h, w = crop.shape[:2]
+        ch, cw = max(1, int(h * 0.9)), max(1, int(w * 0.9))
+        dy, dx = h - ch, w - cw
+        center = crop[dy // 2:dy // 2 + ch, dx // 2:dx // 2 + cw]
+        views = [
+            crop,
+            crop[:, ::-1],
+            center,
+            center[:, ::-1],
+            crop[:ch, :cw],
+            crop[dy:, dx:],
+            crop[:ch, dx:],
+            crop[dy:, :cw],
+        ]
+        return [np.ascontiguousarray(v) for v in views[:k]]
+
+    def _prepare_inputs(self, img_rgb: np.ndarray, strict_dog_detection: bool = False, tta_views: int = 0):
+        # 1. Detección YOLOv8m (umbral bajo para capturar todas las detecciones)
+        with INFERENCE_STAGE_SECONDS.labels("detection").time():
+            detections = self.yolo.detect([img_rgb], conf=0.15)[0]
+        crop = self._select_crop(img_rgb, detections, strict_dog_detection)
+        DOG_DETECTIONS_TOTAL.labels("rejected" if crop is None else "dog").inc()
+
+        if crop is None:
+            return None, None, None
+
+        # --- A partir de aquí solo llegamos si hay perro confirmado o fallback ---
+        with INFERENCE_STAGE_SECONDS.labels("preprocess").time():
+            if tta_views > 1:
+                return self._build_inputs(self._tta_views(crop, tta_views))
+            return self._build_inputs([crop])
+
     # ==========================================================
     # VIDEO 
     # ==========================================================
 
-    def predict_breed_from_image_array(self, frame: np.ndarray) -> Dict:
+    def predict_breed_from_image_array(self, frame: np.ndarray, mode: str = "full") -> Dict:
         """
         Predice la raza desde un frame OpenCV (BGR).
-        Ahora utiliza la detección YOLO y los 3 modelos, igual que las fotos.
+        Ahora utiliza la detección YOLO y los 3 modelos, igual que las fotos
+        (o solo MobileNet cuando no duda, con mode="adaptive").
         """
-        if self.use_mock or not self.model_loaded:
+        self._check_mode(mode)
+        if self.worker_pool is None and (self.use_mock or not self.model_loaded):
             mock_res = self.get_top_predictions(self._mock_predict())
             return {
                 "success": True, 
@@ -226,6 +693,9 @@ class PredictionService:
             }
 
         try:
+            if self.worker_pool is not None:
+                return self._run_in_worker("predict_breed_from_image_array", [frame], mode=mode)
+
             # 1. Reutilizamos la lógica de preprocesamiento (Detección YOLO + Crops)
             # Pasamos el frame directamente como image_array y exigimos detección estricta (no fallback)
             in_mob, in_v1, in_pt = self._get_processed_inputs(image_array=frame, strict_dog_detection=True)
@@ -239,17 +709,11 @@ class PredictionService:
                 }
 
             # 3. Inferencia en las 3 arquitecturas
-            res_mobile = self._infer_architecture(self.model_mobile, in_mob, self.breed_labels_355, is_mobile=True)
-            res_keras = self._infer_architecture(self.model_keras_v1, in_v1, self.breed_labels_120)
-            res_pytorch = self._infer_architecture(self.model_pytorch, in_pt, self.breed_labels_120)
-
-            return {
-                "success": True,
-                "mobile": self.get_top_predictions(res_mobile),
-                "keras": self.get_top_predictions(res_keras),
-                "pytorch": self.get_top_predictions(res_pytorch)
-            }
+            res, timing = self._classify(in_mob, in_v1, in_pt, mode)
+            return self._format_result(res, timing)
 
+        except InferenceOverloadedError:
+            raise
         except Exception as e:
             print(f"❌ Error en predict_breed_from_image_array: {e}")
             return {
@@ -262,79 +726,583 @@ class PredictionService:
     # INFERENCE
     # ==========================================================
 
-    def _infer_architecture(self, model, preprocessed_image, labels, is_mobile=False):
+    def _predict_probs(self, model, batch) -> np.ndarray:
+        """Devuelve la matriz (N, clases) de probabilidades para un batch."""
+        return model.predict_proba(batch)
+
+    def _decode_predictions(self, preds, table: "LabelTable", top_n: int = 3):
+        """
+        Decodifica solo las top_n clases: np.argpartition selecciona los índices
+        y los metadatos se leen de las tablas precalculadas en load_model().
+        """
+        preds = np.asarray(preds)
+        k = min(top_n, len(preds))
+        if k <= 0:
+            return []
+
+        top_idx = np.argpartition(-preds, k - 1)[:k]
+        top_idx = top_idx[np.argsort(-preds[top_idx])]
+
+        results = []
+        for i in top_idx:
+            if i < len(table.breed_en):
+                results.append(PredictionResult(
+                    breed_en=table.breed_en[i],
+                    breed_es=table.breed_es[i],
+                    confidence=float(preds[i]),
+                    api_matched=bool(table.matched[i]),
+                    api_id=table.api_id[i]
+                ))
+            else:
+                results.append(PredictionResult("Unknown", "Unknown", float(preds[i])))
+
+        return results
+
+    def _infer_architecture(self, model, preprocessed_image, table: "LabelTable"):
+        if model is None:
+            return []
+
+        preds = self._predict_probs(model, preprocessed_image)[0]
+        return self._decode_predictions(preds, table)
+
+    def _infer_architecture_tta(self, model, views, table: "LabelTable"):
+        """Promedia las probabilidades de las K vistas de un recorte antes de decodificar."""
         if model is None:
             return []
 
-        if isinstance(model, torch.nn.Module):
-            with torch.no_grad():
-                outputs = model(preprocessed_image)
-                preds = torch.nn.functional.softmax(outputs, dim=1)[0].cpu().numpy()
+        preds = self._predict_probs(model, views).mean(axis=0)
+        return self._decode_predictions(preds, table)
+
+    def _infer_architecture_batch(self, model, batch, table: "LabelTable"):
+        """Igual que _infer_architecture pero devuelve una lista de resultados por elemento del batch."""
+        if model is None:
+            return [[] for _ in range(len(batch))]
+
+        preds = self._predict_probs(model, batch)
+        return [self._decode_predictions(row, table) for row in preds]
+
+    def _infer_architecture_probs(self, model, batch, table: "LabelTable"):
+        """Matriz (N, clases) de probabilidades sin decodificar, o None si el modelo no está cargado."""
+        if model is None:
+            return None
+
+        return self._predict_probs(model, batch)
+
+    def _run_classifiers(self, in_mob, in_v1, in_pt, batched: bool = False, architectures=ARCHITECTURES,
+                         tta: bool = False, raw: bool = False):
+        """
+        Ejecuta las arquitecturas indicadas (por defecto las 3) sobre sus inputs.
+        Con tta=True las filas son vistas de un mismo recorte y se promedian.
+        Si PARALLEL_CLASSIFIERS está activo, las pasadas se solapan en el pool de hilos
+        del servicio (TensorFlow y PyTorch liberan el GIL en sus kernels).
+        Devuelve (resultados por arquitectura, métricas de tiempo); las arquitecturas
+        que no se ejecutan devuelven resultados vacíos. Con raw=True los resultados son
+        las matrices de probabilidades sin decodificar (None si no se ejecutan).
+        """
+        if raw:
+            infer = self._infer_architecture_probs
+        elif tta:
+            infer = self._infer_architecture_tta
         else:
-            preds = model.predict(preprocessed_image, verbose=0)[0]
-        
-        translation_dict = self.translation_355 if len(labels) > 200 else self.translation_120
-        corr_dict = self.corr_355 if is_mobile else self.corr_120
+            infer = self._infer_architecture_batch if batched else self._infer_architecture
+        tasks = {
+            "mobile": (self.model_mobile, in_mob, self.label_table_355),
+            "keras": (self.model_keras_v1, in_v1, self.label_table_120),
+            "pytorch": (self.model_pytorch, in_pt, self.label_table_120),
+        }
+        tasks = {arch: args for arch, args in tasks.items() if arch in architectures}
 
-        results = []
-        for i, prob in enumerate(preds):
-            name_en = labels[i] if i < len(labels) else "Unknown"
-            name_es = translation_dict.get(name_en, name_en)
-            
-            # Use correlation data for precise API name
-            corr_entry = corr_dict.get(name_en, {})
-            api_matched = corr_entry.get("matched", False)
-            api_name = corr_entry.get("api_name")
-            api_id = corr_entry.get("api_id")
-            
-            final_breed_en = api_name if api_matched and api_name else name_en
-            
-            results.append(PredictionResult(
-                breed_en=final_breed_en, 
-                breed_es=name_es, 
-                confidence=float(prob),
-                api_matched=api_matched,
-                api_id=api_id
-            ))
+        def timed(arch, args):
+            t0 = time.perf_counter()
+            result = infer(*args)
+            elapsed = time.perf_counter() - t0
+            INFERENCE_STAGE_SECONDS.labels(arch).observe(elapsed)
+            return result, elapsed * 1000
+
+        if tasks:
+            INFERENCE_BATCH_ITEMS.observe(len(next(iter(tasks.values()))[1]))
+
+        t_start = time.perf_counter()
+        if self._classifier_pool is not None:
+            futures = {arch: self._classifier_pool.submit(timed, arch, args) for arch, args in tasks.items()}
+            outputs = {arch: future.result() for arch, future in futures.items()}
+        else:
+            outputs = {arch: timed(arch, args) for arch, args in tasks.items()}
+        wall_ms = (time.perf_counter() - t_start) * 1000
+
+        if not tta and len(tasks) == len(self.ARCHITECTURES) and len(next(iter(tasks.values()))[1]) == 1:
+            previous = self._single_view_ms
+            self._single_view_ms = wall_ms if previous is None else previous + 0.2 * (wall_ms - previous)
 
-        return sorted(results, key=lambda x: x.confidence, reverse=True)
+        sequential_ms = sum(ms for _, ms in outputs.values())
+        timing = {
+            "mode": "parallel" if self._classifier_pool is not None else "sequential",
+            "models_ms": {arch: round(ms, 2) for arch, (_, ms) in outputs.items()},
+            "sequential_ms": round(sequential_ms, 2),
+            "wall_ms": round(wall_ms, 2),
+            "saved_ms": round(max(0.0, sequential_ms - wall_ms), 2),
+        }
+        res = {arch: result for arch, (result, _) in outputs.items()}
+        size = len(next(iter(tasks.values()))[1]) if batched and tasks else 0
+        for arch in self.ARCHITECTURES:
+            if arch not in res:
+                if raw:
+                    res[arch] = None
+                else:
+                    res[arch] = [[] for _ in range(size)] if batched else []
+        return res, timing
+
+    def _needs_escalation(self, top: List[PredictionResult]) -> bool:
+        """MobileNet duda si su top-1 o su margen sobre el top-2 quedan por debajo de los umbrales."""
+        if not top:
+            return True
+        top1 = top[0].confidence
+        top2 = top[1].confidence if len(top) > 1 else 0.0
+        return top1 < settings.ADAPTIVE_MIN_CONFIDENCE or (top1 - top2) < settings.ADAPTIVE_MIN_MARGIN
+
+    def _run_adaptive(self, in_mob, in_v1, in_pt, batched: bool = False, tta: bool = False):
+        """
+        Modo adaptive: MobileNetV2 sobre todos los recortes y Keras V1 / EfficientNet
+        solo sobre los que MobileNet no resuelve con suficiente confianza.
+        Mismo formato de salida que _run_classifiers.
+        """
+        res, timing = self._run_classifiers(in_mob, in_v1, in_pt, batched=batched, architectures=("mobile",), tta=tta)
+        rows = res["mobile"] if batched else [res["mobile"]]
+        escalate = [i for i, top in enumerate(rows) if self._needs_escalation(top)]
+
+        if escalate:
+            rest_archs = ("keras", "pytorch")
+            if batched:
+                rest, rest_timing = self._run_classifiers(
+                    None, in_v1[escalate], in_pt[escalate], batched=True, architectures=rest_archs
+                )
+                for arch in rest_archs:
+                    for j, i in enumerate(escalate):
+                        res[arch][i] = rest[arch][j]
+            else:
+                rest, rest_timing = self._run_classifiers(None, in_v1, in_pt, architectures=rest_archs, tta=tta)
+                res.update({arch: rest[arch] for arch in rest_archs})
+
+            timing["models_ms"].update(rest_timing["models_ms"])
+            for key in ("sequential_ms", "wall_ms", "saved_ms"):
+                timing[key] = round(timing[key] + rest_timing[key], 2)
+
+        timing["escalated"] = len(escalate)
+        return res, timing
+
+    def _tta_overhead(self, views: int, prepare_ms: float, classifiers_ms: float, baseline_ms: Optional[float]) -> Dict:
+        """
+        Metadatos de coste de TTA. prepare_ms incluye la detección y el preprocesado
+        de las K vistas; overhead_ms compara los clasificadores con K vistas frente
+        a la media móvil con una sola vista (None hasta tener referencia).
+        """
+        return {
+            "views": views,
+            "prepare_ms": round(prepare_ms, 2),
+            "classifiers_ms": round(classifiers_ms, 2),
+            "single_view_ms": round(baseline_ms, 2) if baseline_ms is not None else None,
+            "overhead_ms": round(classifiers_ms - baseline_ms, 2) if baseline_ms is not None else None,
+        }
+
+    def _format_result(self, res: Dict, timing: Dict) -> Dict:
+        """Respuesta de un recorte clasificado, indicando qué arquitecturas se han ejecutado."""
+        return {
+            "success": True,
+            "mobile": self.get_top_predictions(res["mobile"]),
+            "keras": self.get_top_predictions(res["keras"]),
+            "pytorch": self.get_top_predictions(res["pytorch"]),
+            "architectures_run": [arch for arch in self.ARCHITECTURES if res[arch]],
+            "timing": timing
+        }
+
+    def _check_mode(self, mode: str):
+        if mode not in self.PREDICTION_MODES:
+            raise ValueError(f"Modo de predicción no válido: {mode}")
+
+    def _concat_inputs(self, parts):
+        """Concatena varios (in_mob, in_v1, in_pt) en un único batch por arquitectura."""
+        mobs, v1s, pts = zip(*parts)
+        return np.concatenate(mobs), np.concatenate(v1s), np.concatenate(pts)
+
+    def _classify(self, in_mob, in_v1, in_pt, mode: str = "full", tta: bool = False):
+        """
+        Clasifica un único recorte. Con el planificador activo, el recorte se agrupa
+        con los de otras peticiones concurrentes antes de llegar a los modelos.
+        El modo adaptive y TTA no pasan por el planificador: sus etapas dependen del
+        resultado de MobileNet o sus filas son vistas de un mismo recorte.
+        """
+        if mode == "adaptive":
+            return self._run_adaptive(in_mob, in_v1, in_pt, tta=tta)
+        if tta:
+            return self._run_classifiers(in_mob, in_v1, in_pt, tta=True)
+        if self.scheduler is None:
+            return self._run_classifiers(in_mob, in_v1, in_pt)
+
+        res, timing = self.scheduler.submit(in_mob, in_v1, in_pt).result()
+        return {arch: rows[0] for arch, rows in res.items()}, timing
 
     # ==========================================================
     # PUBLIC METHODS
     # ==========================================================
 
-    def predict_all_architectures(self, image_path: str) -> Dict:
+    def predict_all_architectures(
+        self, image_path: str = None, image_array: np.ndarray = None, mode: str = "full", tta_views: int = 0
+    ) -> Dict:
         """
         Punto de entrada principal para el endpoint de imagen.
         Compara las 3 arquitecturas y maneja errores de detección.
+        Acepta la ruta de la imagen o el array BGR ya decodificado.
+        Con tta_views > 1 cada clasificador procesa K vistas aumentadas del recorte
+        en un único batch y promedia sus probabilidades antes del top-3.
         """
+        self._check_mode(mode)
+        if tta_views > self.MAX_TTA_VIEWS:
+            raise ValueError(f"Como máximo {self.MAX_TTA_VIEWS} vistas de TTA")
         try:
+            if self.worker_pool is not None:
+                frame = image_array if image_array is not None else cv2.imread(image_path)
+                if frame is None:
+                    raise ValueError("No se pudo procesar la imagen")
+                return self._run_in_worker("predict_all_architectures", [frame], mode=mode, tta_views=tta_views)
+
+            img_rgb = self._load_image(image_path=image_path, image_array=image_array)
+
+            # Caché por contenido: la misma foto reenviada no vuelve a pasar por los modelos
+            cache_key = None
+            if self.cache is not None:
+                cache_key = PredictionCache.key_for(img_rgb, f"{self.model_version}|{mode}|tta{tta_views}")
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    cached["cached"] = True
+                    return cached
+
             # Intentamos obtener los inputs procesados
-            in_mob, in_v1, in_pt = self._get_processed_inputs(image_path=image_path, strict_dog_detection=True) 
+            tta = tta_views > 1
+            t_prepare = time.perf_counter()
+            in_mob, in_v1, in_pt = self._prepare_inputs(img_rgb, strict_dog_detection=True, tta_views=tta_views)
+            prepare_ms = (time.perf_counter() - t_prepare) * 1000
             # Si la detección falló (YOLO no vio perro)
             if in_mob is None:
-                return {
+                result = {
                     "success": False,
                     "message": "No se ha detectado ningún perro en la imagen. Por favor, intenta con otra foto.",
                     "mobile": [], "keras": [], "pytorch": []
                 }
+            else:
+                # Si hay perro, ejecutamos la inferencia en los 3 modelos
+                baseline_ms = self._single_view_ms
+                res, timing = self._classify(in_mob, in_v1, in_pt, mode, tta=tta)
+                if tta:
+                    timing["tta"] = self._tta_overhead(tta_views, prepare_ms, timing["wall_ms"], baseline_ms)
+                result = self._format_result(res, timing)
 
-            # Si hay perro, ejecutamos la inferencia en los 3 modelos
-            res_mobile = self._infer_architecture(self.model_mobile, in_mob, self.breed_labels_355, is_mobile=True)
-            res_keras = self._infer_architecture(self.model_keras_v1, in_v1, self.breed_labels_120)
-            res_pytorch = self._infer_architecture(self.model_pytorch, in_pt, self.breed_labels_120)
-            
-            return {
-                "success": True,
-                "mobile": self.get_top_predictions(res_mobile),
-                "keras": self.get_top_predictions(res_keras),
-                "pytorch": self.get_top_predictions(res_pytorch)
-            }
+            if cache_key is not None:
+                self.cache.put(cache_key, result)
+            return result
 
+        except InferenceOverloadedError:
+            # Cola del planificador llena: no es "sin perro", la API responde 429
+            raise
         except Exception as e:
             print(f"❌ Error en predict_breed_from_image_array: {e}")
             return {"success": False, "message": str(e), "mobile": [], "keras": [], "pytorch": []}
-            
+
+    def predict_multi_dog(self, image_path: str = None, image_array: np.ndarray = None, mode: str = "full") -> Dict:
+        """
+        Clasifica todos los perros de la imagen en una sola pasada por clasificador.
+        Devuelve una entrada por caja (coordenadas, confianza de detección y top-3 por
+        arquitectura) y, en el nivel superior, el resultado del perro más claro con el
+        mismo formato que predict_all_architectures.
+        """
+        self._check_mode(mode)
+        try:
+            if self.worker_pool is not None:
+                frame = image_array if image_array is not None else cv2.imread(image_path)
+                if frame is None:
+                    raise ValueError("No se pudo procesar la imagen")
+                return self._run_in_worker("predict_multi_dog", [frame], mode=mode)
+
+            img_rgb = self._load_image(image_path=image_path, image_array=image_array)
+
+            if self.use_mock or not self.model_loaded:
+                mock_res = self.get_top_predictions(self._mock_predict())
+                h, w = img_rgb.shape[:2]
+                return {
+                    "success": True, "count": 1,
+                    "mobile": mock_res, "keras": mock_res, "pytorch": mock_res,
+                    "dogs": [{"box": [0, 0, w, h], "detection_confidence": 99.0,
+                              "mobile": mock_res, "keras": mock_res, "pytorch": mock_res}]
+                }
+
+            cache_key = None
+            if self.cache is not None:
+                cache_key = PredictionCache.key_for(img_rgb, f"{self.model_version}|{mode}|multi_dog")
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    cached["cached"] = True
+                    return cached
+
+            with INFERENCE_STAGE_SECONDS.labels("detection").time():
+                detections = self.yolo.detect([img_rgb], conf=0.15)[0]
+            boxes = self._select_dog_boxes(detections)
+            DOG_DETECTIONS_TOTAL.labels("dog" if boxes else "rejected").inc(max(1, len(boxes)))
+
+            if not boxes:
+                result = {
+                    "success": False,
+                    "message": "No se ha detectado ningún perro en la imagen. Por favor, intenta con otra foto.",
+                    "count": 0, "dogs": [], "mobile": [], "keras": [], "pytorch": []
+                }
+            else:
+                # Un único batch por clasificador con todos los perros
+                with INFERENCE_STAGE_SECONDS.labels("preprocess").time():
+                    in_mob, in_v1, in_pt = self._build_inputs([self.aplicar_padding(img_rgb, coords) for _, coords in boxes])
+                if mode == "adaptive":
+                    res, timing = self._run_adaptive(in_mob, in_v1, in_pt, batched=True)
+                else:
+                    res, timing = self._run_classifiers(in_mob, in_v1, in_pt, batched=True)
+
+                dogs = []
+                for i, (confidence, coords) in enumerate(boxes):
+                    dog = self._format_result({arch: res[arch][i] for arch in self.ARCHITECTURES}, timing)
+                    del dog["success"], dog["timing"]
+                    dog["box"] = [int(c) for c in coords]
+                    dog["detection_confidence"] = round(float(confidence) * 100, 2)
+                    dogs.append(dog)
+
+                result = {
+                    "success": True,
+                    "count": len(dogs),
+                    "mobile": dogs[0]["mobile"],
+                    "keras": dogs[0]["keras"],
+                    "pytorch": dogs[0]["pytorch"],
+                    "architectures_run": dogs[0]["architectures_run"],
+                    "dogs": dogs,
+                    "timing": timing
+                }
+
+            if cache_key is not None:
+                self.cache.put(cache_key, result)
+            return result
+
+        except Exception as e:
+            print(f"❌ Error en predict_multi_dog: {e}")
+            return {"success": False, "message": str(e), "count": 0, "dogs": [], "mobile": [], "keras": [], "pytorch": []}
+
+    def predict_many(self, image_paths: List[str] = None, image_arrays: List[np.ndarray] = None, mode: str = "full") -> List[Dict]:
+        """
+        Predicción en lote para varias imágenes a la vez.
+        YOLO se ejecuta por lotes y todos los recortes de perro se apilan en un único
+        tensor por clasificador, en lugar de N pasadas con batch 1.
+        Devuelve una lista con un diccionario por imagen, con el mismo formato que
+        predict_all_architectures.
+        """
+        self._check_mode(mode)
+        sources = image_paths if image_paths is not None else image_arrays
+        if not sources:
+            return []
+
+        if self.worker_pool is not None:
+            frames = sources if image_arrays is not None else [cv2.imread(p) for p in sources]
+            return self._predict_many_in_worker(frames, mode)
+
+        if self.use_mock or not self.model_loaded:
+            mock_res = self.get_top_predictions(self._mock_predict())
+            return [
+                {"success": True, "mobile": mock_res, "keras": mock_res, "pytorch": mock_res}
+                for _ in sources
+            ]
+
+        results: List[Dict] = [None] * len(sources)
+
+        # 1. Decodificar todas las imágenes (los fallos se reportan por imagen)
+        images = []   # [(índice, img_rgb)]
+        for idx, source in enumerate(sources):
+            try:
+                if image_paths is not None:
+                    images.append((idx, self._load_image(image_path=source)))
+                else:
+                    images.append((idx, self._load_image(image_array=source)))
+            except Exception as e:
+                results[idx] = {"success": False, "message": str(e), "mobile": [], "keras": [], "pytorch": []}
+
+        try:
+            # 2. Detección YOLO por lotes
+            crops = []          # recortes de perro válidos
+            crop_owners = []    # índice de imagen de cada recorte
+            chunk = max(1, settings.YOLO_BATCH_SIZE)
+            for start in range(0, len(images), chunk):
+                group = images[start:start + chunk]
+                with INFERENCE_STAGE_SECONDS.labels("detection").time():
+                    batch_detections = self.yolo.detect([img for _, img in group], conf=0.15)
+                for (idx, img_rgb), detections in zip(group, batch_detections):
+                    crop = self._select_crop(img_rgb, detections, strict_dog_detection=True)
+                    DOG_DETECTIONS_TOTAL.labels("rejected" if crop is None else "dog").inc()
+                    if crop is None:
+                        results[idx] = {
+                            "success": False,
+                            "message": "No se ha detectado ningún perro en la imagen. Por favor, intenta con otra foto.",
+                            "mobile": [], "keras": [], "pytorch": []
+                        }
+                    else:
+                        crops.append(crop)
+                        crop_owners.append(idx)
+
+            if not crops:
+                return results
+
+            # 3. Un único batch por clasificador con todos los recortes
+            for idx, result in zip(crop_owners, self._classify_crops(crops, mode)):
+                results[idx] = result
+
+        except Exception as e:
+            print(f"❌ Error en predict_many: {e}")
+            for idx in range(len(results)):
+                if results[idx] is None:
+                    results[idx] = {"success": False, "message": str(e), "mobile": [], "keras": [], "pytorch": []}
+
+        return results
+
+    def _classify_crops(self, crops: List[np.ndarray], mode: str = "full") -> List[Dict]:
+        """Clasifica recortes RGB en un único batch por clasificador; un resultado formateado por recorte."""
+        with INFERENCE_STAGE_SECONDS.labels("preprocess").time():
+            in_mob, in_v1, in_pt = self._build_inputs(crops)
+        if mode == "adaptive":
+            res, timing = self._run_adaptive(in_mob, in_v1, in_pt, batched=True)
+        else:
+            res, timing = self._run_classifiers(in_mob, in_v1, in_pt, batched=True)
+        return [
+            self._format_result({arch: res[arch][i] for arch in self.ARCHITECTURES}, timing)
+            for i in range(len(crops))
+        ]
+
+    def detect_dog_boxes(self, frames: List[np.ndarray]) -> List[Optional[tuple]]:
+        """
+        Solo la detección: caja del perro de cada frame OpenCV (BGR) con la regla
+        estricta de los videos, (confidence, [x1, y1, x2, y2]), o None si el frame
+        se descarta. YOLO se ejecuta por lotes de YOLO_BATCH_SIZE.
+        """
+        if not frames:
+            return []
+        if self.worker_pool is not None:
+            return self._run_in_worker("detect_dog_boxes", frames)
+
+        if self.use_mock or not self.model_loaded:
+            return [(1.0, [0, 0, frame.shape[1], frame.shape[0]]) for frame in frames]
+
+        boxes = []
+        chunk = max(1, settings.YOLO_BATCH_SIZE)
+        for start in range(0, len(frames), chunk):
+            images = [self._load_image(image_array=frame) for frame in frames[start:start + chunk]]
+            with INFERENCE_STAGE_SECONDS.labels("detection").time():
+                batch_detections = self.yolo.detect(images, conf=0.15)
+            for detections in batch_detections:
+                box = self._strict_dog_box(detections)
+                DOG_DETECTIONS_TOTAL.labels("rejected" if box is None else "dog").inc()
+                boxes.append(box)
+        return boxes
+
+    def predict_tracked(self, frames: List[np.ndarray], boxes: List[List[float]], mode: str = "full") -> List[Dict]:
+        """
+        Clasifica el perro de cada frame OpenCV (BGR) en la caja indicada
+        [x1, y1, x2, y2], sin pasar por YOLO: las cajas vienen de detect_dog_boxes
+        o de un tracker. Mismo formato de resultado que predict_many.
+        """
+        self._check_mode(mode)
+        if not frames:
+            return []
+        if self.worker_pool is not None:
+            return self._run_in_worker("predict_tracked", frames, boxes=boxes, mode=mode)
+
+        if self.use_mock or not self.model_loaded:
+            mock_res = self.get_top_predictions(self._mock_predict())
+            return [{"success": True, "mobile": mock_res, "keras": mock_res, "pytorch": mock_res} for _ in frames]
+
+        try:
+            # Solo se convierte a RGB el recorte, no el frame completo
+            crops = [
+                cv2.cvtColor(self.aplicar_padding(frame, [int(round(v)) for v in box]), cv2.COLOR_BGR2RGB)
+                for frame, box in zip(frames, boxes)
+            ]
+            return self._classify_crops(crops, mode)
+        except Exception as e:
+            print(f"❌ Error en predict_tracked: {e}")
+            return [{"success": False, "message": str(e), "mobile": [], "keras": [], "pytorch": []} for _ in frames]
+
+    def classify_probs(self, frames: List[np.ndarray], boxes: List[List[float]], mode: str = "full") -> Dict[str, Optional[Dict]]:
+        """
+        Como predict_tracked pero sin decodificar etiquetas: para cada arquitectura,
+        {"rows": índices de los recortes sobre los que se ejecutó, "probs": matriz
+        (len(rows), clases)}, o None si no se ejecutó. En modo adaptive Keras V1 y
+        EfficientNet solo tienen las filas en las que MobileNet duda. Pensado para
+        agregar muchos frames y decodificar una sola vez (ver decode_probs).
+        """
+        self._check_mode(mode)
+        empty = {arch: None for arch in self.ARCHITECTURES}
+        if not frames:
+            return empty
+        if self.worker_pool is not None:
+            return self._run_in_worker("classify_probs", frames, boxes=boxes, mode=mode)
+
+        rows = np.arange(len(frames))
+        if self.use_mock or not self.model_loaded:
+            # Una única "clase" (la del mock) con la confianza de _mock_predict
+            probs = np.full((len(frames), 1), self._mock_predict()[0].confidence, dtype=np.float32)
+            return {arch: {"rows": rows, "probs": probs} for arch in self.ARCHITECTURES}
+
+        crops = [
+            cv2.cvtColor(self.aplicar_padding(frame, [int(round(v)) for v in box]), cv2.COLOR_BGR2RGB)
+            for frame, box in zip(frames, boxes)
+        ]
+        with INFERENCE_STAGE_SECONDS.labels("preprocess").time():
+            in_mob, in_v1, in_pt = self._build_inputs(crops)
+
+        if mode != "adaptive":
+            res, _ = self._run_classifiers(in_mob, in_v1, in_pt, batched=True, raw=True)
+            return {arch: None if res[arch] is None else {"rows": rows, "probs": res[arch]} for arch in self.ARCHITECTURES}
+
+        res, _ = self._run_classifiers(in_mob, None, None, batched=True, architectures=("mobile",), raw=True)
+        out = dict(empty, mobile=None if res["mobile"] is None else {"rows": rows, "probs": res["mobile"]})
+        if res["mobile"] is None:
+            escalate = rows
+        else:
+            escalate = np.array([
+                i for i, row in enumerate(res["mobile"])
+                if self._needs_escalation(self._decode_predictions(row, self.label_table_355, top_n=2))
+            ], dtype=int)
+        if len(escalate):
+            rest, _ = self._run_classifiers(None, in_v1[escalate], in_pt[escalate], batched=True,
+                                            architectures=("keras", "pytorch"), raw=True)
+            for arch in ("keras", "pytorch"):
+                if rest[arch] is not None:
+                    out[arch] = {"rows": escalate, "probs": rest[arch]}
+        return out
+
+    def num_classes(self, arch: str) -> int:
+        """Tamaño del vector de probabilidades de la arquitectura (1 en modo mock)."""
+        if self.use_mock or not self.model_loaded:
+            return 1
+        return len(self.label_table_355.breed_en if arch == "mobile" else self.label_table_120.breed_en)
+
+    def decode_probs(self, arch: str, probs: np.ndarray, top_n: int = 3) -> List[Dict]:
+        """Top-n con el formato de get_top_predictions para un vector de probabilidades de la arquitectura."""
+        if self.use_mock or not self.model_loaded:
+            return self.get_top_predictions(self._mock_predict(), top_n)
+        table = self.label_table_355 if arch == "mobile" else self.label_table_120
+        return self.get_top_predictions(self._decode_predictions(probs, table, top_n), top_n)
+
+    def _predict_many_in_worker(self, frames: List[np.ndarray], mode: str = "full") -> List[Dict]:
+        """Envía el lote a un worker; las imágenes que no se pudieron decodificar se reportan aquí."""
+        results: List[Dict] = [
+            {"success": False, "message": "No se pudo procesar la imagen", "mobile": [], "keras": [], "pytorch": []}
+            if frame is None else None
+            for frame in frames
+        ]
+        valid = [i for i, frame in enumerate(frames) if frame is not None]
+        if valid:
+            for i, result in zip(valid, self._run_in_worker("predict_many", [frames[i] for i in valid], mode=mode)):
+                results[i] = result
+        return results
 
     def _mock_predict(self):
         return [PredictionResult("Golden Retriever", "Golden Retriever (Mock)", 0.99)]
@@ -356,4 +1324,5 @@ class PredictionService:
 
 
 
-prediction_service = PredictionService(use_mock=False)
\ No newline at end of file
+# Los modelos se cargan en segundo plano desde el lifespan de FastAPI (ver app/main.py)
+prediction_service = PredictionService(use_mock=False, load_on_init=False)
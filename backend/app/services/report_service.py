@@ -6,10 +6,13 @@ import os
 import sys
 import tempfile
 import threading
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import Any, AsyncGenerator, Dict, Optional
 
+from app.core.metrics import PDF_RENDER_SECONDS, REPORT_GENERATION_SECONDS
+
 logger = logging.getLogger(__name__)
 
 class ReportGenerationError(Exception):
@@ -93,6 +96,7 @@ class ReportService:
         """
         yield {"status": "Revisión", "message": "Generando HTML..."}
 
+        t0 = time.perf_counter()
         try:
             # Cargar plantilla
             template_path = Path(__file__).parent.parent / "templates"
@@ -120,6 +124,7 @@ class ReportService:
                 extracted_data,
                 placeholders
             )
+            REPORT_GENERATION_SECONDS.labels("html", "success").observe(time.perf_counter() - t0)
 
             yield {
                 "status": "Revisión",
@@ -129,6 +134,7 @@ class ReportService:
             }
 
         except Exception as e:
+            REPORT_GENERATION_SECONDS.labels("html", "error").observe(time.perf_counter() - t0)
             if isinstance(e, ReportGenerationError):
                 logger.error(f"Error en plantilla: {e}")
                 yield {"status": "error", "message": str(e), "error": True}
@@ -160,6 +166,8 @@ class ReportService:
         filepath = os.path.join(reports_dir, filename)
 
         tmp_html_path = None
+        t0 = time.perf_counter()
+        outcome = "html_only"
         try:
             import playwright  # Verificar que está instalado antes de continuar
 
@@ -190,6 +198,7 @@ class ReportService:
 
             pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
             logger.info(f"PDF generado exitosamente: {filepath}")
+            outcome = "success"
 
             yield {
                 "status": "Informe Final",
@@ -232,6 +241,7 @@ class ReportService:
                 "errorMessage": str(e)
             }
         finally:
+            REPORT_GENERATION_SECONDS.labels("pdf", outcome).observe(time.perf_counter() - t0)
             if tmp_html_path and os.path.exists(tmp_html_path):
                 try:
                     os.unlink(tmp_html_path)
@@ -358,6 +368,7 @@ class PlaywrightPDFGenerator:
         if not cls._browser:
             raise RuntimeError("Browser persistente no inicializado.")
         
+        t0 = time.perf_counter()
         page = await cls._browser.new_page(
             viewport={'width': 1280, 'height': 900}
         )
@@ -381,6 +392,7 @@ class PlaywrightPDFGenerator:
             return pdf_bytes
         finally:
             await page.close()
+            PDF_RENDER_SECONDS.observe(time.perf_counter() - t0)
 
 def _validate_extracted_data(data: Dict[str, Any], report_type: str) -> None:
     """Valida que los datos extraídos contienen los campos requeridos."""
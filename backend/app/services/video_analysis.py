@@ -0,0 +1,549 @@
+import math
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import VIDEO_TRACKING_FRAMES_TOTAL
+from app.services.dog_tracker import DogTracker
+from app.services.prediction_service import prediction_service
+from app.services.video_sampler import SampledFrame, VideoFrameSampler
+from app.services.video_store import video_store
+
+ARCHITECTURES = ("mobile", "keras", "pytorch")
+
+# Marca de fin de video en la cola del decodificador
+_END = object()
+
+
+def create_dog_tracker() -> DogTracker:
+    return DogTracker(
+        kind=settings.VIDEO_TRACKER,
+        redetect_every=settings.VIDEO_TRACK_REDETECT_EVERY,
+        confidence_drop=settings.VIDEO_TRACK_CONFIDENCE_DROP,
+    )
+
+
+def locate_tracked(tracker: DogTracker, frames: List[np.ndarray]) -> Tuple[List, List[float], List[bool]]:
+    """
+    Detect-once-then-track sobre frames consecutivos (BGR): la caja del perro se
+    propaga con el tracker y YOLO solo se ejecuta cuando tracker.needs_detection()
+    o cuando el tracking falla. Devuelve, por frame, la caja (None si no hay
+    perro), la confianza de la detección que la originó y si vino del tracker.
+    """
+    boxes, confidences, tracked = [], [], []
+    for frame in frames:
+        box = None if tracker.needs_detection() else tracker.update(frame)
+        tracked.append(box is not None)
+        if box is None:
+            detected = prediction_service.detect_dog_boxes([frame])[0]
+            if detected is not None:
+                tracker.reset(frame, detected[1], detected[0])
+                box = detected[1]
+            else:
+                tracker.reset(frame, None)
+        VIDEO_TRACKING_FRAMES_TOTAL.labels("tracker" if tracked[-1] else "detector").inc()
+        boxes.append(box)
+        confidences.append(tracker.confidence)
+    return boxes, confidences, tracked
+
+
+def predict_tracked_frames(tracker: DogTracker, frames: List[np.ndarray], mode: str = "full") -> List[Dict]:
+    """
+    Localiza el perro con locate_tracked y clasifica los recortes en un único
+    batch con predict_tracked. Mismo formato de resultado que predict_many.
+    """
+    boxes, _, tracked = locate_tracked(tracker, frames)
+
+    results: List[Dict] = [
+        {"success": False, "message": "No se detecta perro en el frame", "mobile": [], "keras": [], "pytorch": []}
+        for _ in frames
+    ]
+    valid = [i for i, box in enumerate(boxes) if box is not None]
+    if valid:
+        classified = prediction_service.predict_tracked([frames[i] for i in valid], [boxes[i] for i in valid], mode)
+        for i, result in zip(valid, classified):
+            results[i] = result
+
+    for result, was_tracked in zip(results, tracked):
+        if result["success"] and result["mobile"]:
+            tracker.report_confidence(result["mobile"][0]["confidence"], was_tracked)
+        result["tracked"] = was_tracked
+    return results
+
+
+class DistributionAggregator:
+    """
+    Agrega la distribución softmax completa de cada frame por arquitectura.
+
+    Cada fila de probabilidades (355 clases en MobileNetV2, 120 en Keras V1 y
+    EfficientNet) se pondera con la confianza de la detección del perro y se
+    escribe en arrays NumPy reservados de antemano: la distribución de cada frame
+    (para la cota de convergencia), la suma ponderada del video y una suma por
+    segmento de segment_s segundos para la línea temporal. Las etiquetas solo se
+    decodifican al final, una vez por arquitectura y segmento, así que el
+    resultado no depende de qué razas entraron en el top-3 de cada frame.
+    """
+
+    def __init__(self, capacity: int = 64, segment_s: float = 5.0, num_segments: int = 1):
+        self.segment_s = segment_s
+        self.frames_with_dog = 0
+        # Frames en los que se ejecutó cada arquitectura (en modo adaptive pueden ser menos)
+        self.frames_per_architecture = {arch: 0 for arch in ARCHITECTURES}
+
+        capacity, num_segments = max(1, capacity), max(1, num_segments)
+        self._segment_frames = np.zeros(num_segments, dtype=np.int64)
+        self._probs, self._weights, self._sums = {}, {}, {}
+        self._segment_sums, self._segment_weights = {}, {}
+        for arch in ARCHITECTURES:
+            classes = prediction_service.num_classes(arch)
+            self._probs[arch] = np.zeros((capacity, classes), dtype=np.float32)
+            self._weights[arch] = np.zeros(capacity, dtype=np.float64)
+            self._sums[arch] = np.zeros(classes, dtype=np.float64)
+            self._segment_sums[arch] = np.zeros((num_segments, classes), dtype=np.float64)
+            self._segment_weights[arch] = np.zeros(num_segments, dtype=np.float64)
+
+    @staticmethod
+    def _grown(array: np.ndarray, size: int) -> np.ndarray:
+        """El mismo array si cabe size filas; si no, una copia con el doble de capacidad."""
+        if size <= len(array):
+            return array
+        grown = np.zeros((max(size, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _segment(self, timestamp_s: float) -> int:
+        seg = int(timestamp_s // self.segment_s)
+        if seg >= len(self._segment_frames):
+            self._segment_frames = self._grown(self._segment_frames, seg + 1)
+            for arch in ARCHITECTURES:
+                self._segment_sums[arch] = self._grown(self._segment_sums[arch], seg + 1)
+                self._segment_weights[arch] = self._grown(self._segment_weights[arch], seg + 1)
+        return seg
+
+    def add_frame(self, timestamp_s: float, weight: float, rows: Dict[str, np.ndarray]):
+        """Añade las distribuciones de un frame con perro: {arch: vector de probabilidades}."""
+        weight = max(float(weight), 1e-6)
+        seg = self._segment(timestamp_s)
+        self.frames_with_dog += 1
+        self._segment_frames[seg] += 1
+        for arch, row in rows.items():
+            n = self.frames_per_architecture[arch]
+            self._probs[arch] = self._grown(self._probs[arch], n + 1)
+            self._weights[arch] = self._grown(self._weights[arch], n + 1)
+            self._probs[arch][n] = row
+            self._weights[arch][n] = weight
+            self._sums[arch] += weight * row
+            self._segment_sums[arch][seg] += weight * row
+            self._segment_weights[arch][seg] += weight
+            self.frames_per_architecture[arch] = n + 1
+
+    def mean(self, arch: str) -> Optional[np.ndarray]:
+        """Distribución media ponderada de la arquitectura, o None si no se ejecutó."""
+        n = self.frames_per_architecture[arch]
+        if n == 0:
+            return None
+        return self._sums[arch] / self._weights[arch][:n].sum()
+
+    def margin(self, arch: str, z: float):
+        """
+        Índice de la clase líder, margen medio ponderado sobre la segunda (en [0, 1])
+        y cota inferior de ese margen: media - z * desviación / sqrt(n_efectivo) de
+        la diferencia frame a frame, con n_efectivo = (Σw)² / Σw².
+        """
+        mean = self.mean(arch)
+        if mean is None:
+            return None, 0.0, 0.0
+        n = self.frames_per_architecture[arch]
+        probs, weights = self._probs[arch][:n], self._weights[arch][:n]
+
+        if len(mean) > 1:
+            leader, runner_up = np.argsort(-mean)[:2]
+            diffs = probs[:, leader] - probs[:, runner_up]
+        else:
+            leader = 0
+            diffs = probs[:, 0].astype(np.float64)
+
+        total = weights.sum()
+        margin = float(weights @ diffs / total)
+        n_eff = total ** 2 / float(weights @ weights)
+        if n_eff <= 1:
+            return int(leader), margin, margin - z
+        variance = float(weights @ (diffs - margin) ** 2 / total) * n_eff / (n_eff - 1)
+        return int(leader), margin, margin - z * math.sqrt(variance / n_eff)
+
+    def timeline(self) -> List[Dict]:
+        """Raza top-1 por arquitectura en cada segmento con algún frame con perro."""
+        segments = []
+        for seg in np.flatnonzero(self._segment_frames).tolist():
+            entry = {
+                "start_s": round(seg * self.segment_s, 3),
+                "end_s": round((seg + 1) * self.segment_s, 3),
+                "frames": int(self._segment_frames[seg]),
+            }
+            for arch in ARCHITECTURES:
+                weight = self._segment_weights[arch][seg]
+                top = prediction_service.decode_probs(arch, self._segment_sums[arch][seg] / weight, 1) if weight else []
+                entry[arch] = top[0] if top else None
+            segments.append(entry)
+        return segments
+
+    def result(self) -> Dict:
+        if self.frames_with_dog == 0:
+            return {"success": False, "message": "No se detectó perro en el video."}
+        result = {"success": True}
+        for arch in ARCHITECTURES:
+            mean = self.mean(arch)
+            result[arch] = prediction_service.decode_probs(arch, mean) if mean is not None else []
+        result["frames_per_architecture"] = dict(self.frames_per_architecture)
+        result["timeline"] = self.timeline()
+        return result
+
+
+class VideoAnalyzer:
+    """
+    Análisis de un video como pipeline productor/consumidor.
+
+    Un hilo decodifica los frames muestreados (VideoFrameSampler) y los deja en
+    una cola acotada; el hilo que llama a run() los saca en lotes de batch_size y
+    ejecuta YOLO (detect_dog_boxes) y los clasificadores (classify_probs) una vez
+    por lote. Así la decodificación del siguiente lote se solapa con la inferencia
+    del actual y la cola limita la memoria si el decodificador va por delante. Las
+    distribuciones se agregan en un DistributionAggregator, ponderadas por la
+    confianza de la detección.
+
+    Análisis "anytime" (opcional):
+        - early_stop: tras cada frame se comprueba, para cada arquitectura con al
+          menos min_frames frames, que la raza líder no ha cambiado en los últimos
+          stable_frames y que la cota inferior de su margen sobre la segunda
+          (ver DistributionAggregator.margin) supera min_margin. Si todas convergen, el
+          análisis termina al acabar el lote en curso.
+        - time_budget_ms: no se empieza un lote que, según la duración media de
+          los anteriores, terminaría fuera del presupuesto. El primero siempre se
+          ejecuta para devolver algún resultado.
+    stop_reason indica por qué terminó: "converged", "time_budget",
+    "frame_budget" (se alcanzó max_frames), "end_of_video" o "cancelled"
+    (cancel_event activado desde fuera, p. ej. al cancelar un trabajo en segundo plano).
+
+    on_progress, si se indica, se llama tras cada lote con los frames analizados,
+    el total esperado y la raza líder de cada arquitectura hasta el momento.
+
+    Con track=True, YOLO solo se ejecuta cada VIDEO_TRACK_REDETECT_EVERY frames
+    muestreados o cuando el tracking falla (ver predict_tracked_frames). El
+    tracker trabaja sobre los frames muestreados, así que rinde mejor con un
+    sample_fps alto (varios frames por segundo) que con el muestreo por defecto.
+    """
+
+    def __init__(
+        self,
+        video_path: str,
+        mode: str = "full",
+        sample_fps: float = 1.0,
+        max_frames: Optional[int] = None,
+        batch_size: int = 8,
+        queue_size: int = 32,
+        early_stop: bool = False,
+        time_budget_ms: Optional[float] = None,
+        min_frames: int = 5,
+        stable_frames: int = 3,
+        min_margin: float = 0.15,
+        z: float = 1.96,
+        track: bool = False,
+        segment_s: float = 5.0,
+        on_progress: Optional[Callable[[Dict], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        source=None,
+    ):
+        self.mode = mode
+        self.tracker = create_dog_tracker() if track else None
+        self.max_frames = max_frames
+        self.batch_size = max(1, batch_size)
+        # source: frames ya decodificados con la interfaz de VideoFrameSampler
+        # (p. ej. StoredFrameSource de video_store); si no, se decodifica video_path
+        self.sampler = source if source is not None else VideoFrameSampler(
+            video_path,
+            sample_fps=sample_fps,
+            max_frames=max_frames,
+            strategy=settings.VIDEO_SAMPLER_STRATEGY,
+            seek_min_step=settings.VIDEO_SEEK_MIN_STEP,
+        )
+        total = self.sampler.total_frames
+        duration_s = total / self.sampler.fps if total else 0.0
+        capacity = max_frames or (math.ceil(total / self.sampler.step) if total else 64)
+        self.aggregator = DistributionAggregator(
+            capacity=capacity,
+            segment_s=segment_s,
+            num_segments=math.ceil(duration_s / segment_s) + 1,
+        )
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(self.batch_size, queue_size))
+        self._stop = threading.Event()
+        self._decode_error: Optional[BaseException] = None
+        self.batches = 0
+        self.inference_ms = 0.0
+
+        self.early_stop = early_stop
+        self.time_budget_ms = time_budget_ms
+        self.min_frames = max(1, min_frames)
+        self.stable_frames = max(1, stable_frames)
+        self.min_margin = min_margin
+        self.z = z
+        self.frames_analyzed = 0
+        self.converged_at = None
+        self.stop_reason = None
+        # arch -> [raza líder, frames consecutivos como líder]
+        self._streaks = {arch: [None, 0] for arch in ARCHITECTURES}
+        self._started = None
+        self.on_progress = on_progress
+        self.cancel_event = cancel_event
+
+    # ==========================================================
+    # DECODER
+    # ==========================================================
+
+    def _put(self, item) -> bool:
+        """Encola sin bloquear indefinidamente: si el consumidor se detiene, el productor sale."""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _drain(self):
+        """Vacía la cola para despertar al productor si está bloqueado en put()."""
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _decode(self):
+        try:
+            for sampled in self.sampler:
+                if not self._put(sampled):
+                    return
+        except BaseException as e:
+            self._decode_error = e
+        finally:
+            self._put(_END)
+
+    # ==========================================================
+    # INFERENCE
+    # ==========================================================
+
+    def _next_batch(self) -> List[SampledFrame]:
+        """Bloquea hasta completar un lote o llegar al final del video."""
+        batch = []
+        while len(batch) < self.batch_size:
+            item = self._queue.get()
+            if item is _END:
+                self._stop.set()
+                break
+            batch.append(item)
+        return batch
+
+    def _process(self, batch: List[SampledFrame]):
+        t0 = time.perf_counter()
+        frames = [f.image for f in batch]
+        if self.tracker is not None:
+            boxes, weights, tracked = locate_tracked(self.tracker, frames)
+        else:
+            detected = prediction_service.detect_dog_boxes(frames)
+            boxes = [d[1] if d is not None else None for d in detected]
+            weights = [d[0] if d is not None else 0.0 for d in detected]
+            tracked = None
+
+        valid = [i for i, box in enumerate(boxes) if box is not None]
+        # rows[i] = {arch: vector de probabilidades} del frame i del lote
+        rows: Dict[int, Dict[str, np.ndarray]] = {i: {} for i in valid}
+        if valid:
+            probs = prediction_service.classify_probs([frames[i] for i in valid], [boxes[i] for i in valid], self.mode)
+            for arch in ARCHITECTURES:
+                entry = probs.get(arch)
+                if entry is None:
+                    continue
+                for r, row in zip(entry["rows"], entry["probs"]):
+                    rows[valid[int(r)]][arch] = row
+
+        if self.tracker is not None:
+            for i in valid:
+                if "mobile" in rows[i]:
+                    self.tracker.report_confidence(float(rows[i]["mobile"].max()) * 100, tracked[i])
+
+        self.inference_ms += (time.perf_counter() - t0) * 1000
+        self.batches += 1
+        # El lote ya está pagado: se agregan todos sus frames aunque converja antes
+        for i, sampled in enumerate(batch):
+            self.frames_analyzed += 1
+            if not rows.get(i):
+                # Frame sin perro: no aporta evidencia ni alarga la racha del líder
+                continue
+            self.aggregator.add_frame(sampled.timestamp_s, weights[i], rows[i])
+            if self.early_stop and self.converged_at is None and self._converged(rows[i]):
+                self.converged_at = self.frames_analyzed
+
+        if self.on_progress is not None:
+            self.on_progress(self.progress())
+
+    def progress(self) -> Dict:
+        expected = self.sampler.expected_samples()
+        leaders = {}
+        for arch in ARCHITECTURES:
+            mean = self.aggregator.mean(arch)
+            top = prediction_service.decode_probs(arch, mean, 1) if mean is not None else []
+            leaders[arch] = top[0] if top else None
+        return {
+            "frames_analyzed": self.frames_analyzed,
+            "frames_expected": expected,
+            "frames_with_dog": self.aggregator.frames_with_dog,
+            "percent": round(min(100.0, 100.0 * self.frames_analyzed / expected), 1) if expected else None,
+            "leaders": leaders,
+        }
+
+    # ==========================================================
+    # STOP CRITERIA
+    # ==========================================================
+
+    def _converged(self, added: Dict[str, np.ndarray]) -> bool:
+        """
+        Se llama tras agregar un frame con perro; added son las arquitecturas con
+        distribución en ese frame. Solo ellas avanzan su racha de líder.
+        """
+        checked = False
+        for arch in ARCHITECTURES:
+            if self.aggregator.frames_per_architecture[arch] == 0:
+                continue
+            leader, _, lower = self.aggregator.margin(arch, self.z)
+            streak = self._streaks[arch]
+            if leader != streak[0]:
+                streak[0], streak[1] = leader, 1
+            elif arch in added:
+                streak[1] += 1
+
+            # En modo adaptive Keras V1 y EfficientNet pueden llevar pocos frames: no cuentan aún
+            if self.aggregator.frames_per_architecture[arch] < self.min_frames:
+                continue
+            checked = True
+            if streak[1] < self.stable_frames or lower < self.min_margin:
+                return False
+        return checked
+
+    def _elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def _budget_exhausted(self) -> bool:
+        if self.time_budget_ms is None or self.batches == 0:
+            return False
+        avg_batch_ms = self.inference_ms / self.batches
+        return self._elapsed_ms() + avg_batch_ms > self.time_budget_ms
+
+    def _should_stop(self) -> bool:
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            self.stop_reason = "cancelled"
+        elif self.converged_at is not None:
+            self.stop_reason = "converged"
+        elif self._budget_exhausted():
+            self.stop_reason = "time_budget"
+        return self.stop_reason is not None
+
+    def _convergence(self) -> Dict:
+        report = {}
+        for arch in ARCHITECTURES:
+            if self.aggregator.frames_per_architecture[arch] == 0:
+                continue
+            leader, margin, lower = self.aggregator.margin(arch, self.z)
+            top = prediction_service.decode_probs(arch, self.aggregator.mean(arch), 1)
+            report[arch] = {
+                "leader": top[0]["breed_en"] if top else None,
+                "margin": round(margin, 4),
+                "margin_lower_bound": round(lower, 4),
+                "stable_frames": self._streaks[arch][1],
+            }
+        return report
+
+    def run(self) -> Dict:
+        self._started = t0 = time.perf_counter()
+        decoder = threading.Thread(target=self._decode, name="video-decoder", daemon=True)
+        decoder.start()
+        try:
+            while not self._stop.is_set() and not self._should_stop():
+                batch = self._next_batch()
+                if batch:
+                    self._process(batch)
+        finally:
+            self._stop.set()
+            self._drain()
+            decoder.join()
+            self.sampler.close()
+
+        if self._decode_error is not None:
+            raise self._decode_error
+
+        if self.stop_reason is None:
+            at_budget = self.max_frames is not None and self.sampler.frames_sampled >= self.max_frames
+            self.stop_reason = "frame_budget" if at_budget else "end_of_video"
+
+        result = self.aggregator.result()
+        result["frames_analyzed"] = self.frames_analyzed
+        result["stop_reason"] = self.stop_reason
+        if self.early_stop:
+            result["converged_at_frame"] = self.converged_at
+            result["convergence"] = self._convergence()
+        if self.tracker is not None:
+            result["tracking"] = self.tracker.stats()
+        result["sampling"] = self.sampler.stats()
+        result["pipeline"] = {
+            "batch_size": self.batch_size,
+            "batches": self.batches,
+            "inference_ms": round(self.inference_ms, 2),
+            "wall_ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
+        return result
+
+
+def analyze_video(
+    video_path: Optional[str] = None,
+    mode: str = "full",
+    sample_fps: float = None,
+    max_frames: int = None,
+    early_stop: bool = False,
+    time_budget_ms: float = None,
+    track: bool = False,
+    on_progress: Callable[[Dict], None] = None,
+    cancel_event: threading.Event = None,
+    video_id: str = None,
+    source=None,
+) -> Dict:
+    """
+    Analiza un video con la configuración de settings. Síncrono: un trabajo del executor.
+    Con video_id se analizan los frames guardados por /input/video en lugar de video_path
+    (KeyError si el id no existe); source es un StoredFrameSource ya abierto por el llamante.
+    """
+    sample_fps = sample_fps or settings.VIDEO_SAMPLE_FPS
+    max_frames = max_frames or settings.VIDEO_MAX_FRAMES
+    if source is None and video_id:
+        source = video_store.source(video_id, sample_fps, max_frames)
+    analyzer = VideoAnalyzer(
+        video_path,
+        mode=mode,
+        sample_fps=sample_fps,
+        max_frames=max_frames,
+        batch_size=settings.VIDEO_BATCH_SIZE,
+        queue_size=settings.VIDEO_DECODE_QUEUE_SIZE,
+        early_stop=early_stop,
+        time_budget_ms=time_budget_ms,
+        min_frames=settings.VIDEO_EARLY_STOP_MIN_FRAMES,
+        stable_frames=settings.VIDEO_EARLY_STOP_STABLE_FRAMES,
+        min_margin=settings.VIDEO_EARLY_STOP_MIN_MARGIN,
+        z=settings.VIDEO_EARLY_STOP_Z,
+        track=track,
+        segment_s=settings.VIDEO_TIMELINE_SEGMENT_S,
+        on_progress=on_progress,
+        cancel_event=cancel_event,
+        source=source,
+    )
+    return analyzer.run()
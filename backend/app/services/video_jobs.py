@@ -0,0 +1,366 @@
+"""
+Trabajos de análisis de video en segundo plano.
+
+POST /predict/video/jobs guarda el video (o referencia los frames ya guardados
+por /input/video con video_id) y responde al momento con un job_id;
+el análisis (VideoAnalyzer) se ejecuta en un pool de hilos propio con una cola
+acotada, y cada trabajo en marcha ocupa un hilo del executor de inferencia
+compartido (clase "video") mientras analiza. El estado de cada trabajo se guarda en disco (VIDEO_JOBS_DIR/<id>/job.json,
+junto al video), de modo que tras un reinicio los trabajos pendientes o a medias
+se vuelven a encolar y los terminados siguen consultables hasta que caduca su TTL.
+"""
+import functools
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.services.inference_executor import InferenceOverloadedError, inference_executor
+from app.services.prediction_service import prediction_service
+from app.services.video_analysis import analyze_video
+
+logger = logging.getLogger(__name__)
+
+JOB_FILE = "job.json"
+ACTIVE_STATES = ("queued", "running")
+FINAL_STATES = ("completed", "failed", "cancelled")
+
+
+class VideoJob:
+    """Estado de un trabajo. Solo se modifica con el lock del VideoJobManager."""
+
+    def __init__(self, job_id: str, video_file: Optional[str], params: Dict, created_at: float = None):
+        self.id = job_id
+        self.video_file = video_file
+        self.params = params
+        self.status = "queued"
+        self.created_at = created_at or time.time()
+        self.updated_at = self.created_at
+        self.finished_at: Optional[float] = None
+        self.progress: Optional[Dict] = None
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        # Eventos para el SSE: [(seq, evento)]; no se persisten
+        self.events: List[tuple] = []
+        self.cancel_event = threading.Event()
+        self.future: Optional[Future] = None
+
+    def to_dict(self, ttl_s: float) -> Dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "finished_at": self.finished_at,
+            "expires_at": self.finished_at + ttl_s if self.finished_at else None,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, video_file: str) -> "VideoJob":
+        job = cls(data["job_id"], video_file, data["params"], data["created_at"])
+        job.status = data["status"]
+        job.updated_at = data["updated_at"]
+        job.finished_at = data.get("finished_at")
+        job.progress = data.get("progress")
+        job.result = data.get("result")
+        job.error = data.get("error")
+        return job
+
+
+class VideoJobManager:
+    """
+    Cola acotada de trabajos de video con persistencia en disco.
+
+    Como mucho max_workers análisis se ejecutan a la vez y max_queue esperan; con
+    la cola llena submit() lanza InferenceOverloadedError (429 + Retry-After en la
+    API). Cada análisis se ejecuta en el executor de inferencia compartido (clase
+    "video"); si está saturado el trabajo espera su turno en lugar de fallar.
+    Los trabajos terminados se borran, con su video, ttl_s segundos después
+    de terminar. cancel() descarta un trabajo en cola o detiene uno en ejecución
+    al acabar su lote actual (el resultado parcial se conserva).
+    """
+
+    # Eventos de progreso que se conservan por trabajo para el SSE
+    MAX_EVENTS = 500
+    # Espera máxima entre intentos de entrar en un executor de inferencia saturado
+    ADMISSION_RETRY_S = 5.0
+
+    def __init__(self, jobs_dir: str, max_workers: int = 1, max_queue: int = 16, ttl_s: float = 3600):
+        self.jobs_dir = jobs_dir
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.ttl_s = ttl_s
+        self._jobs: Dict[str, VideoJob] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._stopping = False
+        self._job_time_s: Optional[float] = None   # media móvil de la duración de un trabajo
+
+    # ==========================================================
+    # LIFECYCLE
+    # ==========================================================
+
+    def start(self):
+        """Crea el pool y recupera los trabajos guardados en disco (los activos se vuelven a encolar)."""
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._stopping = False
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="video-job")
+
+        resumed = 0
+        for job_id in sorted(os.listdir(self.jobs_dir)):
+            if not os.path.exists(os.path.join(self._job_dir(job_id), JOB_FILE)):
+                # Subida interrumpida antes de encolarse
+                self.discard(job_id)
+                continue
+            job = self._load(job_id)
+            if job is None:
+                continue
+            with self._lock:
+                self._jobs[job.id] = job
+            if job.status in ACTIVE_STATES:
+                with self._lock:
+                    self._set_status(job, "queued")
+                job.future = self._pool.submit(self._run, job)
+                resumed += 1
+        self.purge_expired()
+        if resumed:
+            logger.info("Reanudados %d trabajos de video pendientes", resumed)
+
+    def shutdown(self):
+        """Los trabajos activos se quedan como están en disco y se reanudan en el próximo arranque."""
+        if self._pool is None:
+            return
+        with self._lock:
+            self._stopping = True
+            for job in self._jobs.values():
+                job.cancel_event.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+    # ==========================================================
+    # PERSISTENCE
+    # ==========================================================
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _save(self, job: VideoJob):
+        """Escritura atómica: un reinicio a mitad nunca deja un job.json corrupto."""
+        path = os.path.join(self._job_dir(job.id), JOB_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**job.to_dict(self.ttl_s), "video_file": job.video_file}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _load(self, job_id: str) -> Optional[VideoJob]:
+        path = os.path.join(self._job_dir(job_id), JOB_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return VideoJob.from_dict(data, data["video_file"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Trabajo de video %s ilegible, se ignora: %s", job_id, e)
+            return None
+
+    def _delete(self, job: VideoJob):
+        self._jobs.pop(job.id, None)
+        shutil.rmtree(self._job_dir(job.id), ignore_errors=True)
+
+    # ==========================================================
+    # STATE
+    # ==========================================================
+
+    def _emit(self, job: VideoJob, event: Dict):
+        seq = job.events[-1][0] + 1 if job.events else 1
+        job.events.append((seq, event))
+        del job.events[:-self.MAX_EVENTS]
+
+    def _set_status(self, job: VideoJob, status: str, **fields):
+        """Cambia el estado, lo persiste y emite el evento correspondiente. Requiere el lock."""
+        job.status = status
+        job.updated_at = time.time()
+        for key, value in fields.items():
+            setattr(job, key, value)
+        if status in FINAL_STATES:
+            job.finished_at = job.updated_at
+        event = {"status": status, "progress": job.progress}
+        if status == "completed" or (status == "cancelled" and job.result):
+            event["result"] = job.result
+        if status == "failed":
+            event["error"] = job.error
+        self._emit(job, event)
+        try:
+            self._save(job)
+        except OSError as e:
+            logger.error("No se pudo guardar el trabajo de video %s: %s", job.id, e)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for job in list(self._jobs.values()):
+                if job.status in FINAL_STATES and job.finished_at and now - job.finished_at > self.ttl_s:
+                    self._delete(job)
+
+    # ==========================================================
+    # API
+    # ==========================================================
+
+    def new_job_dir(self) -> str:
+        """Reserva un id y su carpeta, para que la API guarde ahí el video antes de submit()."""
+        job_id = uuid.uuid4().hex
+        os.makedirs(self._job_dir(job_id), exist_ok=True)
+        return job_id
+
+    def discard(self, job_id: str):
+        """Borra la carpeta de un id reservado que no llegó a encolarse."""
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+    def submit(self, job_id: str, video_file: Optional[str], params: Dict) -> VideoJob:
+        """
+        Encola el análisis de VIDEO_JOBS_DIR/<job_id>/<video_file> (o del params["video_id"]
+        del almacén si video_file es None), o lanza InferenceOverloadedError.
+        """
+        if self._pool is None or self._stopping:
+            raise RuntimeError("El gestor de trabajos de video no está iniciado")
+        self.purge_expired()
+        job = VideoJob(job_id, video_file, params)
+        with self._lock:
+            active = sum(1 for j in self._jobs.values() if j.status in ACTIVE_STATES)
+            if active >= self.max_workers + self.max_queue:
+                ahead = active - self.max_workers + 1
+                wait = ahead / self.max_workers * (self._job_time_s or 30.0)
+                raise InferenceOverloadedError("La cola de trabajos de video está llena", max(1, math.ceil(wait)))
+            self._jobs[job.id] = job
+            self._set_status(job, "queued")
+        job.future = self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        self.purge_expired()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict(self.ttl_s) if job is not None else None
+
+    def events_since(self, job_id: str, after: int = 0):
+        """(eventos con seq > after, terminado) o None si el trabajo no existe."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            events = [(seq, event) for seq, event in job.events if seq > after]
+            if not job.events and job.status in FINAL_STATES:
+                # Trabajo recuperado del disco: no hay historial de eventos en memoria
+                events = [(1, {"status": job.status, "progress": job.progress, "result": job.result, "error": job.error})]
+            return events, job.status in FINAL_STATES
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == "queued" and job.future is not None and job.future.cancel():
+                self._set_status(job, "cancelled")
+            elif job.status in ACTIVE_STATES:
+                # En ejecución: el analizador se detiene al terminar el lote actual
+                job.cancel_event.set()
+            return job.to_dict(self.ttl_s)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            by_status: Dict[str, int] = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "jobs": by_status,
+                "avg_job_s": round(self._job_time_s, 3) if self._job_time_s is not None else None,
+            }
+
+    # ==========================================================
+    # WORKER
+    # ==========================================================
+
+    def _on_progress(self, job: VideoJob, progress: Dict):
+        with self._lock:
+            job.progress = progress
+            job.updated_at = time.time()
+            self._emit(job, {"status": "running", "progress": progress})
+
+    def _admit(self, job: VideoJob, call) -> Optional[Future]:
+        """
+        Envía el análisis al executor de inferencia compartido con la clase "video".
+        Si está saturado el trabajo no falla: espera el Retry-After y lo vuelve a
+        intentar. None si se cancela o se apaga el gestor mientras espera.
+        """
+        while True:
+            try:
+                return inference_executor.submit(call, job_class="video")
+            except InferenceOverloadedError as e:
+                # shutdown() también activa cancel_event
+                if job.cancel_event.wait(min(e.retry_after, self.ADMISSION_RETRY_S)):
+                    return None
+
+    def _run(self, job: VideoJob):
+        with self._lock:
+            if job.status != "queued" or self._stopping:
+                return
+            if job.cancel_event.is_set():
+                self._set_status(job, "cancelled")
+                return
+            self._set_status(job, "running")
+
+        try:
+            prediction_service.ensure_loaded()
+            # Sin video_file el trabajo analiza los frames del almacén (params["video_id"])
+            video_path = os.path.join(self._job_dir(job.id), job.video_file) if job.video_file else None
+            future = self._admit(job, functools.partial(
+                analyze_video,
+                video_path,
+                on_progress=lambda progress: self._on_progress(job, progress),
+                cancel_event=job.cancel_event,
+                **job.params,
+            ))
+            if future is None:
+                with self._lock:
+                    if not self._stopping:
+                        self._set_status(job, "cancelled")
+                return
+            t0 = time.perf_counter()
+            result = future.result()
+        except CancelledError:
+            # El executor se apagó con el análisis en cola: se reanuda en el próximo arranque
+            return
+        except Exception as e:
+            logger.error("Error en el trabajo de video %s: %s", job.id, e, exc_info=True)
+            with self._lock:
+                self._set_status(job, "failed", error=str(e))
+            return
+
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            if self._stopping:
+                # Apagado a mitad: el trabajo se queda "running" en disco y se reanuda al arrancar
+                return
+            self._job_time_s = elapsed if self._job_time_s is None else self._job_time_s + 0.2 * (elapsed - self._job_time_s)
+            cancelled = result.get("stop_reason") == "cancelled"
+            self._set_status(job, "cancelled" if cancelled else "completed", result=result)
+
+
+video_jobs = VideoJobManager(
+    jobs_dir=settings.VIDEO_JOBS_DIR,
+    max_workers=settings.VIDEO_JOB_WORKERS,
+    max_queue=settings.VIDEO_JOB_MAX_QUEUE,
+    ttl_s=settings.VIDEO_JOB_TTL_S,
+)
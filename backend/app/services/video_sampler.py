@@ -0,0 +1,131 @@
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+import cv2
+import numpy as np
+
+
+@dataclass
+class SampledFrame:
+    index: int            # número de frame dentro del video
+    timestamp_s: float
+    image: np.ndarray     # BGR, tal como lo entrega OpenCV
+
+
+class VideoFrameSampler:
+    """
+    Recorre un video entregando solo los frames muestreados.
+
+    Estrategias:
+        - "grab": cap.grab() avanza por los frames descartados sin convertirlos a
+          BGR ni copiarlos; solo los muestreados pasan por cap.retrieve().
+        - "seek": salta directamente a cada frame muestreado (CAP_PROP_POS_FRAMES).
+          Evita decodificar los frames intermedios desde el keyframe anterior, pero
+          solo compensa con saltos grandes y contenedores con número de frames conocido.
+        - "auto": "seek" si el salto es de al menos seek_min_step frames y el
+          contenedor informa del total; "grab" en otro caso.
+
+    El muestreo es de sample_fps frames por segundo de video. Con max_frames, si el
+    total es conocido, el paso se amplía para repartir el presupuesto por todo el video.
+    """
+
+    STRATEGIES = ("auto", "grab", "seek")
+
+    def __init__(
+        self,
+        video_path: str,
+        sample_fps: float = 1.0,
+        max_frames: Optional[int] = None,
+        strategy: str = "auto",
+        seek_min_step: int = 60,
+    ):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Estrategia de muestreo no válida: {strategy}")
+
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise ValueError("No se pudo abrir el vídeo")
+
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        total = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.total_frames = total if total > 0 else None
+        self.max_frames = max_frames
+
+        step = max(1, round(self.fps / sample_fps)) if sample_fps > 0 else 1
+        if max_frames and self.total_frames:
+            step = max(step, math.ceil(self.total_frames / max_frames))
+        self.step = step
+
+        if strategy == "auto":
+            strategy = "seek" if self.total_frames and step >= seek_min_step else "grab"
+        self.strategy = strategy
+
+        self.frames_sampled = 0
+        self.frames_skipped = 0
+        self.decode_ms = 0.0
+
+    def __iter__(self) -> Iterator[SampledFrame]:
+        return self._iter_seek() if self.strategy == "seek" else self._iter_grab()
+
+    def _budget_left(self) -> bool:
+        return self.max_frames is None or self.frames_sampled < self.max_frames
+
+    def _iter_grab(self) -> Iterator[SampledFrame]:
+        index = 0
+        while self._budget_left():
+            t0 = time.perf_counter()
+            if not self.cap.grab():
+                break
+            if index % self.step == 0:
+                ok, image = self.cap.retrieve()
+                self.decode_ms += (time.perf_counter() - t0) * 1000
+                if not ok:
+                    break
+                self.frames_sampled += 1
+                yield SampledFrame(index, index / self.fps, image)
+            else:
+                self.decode_ms += (time.perf_counter() - t0) * 1000
+                self.frames_skipped += 1
+            index += 1
+
+    def _iter_seek(self) -> Iterator[SampledFrame]:
+        for index in range(0, self.total_frames, self.step):
+            if not self._budget_left():
+                break
+            t0 = time.perf_counter()
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ok, image = self.cap.read()
+            self.decode_ms += (time.perf_counter() - t0) * 1000
+            if not ok:
+                break
+            self.frames_sampled += 1
+            yield SampledFrame(index, index / self.fps, image)
+
+    def expected_samples(self) -> Optional[int]:
+        """Frames que se muestrearán en total, si el contenedor informa del número de frames."""
+        if not self.total_frames:
+            return self.max_frames
+        expected = math.ceil(self.total_frames / self.step)
+        return min(expected, self.max_frames) if self.max_frames else expected
+
+    def stats(self) -> Dict:
+        return {
+            "strategy": self.strategy,
+            "fps": round(self.fps, 3),
+            "total_frames": self.total_frames,
+            "step": self.step,
+            "frames_sampled": self.frames_sampled,
+            "frames_skipped": self.frames_skipped,
+            "decode_ms": round(self.decode_ms, 2),
+        }
+
+    def close(self):
+        self.cap.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
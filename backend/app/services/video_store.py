@@ -0,0 +1,263 @@
+"""
+Almacén de frames de video decodificados una sola vez.
+
+/input/video decodifica el video con VideoFrameSampler y guarda los frames
+muestreados en un único .npy (uint8, N x H x W x 3, BGR) que se abre después
+como memmap, junto a un meta.json con los timestamps. La clave es el hash del
+contenido (video_id), así que subir dos veces el mismo video no repite el
+trabajo. /predict/video y los trabajos de video analizan el artefacto por
+referencia (?video_id=...) con StoredFrameSource, sin volver a subir ni a
+decodificar el video.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Dict, Iterator, Optional
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.video_sampler import SampledFrame, VideoFrameSampler
+
+logger = logging.getLogger(__name__)
+
+FRAMES_FILE = "frames.npy"
+META_FILE = "meta.json"
+VIDEO_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def content_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+class StoredVideo:
+    """Frames (memmap de solo lectura) y metadatos de un video ingerido."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.video_id = self.meta["video_id"]
+        self.frames = np.load(os.path.join(path, FRAMES_FILE), mmap_mode="r")
+        self.count = self.meta["count"]
+        self.indices = self.meta["indices"]
+        self.timestamps = self.meta["timestamps"]
+        self.fps = self.meta["fps"]
+        self.sample_fps = self.meta["sample_fps"]
+        self.step = self.meta["step"]
+        self.total_frames = self.meta["total_frames"]
+
+
+class StoredFrameSource:
+    """
+    Misma interfaz que VideoFrameSampler (iteración, stats, expected_samples)
+    sobre los frames de un StoredVideo. No puede muestrear más denso que la
+    ingesta: si sample_fps es mayor que el de la ingesta se usan todos los frames.
+    Con max_frames el paso se amplía para cubrir el video entero, igual que al
+    decodificar el archivo.
+    """
+
+    strategy = "stored"
+
+    def __init__(self, stored: StoredVideo, sample_fps: float = None, max_frames: Optional[int] = None):
+        self.stored = stored
+        self.video_id = stored.video_id
+        self.stored_frames = stored.count
+        self.fps = stored.fps
+        self.total_frames = stored.total_frames
+        self.max_frames = max_frames
+        stride = max(1, round(stored.sample_fps / sample_fps)) if sample_fps else 1
+        if max_frames:
+            # Como VideoFrameSampler: el presupuesto de frames se reparte por todo el video
+            stride = max(stride, math.ceil(stored.count / max_frames))
+        self.stride = stride
+        self.step = stored.step * self.stride
+        self.frames_sampled = 0
+
+    def __iter__(self) -> Iterator[SampledFrame]:
+        for i in range(0, self.stored.count, self.stride):
+            if self.max_frames is not None and self.frames_sampled >= self.max_frames:
+                break
+            self.frames_sampled += 1
+            yield SampledFrame(self.stored.indices[i], self.stored.timestamps[i], self.stored.frames[i])
+
+    def expected_samples(self) -> Optional[int]:
+        expected = math.ceil(self.stored_frames / self.stride)
+        return min(expected, self.max_frames) if self.max_frames else expected
+
+    def stats(self) -> Dict:
+        return {
+            "strategy": self.strategy,
+            "video_id": self.video_id,
+            "fps": round(self.fps, 3),
+            "total_frames": self.total_frames,
+            "step": self.step,
+            "stored_frames": self.stored_frames,
+            "frames_sampled": self.frames_sampled,
+            "decode_ms": 0.0,
+        }
+
+    def close(self):
+        self.stored = None
+
+
+class VideoFrameStore:
+    """
+    Artefactos por video en root_dir/<video_id>/ (frames.npy + meta.json).
+
+    Los frames se reducen para que su lado mayor no pase de max_side (YOLO
+    trabaja a 640 px, así que por encima no se gana nada) y se escriben
+    directamente en el memmap, sin acumularlos en memoria. Cada artefacto se
+    escribe en una carpeta temporal y se publica con un rename atómico; los que
+    llevan más de ttl_s segundos sin usarse se borran en la siguiente ingesta.
+    """
+
+    def __init__(self, root_dir: str, sample_fps: float = 1.0, max_frames: int = 300,
+                 max_side: int = 640, ttl_s: float = 86400):
+        self.root_dir = root_dir
+        self.sample_fps = sample_fps
+        self.max_frames = max_frames
+        self.max_side = max_side
+        self.ttl_s = ttl_s
+
+    def _path(self, video_id: str) -> str:
+        if not VIDEO_ID_PATTERN.match(video_id or ""):
+            raise KeyError(video_id)
+        return os.path.join(self.root_dir, video_id)
+
+    def exists(self, video_id: str) -> bool:
+        try:
+            return os.path.exists(os.path.join(self._path(video_id), META_FILE))
+        except KeyError:
+            return False
+
+    def open(self, video_id: str) -> StoredVideo:
+        """StoredVideo del id, o KeyError si no existe (o ha caducado)."""
+        path = self._path(video_id)
+        if not os.path.exists(os.path.join(path, META_FILE)):
+            raise KeyError(f"Video {video_id} no encontrado o caducado")
+        os.utime(path)  # marca de último uso para el TTL
+        return StoredVideo(path)
+
+    def remove(self, video_id: str):
+        shutil.rmtree(self._path(video_id), ignore_errors=True)
+
+    def source(self, video_id: str, sample_fps: float = None, max_frames: Optional[int] = None) -> StoredFrameSource:
+        return StoredFrameSource(self.open(video_id), sample_fps, max_frames)
+
+    def _target_size(self, width: int, height: int):
+        scale = min(1.0, self.max_side / max(width, height))
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def ingest(self, video_path: str) -> Dict:
+        """Decodifica y guarda los frames muestreados del video (una sola vez por contenido)."""
+        video_id = content_hash(video_path)
+        if self.exists(video_id):
+            try:
+                return {**self.open(video_id).meta, "cached": True}
+            except (ValueError, OSError, KeyError) as e:
+                # Artefacto corrupto o borrado a medias: se vuelve a generar
+                logger.warning("Video %s almacenado ilegible, se regenera: %s", video_id, e)
+                self.remove(video_id)
+
+        self.purge_expired()
+        os.makedirs(self.root_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{video_id}-", dir=self.root_dir)
+        try:
+            meta = self._write(video_path, video_id, tmp_dir)
+            logger.info("Video %s ingerido: %d frames %dx%d en %.0f ms",
+                        video_id, meta["count"], meta["width"], meta["height"], meta["decode_ms"])
+            try:
+                os.rename(tmp_dir, self._path(video_id))
+            except OSError:
+                # Otra petición ingirió el mismo contenido a la vez
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            return {**meta, "cached": False}
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def _write(self, video_path: str, video_id: str, out_dir: str) -> Dict:
+        sampler = VideoFrameSampler(
+            video_path,
+            sample_fps=self.sample_fps,
+            max_frames=self.max_frames,
+            strategy=settings.VIDEO_SAMPLER_STRATEGY,
+            seek_min_step=settings.VIDEO_SEEK_MIN_STEP,
+        )
+        width = int(sampler.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(sampler.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        size = self._target_size(width, height)
+        capacity = sampler.expected_samples() or self.max_frames
+
+        frames_path = os.path.join(out_dir, FRAMES_FILE)
+        frames = np.lib.format.open_memmap(frames_path, mode="w+", dtype=np.uint8,
+                                           shape=(capacity, size[1], size[0], 3))
+        indices, timestamps = [], []
+        with sampler:
+            for sampled in sampler:
+                if len(indices) >= capacity:
+                    break
+                image = sampled.image
+                if (image.shape[1], image.shape[0]) != size:
+                    image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+                frames[len(indices)] = image
+                indices.append(sampled.index)
+                timestamps.append(sampled.timestamp_s)
+        frames.flush()
+        del frames
+
+        count = len(indices)
+        if count < capacity:
+            # El contenedor anunció más frames de los que tenía: recortar el fichero
+            data = np.load(frames_path, mmap_mode="r")[:count].copy()
+            np.save(frames_path, data)
+
+        meta = {
+            "video_id": video_id,
+            "count": count,
+            "width": size[0],
+            "height": size[1],
+            "fps": sampler.fps,
+            "sample_fps": self.sample_fps,
+            "step": sampler.step,
+            "total_frames": sampler.total_frames,
+            "indices": indices,
+            "timestamps": timestamps,
+            "decode_ms": round(sampler.decode_ms, 2),
+            "created_at": time.time(),
+        }
+        with open(os.path.join(out_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return meta
+
+    def purge_expired(self):
+        if not os.path.isdir(self.root_dir):
+            return
+        now = time.time()
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_s:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                continue
+
+
+video_store = VideoFrameStore(
+    root_dir=settings.VIDEO_STORE_DIR,
+    sample_fps=settings.VIDEO_STORE_SAMPLE_FPS,
+    max_frames=settings.VIDEO_STORE_MAX_FRAMES,
+    max_side=settings.VIDEO_STORE_MAX_SIDE,
+    ttl_s=settings.VIDEO_STORE_TTL_S,
+)
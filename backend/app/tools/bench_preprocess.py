@@ -0,0 +1,145 @@
+"""
+Microbenchmark del preprocesado de recortes para los 3 clasificadores.
+
+Compara, por frame, el camino anterior (cv2.resize para MobileNet y un segundo
+redimensionado con PIL para Keras V1 / PyTorch; con TensorFlow y torchvision
+instalados, también el camino original con preprocess_input, img_to_array y
+transforms.Compose) frente a PredictionService._build_inputs, que hace un único
+cv2.resize a un buffer uint8 reservado y normaliza en NumPy.
+
+Además de la velocidad informa de la desviación media en píxeles frente al
+redimensionado de PIL y, con --images y los modelos cargados, de la coincidencia
+del top-1 de cada arquitectura entre el camino anterior y el compartido.
+
+Uso:
+    python -m app.tools.bench_preprocess
+    python -m app.tools.bench_preprocess --batch 1 16 --iters 200 --crop 480x360
+    python -m app.tools.bench_preprocess --images ./fotos_perros
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.services.prediction_service import PredictionService
+
+
+def _pil_path(service: PredictionService, crops):
+    """Implementación anterior: dos redimensionados (cv2 y PIL) y normalización sobre cada copia."""
+    imgs_mob = np.stack([cv2.resize(crop, service.img_size) for crop in crops]).astype(np.float32)
+    in_mob = imgs_mob / 127.5 - 1.0
+    imgs_pil = np.stack([
+        np.asarray(Image.fromarray(crop).resize(service.img_size), dtype=np.float32) for crop in crops
+    ])
+    in_pt = ((imgs_pil / 255.0 - service.IMAGENET_MEAN) / service.IMAGENET_STD).transpose(0, 3, 1, 2).astype(np.float32)
+    return in_mob, imgs_pil, in_pt
+
+
+def _framework_path():
+    """Camino original con utilidades de TensorFlow y torchvision, si están instaladas."""
+    try:
+        import tensorflow as tf
+        import torch
+        from torchvision import transforms
+    except ImportError:
+        return None
+
+    def run(service: PredictionService, crops):
+        outputs = []
+        for crop in crops:
+            in_mob = tf.keras.applications.mobilenet_v2.preprocess_input(
+                np.expand_dims(cv2.resize(crop, service.img_size), axis=0)
+            )
+            img_pil = Image.fromarray(crop).resize(service.img_size)
+            in_v1 = tf.expand_dims(tf.keras.preprocessing.image.img_to_array(img_pil), 0)
+            pt_trans = transforms.Compose([
+                transforms.ToTensor(),
+                transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+            ])
+            in_pt = torch.unsqueeze(pt_trans(img_pil), 0)
+            outputs.append((in_mob, in_v1, in_pt))
+        return outputs
+
+    return run
+
+
+def _time_per_frame(fn, service, crops, iters: int) -> float:
+    fn(service, crops)  # calentamiento (reserva del buffer, imports perezosos)
+    t0 = time.perf_counter()
+    for _ in range(iters):
+        fn(service, crops)
+    return (time.perf_counter() - t0) * 1000 / (iters * len(crops))
+
+
+def _pixel_deviation(service: PredictionService, crops) -> float:
+    """Diferencia media absoluta (0-255) entre la entrada de Keras V1 con PIL y la compartida."""
+    _, imgs_pil, _ = _pil_path(service, crops)
+    _, in_v1, _ = service._build_inputs(crops)
+    return float(np.abs(in_v1 - imgs_pil).mean())
+
+
+def _top1_agreement(service: PredictionService, image_dir: str):
+    """Fracción de recortes con el mismo top-1 por arquitectura con las entradas anterior y compartida."""
+    matches = {arch: 0 for arch in service.ARCHITECTURES}
+    total = 0
+    for name in sorted(os.listdir(image_dir)):
+        if cv2.imread(os.path.join(image_dir, name)) is None:
+            continue
+        img_rgb = service._load_image(os.path.join(image_dir, name))
+        crop = service._select_crop(img_rgb, service.yolo.detect([img_rgb], conf=0.15)[0])
+        if crop is None:
+            continue
+        old, _ = service._run_classifiers(*_pil_path(service, [crop]), raw=True)
+        new, _ = service._run_classifiers(*service._build_inputs([crop]), raw=True)
+        total += 1
+        for arch in matches:
+            if old[arch] is not None and int(np.argmax(old[arch][0])) == int(np.argmax(new[arch][0])):
+                matches[arch] += 1
+    return total, {arch: count / total if total else 0.0 for arch, count in matches.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coste de preprocesado por frame")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--iters", type=int, default=100)
+    parser.add_argument("--crop", default="480x360", help="Tamaño del recorte de entrada (ANCHOxALTO)")
+    parser.add_argument("--images", help="Carpeta de fotos para medir la coincidencia del top-1 (carga los modelos)")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.crop.split("x"))
+    service = PredictionService(use_mock=args.images is None)
+    rng = np.random.default_rng(0)
+
+    paths = {
+        "pil (anterior)": _pil_path,
+        "compartido": lambda svc, crops: svc._build_inputs(crops),
+    }
+    framework = _framework_path()
+    if framework is not None:
+        paths = {"tf/torchvision (original)": framework, **paths}
+
+    print(f"Recorte {width}x{height} -> {service.img_size[0]}x{service.img_size[1]}, {args.iters} iteraciones")
+    for batch in args.batch:
+        crops = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(batch)]
+        results = {name: _time_per_frame(fn, service, crops, args.iters) for name, fn in paths.items()}
+        baseline = results["pil (anterior)"]
+        print(f"\nbatch={batch}")
+        for name, ms in results.items():
+            print(f"  {name:28s} {ms:8.3f} ms/frame  ({baseline / ms:4.2f}x vs anterior)")
+        print(f"  desviación media frente a PIL: {_pixel_deviation(service, crops):.2f} (0-255)")
+
+    if args.images:
+        if not service.model_loaded:
+            print("\nModelos no cargados: no se puede medir la coincidencia del top-1")
+            return
+        total, agreement = _top1_agreement(service, args.images)
+        print(f"\nCoincidencia del top-1 con el camino anterior ({total} recortes)")
+        for arch, rate in agreement.items():
+            print(f"  {arch:10s} {rate:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Benchmark de extremo a extremo de la predicción, con percentiles por etapa.
+
+Recorre un corpus de fotos (--images) y frames sintéticos de varias
+resoluciones, y mide por separado:
+
+    decode       cv2.imdecode + BGR->RGB
+    detection    YOLO (o la cascada de detectores)
+    crop         selección del perro y padding
+    preprocess   entradas de los 3 clasificadores
+    mobile / keras / pytorch   una pasada de cada clasificador
+    postprocess  top-3 y formato de respuesta
+    pipeline     predict_all_architectures completo (sin caché)
+
+y, con un cliente ASGI en proceso, los endpoints /predict, /predict/video y
+/predict/ws. Para cada etapa informa p50/p95/p99, media y throughput, y guarda
+el resultado en JSON para poder comparar ejecuciones entre commits.
+
+Uso:
+    python -m app.tools.benchmark --images muestras/ --output bench.json
+    python -m app.tools.benchmark --resolutions 640x480 1920x1080 --iters 50
+    python -m app.tools.benchmark --no-endpoints --mode adaptive
+"""
+import argparse
+import base64
+import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.prediction_service import prediction_service
+from app.tools.export_onnx import _load_images
+
+
+class StageTimer:
+    """Acumula duraciones (ms) por etapa."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def time(self, stage: str, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.samples[stage].append((time.perf_counter() - t0) * 1000)
+        return result
+
+    def summary(self) -> Dict[str, Dict]:
+        return {stage: summarize(values) for stage, values in self.samples.items()}
+
+
+def summarize(values: List[float]) -> Dict:
+    arr = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        "count": int(arr.size),
+        "mean_ms": round(float(arr.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "throughput_per_s": round(1000.0 / float(arr.mean()), 2) if arr.mean() > 0 else None,
+    }
+
+
+# ==========================================================
+# CORPUS
+# ==========================================================
+
+def build_corpus(images_dir: str, limit: int, resolutions: List[str], per_resolution: int) -> Dict[str, List[bytes]]:
+    """Imágenes codificadas en JPEG agrupadas por origen ('corpus' o 'synthetic_AnchoxAlto')."""
+    corpus: Dict[str, List[bytes]] = {}
+    if images_dir:
+        encoded = []
+        for rgb in _load_images(images_dir, limit):
+            ok, buf = cv2.imencode(".jpg", cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+            if ok:
+                encoded.append(buf.tobytes())
+        if encoded:
+            corpus["corpus"] = encoded
+
+    rng = np.random.default_rng(0)
+    for resolution in resolutions:
+        width, height = (int(v) for v in resolution.split("x"))
+        frames = []
+        for _ in range(per_resolution):
+            # Ruido suavizado: comprime como una foto real y no es trivial para el decodificador
+            frame = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (7, 7), 0)
+            frames.append(cv2.imencode(".jpg", frame)[1].tobytes())
+        corpus[f"synthetic_{resolution}"] = frames
+    return corpus
+
+
+def make_video(frame_bytes: List[bytes], seconds: int, fps: int = 30) -> str:
+    """Escribe un .mp4 temporal repitiendo los frames del corpus."""
+    frames = [cv2.imdecode(np.frombuffer(b, np.uint8), cv2.IMREAD_COLOR) for b in frame_bytes]
+    height, width = frames[0].shape[:2]
+    path = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4").name
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for i in range(seconds * fps):
+        frame = frames[(i // fps) % len(frames)]
+        writer.write(cv2.resize(frame, (width, height)))
+    writer.release()
+    return path
+
+
+# ==========================================================
+# STAGES
+# ==========================================================
+
+def bench_stages(corpus: Dict[str, List[bytes]], iters: int, mode: str) -> Dict:
+    """Mide cada etapa del pipeline llamando a los mismos métodos que usa el servicio."""
+    service = prediction_service
+    report = {}
+
+    for source, images in corpus.items():
+        timer = StageTimer()
+        dogs = 0
+        for i in range(iters):
+            data = images[i % len(images)]
+
+            def decode():
+                bgr = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                return bgr, service._load_image(image_array=bgr)
+            frame, img_rgb = timer.time("decode", decode)
+            detections = timer.time("detection", lambda: service.yolo.detect([img_rgb], conf=0.15)[0])
+            crop = timer.time("crop", service._select_crop, img_rgb, detections, True)
+            if crop is not None:
+                dogs += 1
+            else:
+                # Sin perro: se clasifica la imagen completa para medir igualmente los clasificadores
+                crop = img_rgb
+            in_mob, in_v1, in_pt = timer.time("preprocess", service._build_inputs, [crop])
+
+            probs = {
+                "mobile": timer.time("mobile", service._predict_probs, service.model_mobile, in_mob)[0],
+                "keras": timer.time("keras", service._predict_probs, service.model_keras_v1, in_v1)[0],
+                "pytorch": timer.time("pytorch", service._predict_probs, service.model_pytorch, in_pt)[0],
+            }
+            timer.time("postprocess", lambda: {
+                "mobile": service.get_top_predictions(service._decode_predictions(probs["mobile"], service.label_table_355)),
+                "keras": service.get_top_predictions(service._decode_predictions(probs["keras"], service.label_table_120)),
+                "pytorch": service.get_top_predictions(service._decode_predictions(probs["pytorch"], service.label_table_120)),
+            })
+
+            timer.time("pipeline", service.predict_all_architectures, image_array=frame, mode=mode)
+
+        stages = timer.summary()
+        report[source] = {"iterations": iters, "dog_detected_rate": round(dogs / iters, 4), "stages": stages}
+        print_stages(source, stages)
+
+    return report
+
+
+# ==========================================================
+# ENDPOINTS
+# ==========================================================
+
+def bench_endpoints(corpus: Dict[str, List[bytes]], iters: int, video_seconds: int, mode: str) -> Dict:
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    # Sin lifespan (Playwright); los endpoints cargan los modelos con ensure_loaded
+    client = TestClient(app)
+    prefix = f"{settings.API_V1_STR}/predict"
+    images = [data for group in corpus.values() for data in group]
+    timer = StageTimer()
+
+    for i in range(iters):
+        data = images[i % len(images)]
+        response = timer.time("POST /predict", client.post, f"{prefix}/?mode={mode}",
+                              files={"file": ("bench.jpg", data, "image/jpeg")})
+        response.raise_for_status()
+
+    data_urls = ["data:image/jpeg;base64," + base64.b64encode(data).decode() for data in images]
+    with client.websocket_connect(f"{prefix}/ws?mode={mode}") as ws:
+        for i in range(iters):
+            def roundtrip():
+                ws.send_text(data_urls[i % len(data_urls)])
+                return ws.receive_text()
+            timer.time("WS /predict/ws", roundtrip)
+
+    video_path = make_video(images[:10], video_seconds)
+    try:
+        with open(video_path, "rb") as f:
+            video = f.read()
+        for _ in range(max(1, iters // 10)):
+            response = timer.time("POST /predict/video", client.post, f"{prefix}/video?mode={mode}",
+                                  files={"file": ("bench.mp4", video, "video/mp4")})
+            response.raise_for_status()
+    finally:
+        os.remove(video_path)
+
+    stages = timer.summary()
+    print_stages("endpoints", stages)
+    return {"video_seconds": video_seconds, "stages": stages}
+
+
+# ==========================================================
+# REPORT
+# ==========================================================
+
+def print_stages(title: str, stages: Dict[str, Dict]):
+    print(f"\n{title}")
+    print(f"  {'etapa':22s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'media':>9s} {'ops/s':>9s}")
+    for stage, s in stages.items():
+        print(f"  {stage:22s} {s['p50_ms']:9.2f} {s['p95_ms']:9.2f} {s['p99_ms']:9.2f} "
+              f"{s['mean_ms']:9.2f} {s['throughput_per_s'] or 0:9.1f}")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de predicción con percentiles por etapa")
+    parser.add_argument("--images", help="Carpeta con fotos para el corpus")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--resolutions", nargs="*", default=["640x480", "1280x720", "1920x1080"])
+    parser.add_argument("--frames-per-resolution", type=int, default=5)
+    parser.add_argument("--iters", type=int, default=30, help="Iteraciones por grupo del corpus")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--mode", choices=["full", "adaptive"], default="full")
+    parser.add_argument("--video-seconds", type=int, default=5)
+    parser.add_argument("--no-endpoints", action="store_true")
+    parser.add_argument("--with-cache", action="store_true", help="Mantener la caché de predicciones activa")
+    parser.add_argument("--output", default="benchmark.json")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.images, args.limit, args.resolutions, args.frames_per_resolution)
+    if not corpus:
+        parser.error("El corpus está vacío: indica --images o --resolutions")
+
+    if settings.INFERENCE_WORKERS > 0:
+        parser.error("Las etapas se miden en el proceso actual: ejecuta el benchmark con INFERENCE_WORKERS=0")
+    prediction_service.ensure_loaded()
+    if not prediction_service.model_loaded:
+        parser.error("No se pudieron cargar los modelos; el benchmark no tiene sentido en modo mock")
+    if not args.with_cache:
+        prediction_service.cache = None
+    # Evitar llenar static/uploads con las imágenes del benchmark
+    settings.SAVE_UPLOADED_IMAGES = False
+
+    for data in next(iter(corpus.values()))[:args.warmup]:
+        prediction_service.predict_all_architectures(image_array=cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR))
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "platform": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "config": {
+            "engine": prediction_service.engine,
+            "profile": prediction_service.profile,
+            "mode": args.mode,
+            "parallel_classifiers": settings.PARALLEL_CLASSIFIERS,
+            "scheduler": settings.INFERENCE_SCHEDULER_ENABLED,
+            "detector_cascade": settings.DETECTOR_CASCADE_ENABLED,
+            "cache": args.with_cache,
+        },
+        "pipeline": bench_stages(corpus, args.iters, args.mode),
+    }
+    if not args.no_endpoints:
+        report["endpoints"] = bench_endpoints(corpus, args.iters, args.video_seconds, args.mode)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Exporta los 4 modelos a ONNX junto a los originales en app/models y comprueba
+la paridad de precisión frente a los frameworks nativos.
+
+Uso:
+    python -m app.tools.export_onnx                     # exportar
+    python -m app.tools.export_onnx --check --images D  # exportar y comprobar paridad
+    python -m app.tools.export_onnx --check-only --images D
+
+Requiere, además de requirements-onnx.txt: pip install onnx tf2onnx
+"""
+import argparse
+import glob
+import os
+import sys
+from typing import List
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.inference_backends import (
+    ONNX_MODEL_FILES,
+    KerasClassifier,
+    OnnxClassifier,
+    OnnxYoloDetector,
+    TorchClassifier,
+    UltralyticsDetector,
+    build_efficientnet_b0,
+)
+from app.services.prediction_service import PredictionService
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+OPSET = 17
+
+KERAS_MODEL_FILES = {
+    "mobile": "pawsense_mobile_model.keras",
+    "keras": "modelo_prediccion_perros_v1.keras",
+}
+PYTORCH_MODEL_FILE = "modelo_perros_pytorch.pth"
+YOLO_MODEL_FILE = "yolov8m.pt"
+
+
+# ==========================================================
+# EXPORT
+# ==========================================================
+
+def export_yolo(model_file: str = YOLO_MODEL_FILE):
+    from ultralytics import YOLO
+
+    # Ultralytics escribe <modelo>.onnx junto al .pt; batch dinámico para /predict/batch
+    YOLO(os.path.join(MODELS_DIR, model_file)).export(format="onnx", dynamic=True, imgsz=640, opset=OPSET)
+    print(f"✅ {model_file} -> {os.path.splitext(model_file)[0]}.onnx")
+
+
+def export_keras(key: str):
+    import tensorflow as tf
+    import tf2onnx
+
+    model = tf.keras.models.load_model(os.path.join(MODELS_DIR, KERAS_MODEL_FILES[key]))
+    spec = (tf.TensorSpec((None, 224, 224, 3), tf.float32, name="input"),)
+
+    # from_function evita las incompatibilidades de tf2onnx con los modelos Keras 3
+    tf2onnx.convert.from_function(
+        tf.function(lambda x: model(x, training=False)),
+        input_signature=spec,
+        opset=OPSET,
+        output_path=os.path.join(MODELS_DIR, ONNX_MODEL_FILES[key]),
+    )
+    print(f"✅ {KERAS_MODEL_FILES[key]} -> {ONNX_MODEL_FILES[key]}")
+
+
+def export_pytorch():
+    import torch
+
+    model = build_efficientnet_b0()
+    model.load_state_dict(torch.load(os.path.join(MODELS_DIR, PYTORCH_MODEL_FILE), map_location=torch.device("cpu")))
+    model.eval()
+
+    torch.onnx.export(
+        model,
+        torch.zeros(1, 3, 224, 224),
+        os.path.join(MODELS_DIR, ONNX_MODEL_FILES["pytorch"]),
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=OPSET,
+    )
+    print(f"✅ {PYTORCH_MODEL_FILE} -> {ONNX_MODEL_FILES['pytorch']}")
+
+
+# ==========================================================
+# PARITY CHECK
+# ==========================================================
+
+def _load_images(folder: str, limit: int) -> List[np.ndarray]:
+    paths = []
+    for ext in ("*.jpg", "*.jpeg", "*.png", "*.webp", "*.bmp"):
+        paths.extend(glob.glob(os.path.join(folder, ext)))
+    images = [cv2.imread(p) for p in sorted(paths)[:limit]]
+    return [cv2.cvtColor(img, cv2.COLOR_BGR2RGB) for img in images if img is not None]
+
+
+def _box_iou(a, b) -> float:
+    ix1, iy1, ix2, iy2 = max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def check_parity(images: List[np.ndarray], min_agreement: float) -> bool:
+    """
+    Compara salidas nativas y ONNX sobre las mismas imágenes: diferencia absoluta
+    máxima de probabilidades y acuerdo top-1 por clasificador; y para YOLO, el
+    acuerdo sobre si hay perro y el IoU de la mejor caja.
+    """
+    service = PredictionService(use_mock=True)
+    crops = [cv2.resize(img, service.img_size) for img in images]
+    in_mob, in_v1, in_pt = service._build_inputs(crops)
+
+    pairs = {
+        "mobile": (KerasClassifier(os.path.join(MODELS_DIR, KERAS_MODEL_FILES["mobile"])),
+                   OnnxClassifier(os.path.join(MODELS_DIR, ONNX_MODEL_FILES["mobile"])), in_mob),
+        "keras": (KerasClassifier(os.path.join(MODELS_DIR, KERAS_MODEL_FILES["keras"])),
+                  OnnxClassifier(os.path.join(MODELS_DIR, ONNX_MODEL_FILES["keras"])), in_v1),
+        "pytorch": (TorchClassifier(os.path.join(MODELS_DIR, PYTORCH_MODEL_FILE)),
+                    OnnxClassifier(os.path.join(MODELS_DIR, ONNX_MODEL_FILES["pytorch"]), apply_softmax=True), in_pt),
+    }
+
+    ok = True
+    print(f"\nParidad sobre {len(images)} imágenes")
+    for arch, (native, onnx, batch) in pairs.items():
+        p_native = native.predict_proba(batch)
+        p_onnx = onnx.predict_proba(batch)
+        agreement = float(np.mean(p_native.argmax(axis=1) == p_onnx.argmax(axis=1)))
+        max_diff = float(np.max(np.abs(p_native - p_onnx)))
+        ok &= agreement >= min_agreement
+        print(f"  {arch:8s} top-1 acuerdo={agreement:.2%}  max|Δp|={max_diff:.2e}")
+
+    native_yolo = UltralyticsDetector(os.path.join(MODELS_DIR, YOLO_MODEL_FILE))
+    onnx_yolo = OnnxYoloDetector(os.path.join(MODELS_DIR, ONNX_MODEL_FILES["yolo"]))
+    dog_agree, ious = 0, []
+    for img in images:
+        best = []
+        for detector in (native_yolo, onnx_yolo):
+            dogs = [d for d in detector.detect([img], conf=0.15)[0] if d[0] == PredictionService.DOG_CLASS_ID and d[1] > 0.40]
+            best.append(max(dogs, key=lambda d: d[1]) if dogs else None)
+        if (best[0] is None) == (best[1] is None):
+            dog_agree += 1
+            if best[0] is not None:
+                ious.append(_box_iou(best[0][2], best[1][2]))
+    yolo_agreement = dog_agree / len(images)
+    ok &= yolo_agreement >= min_agreement
+    print(f"  {'yolo':8s} perro acuerdo={yolo_agreement:.2%}  IoU medio={np.mean(ious) if ious else 0:.3f}")
+
+    print("✅ Paridad OK" if ok else f"❌ Acuerdo por debajo de {min_agreement:.0%}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta los modelos de PawSense a ONNX")
+    parser.add_argument("--check", action="store_true", help="Comprobar paridad tras exportar")
+    parser.add_argument("--check-only", action="store_true", help="Solo comprobar paridad")
+    parser.add_argument("--images", help="Carpeta con fotos de perros para la comprobación")
+    parser.add_argument("--limit", type=int, default=64)
+    parser.add_argument("--min-agreement", type=float, default=0.98)
+    parser.add_argument("--fast-detector", action="store_true",
+                        help="Exportar también el YOLO pequeño de la cascada (DETECTOR_FAST_MODEL)")
+    args = parser.parse_args()
+
+    if not args.check_only:
+        export_yolo()
+        if args.fast_detector:
+            export_yolo(settings.DETECTOR_FAST_MODEL)
+        export_keras("mobile")
+        export_keras("keras")
+        export_pytorch()
+
+    if args.check or args.check_only:
+        if not args.images:
+            parser.error("--images es obligatorio para comprobar la paridad")
+        images = _load_images(args.images, args.limit)
+        if not images:
+            parser.error(f"No se encontraron imágenes en {args.images}")
+        if not check_parity(images, args.min_agreement):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
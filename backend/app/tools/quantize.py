@@ -0,0 +1,184 @@
+"""
+Genera los clasificadores INT8 del perfil MODEL_PROFILE=quantized y un informe
+de acuerdo top-1 frente a los modelos FP32.
+
+    - pawsense_mobile_model.keras        -> pawsense_mobile_model_int8.tflite
+    - modelo_prediccion_perros_v1.keras  -> modelo_prediccion_perros_v1_int8.tflite
+    - modelo_perros_pytorch.pth          -> modelo_perros_pytorch_int8.pt (TorchScript)
+
+La calibración usa recortes de perro (YOLO) de una carpeta de fotos de muestra.
+Una parte de las fotos se reserva para el informe y no se usa para calibrar.
+
+Uso:
+    python -m app.tools.quantize --images muestras/
+    python -m app.tools.quantize --images muestras/ --pytorch-mode dynamic
+    python -m app.tools.quantize --images muestras/ --report-only
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from app.services.inference_backends import (
+    QUANTIZED_MODEL_FILES,
+    KerasClassifier,
+    TFLiteClassifier,
+    TorchClassifier,
+    TorchScriptClassifier,
+    UltralyticsDetector,
+    build_efficientnet_b0,
+)
+from app.services.prediction_service import PredictionService
+from app.tools.export_onnx import (
+    KERAS_MODEL_FILES,
+    MODELS_DIR,
+    PYTORCH_MODEL_FILE,
+    YOLO_MODEL_FILE,
+    _load_images,
+)
+
+
+def _dog_crops(images):
+    """Recorta el perro de cada foto con la misma lógica que el servicio (con fallback a imagen completa)."""
+    service = PredictionService(use_mock=True)
+    detector = UltralyticsDetector(os.path.join(MODELS_DIR, YOLO_MODEL_FILE))
+    crops = []
+    for img, detections in zip(images, detector.detect(images, conf=0.15)):
+        crop = service._select_crop(img, detections)
+        if crop is not None:
+            crops.append(crop)
+    return service._build_inputs(crops)
+
+
+# ==========================================================
+# CONVERSION
+# ==========================================================
+
+def quantize_keras(key: str, calibration: np.ndarray):
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(os.path.join(MODELS_DIR, KERAS_MODEL_FILES[key]))
+    concrete = tf.function(lambda x: model(x, training=False)).get_concrete_function(
+        tf.TensorSpec((None, 224, 224, 3), tf.float32)
+    )
+
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete], model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = lambda: ([sample[None]] for sample in calibration)
+    # Cuantización completa INT8; la entrada y la salida se mantienen en float32
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    out_path = os.path.join(MODELS_DIR, QUANTIZED_MODEL_FILES[key])
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+    print(f"✅ {KERAS_MODEL_FILES[key]} -> {QUANTIZED_MODEL_FILES[key]}")
+
+
+def quantize_pytorch(calibration: np.ndarray, mode: str = "static"):
+    import torch
+
+    model = build_efficientnet_b0()
+    model.load_state_dict(torch.load(os.path.join(MODELS_DIR, PYTORCH_MODEL_FILE), map_location=torch.device("cpu")))
+    model.eval()
+    example = torch.from_numpy(calibration[:1])
+
+    if mode == "dynamic":
+        # Solo las capas lineales; no requiere calibración
+        qmodel = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+        prepared = prepare_fx(model, get_default_qconfig_mapping("x86"), (example,))
+        with torch.no_grad():
+            for start in range(0, len(calibration), 16):
+                prepared(torch.from_numpy(calibration[start:start + 16]))
+        qmodel = convert_fx(prepared)
+
+    with torch.no_grad():
+        scripted = torch.jit.trace(qmodel, example)
+    torch.jit.save(scripted, os.path.join(MODELS_DIR, QUANTIZED_MODEL_FILES["pytorch"]))
+    print(f"✅ {PYTORCH_MODEL_FILE} -> {QUANTIZED_MODEL_FILES['pytorch']} ({mode})")
+
+
+# ==========================================================
+# REPORT
+# ==========================================================
+
+def _timed_predict(model, batch: np.ndarray):
+    t0 = time.perf_counter()
+    probs = np.concatenate([model.predict_proba(batch[i:i + 1]) for i in range(len(batch))])
+    return probs, (time.perf_counter() - t0) * 1000 / len(batch)
+
+
+def build_report(eval_inputs) -> dict:
+    """Acuerdo top-1, |Δp| medio, latencia por imagen (batch 1) y tamaño en disco FP32 vs INT8."""
+    in_mob, in_v1, in_pt = eval_inputs
+    pairs = {
+        "mobile": (KerasClassifier(os.path.join(MODELS_DIR, KERAS_MODEL_FILES["mobile"])),
+                   TFLiteClassifier(os.path.join(MODELS_DIR, QUANTIZED_MODEL_FILES["mobile"])),
+                   in_mob, KERAS_MODEL_FILES["mobile"]),
+        "keras": (KerasClassifier(os.path.join(MODELS_DIR, KERAS_MODEL_FILES["keras"])),
+                  TFLiteClassifier(os.path.join(MODELS_DIR, QUANTIZED_MODEL_FILES["keras"])),
+                  in_v1, KERAS_MODEL_FILES["keras"]),
+        "pytorch": (TorchClassifier(os.path.join(MODELS_DIR, PYTORCH_MODEL_FILE)),
+                    TorchScriptClassifier(os.path.join(MODELS_DIR, QUANTIZED_MODEL_FILES["pytorch"])),
+                    in_pt, PYTORCH_MODEL_FILE),
+    }
+
+    report = {"samples": int(len(in_mob)), "models": {}}
+    for arch, (fp32, int8, batch, fp32_file) in pairs.items():
+        p_fp32, ms_fp32 = _timed_predict(fp32, batch)
+        p_int8, ms_int8 = _timed_predict(int8, batch)
+        report["models"][arch] = {
+            "top1_agreement": round(float(np.mean(p_fp32.argmax(axis=1) == p_int8.argmax(axis=1))), 4),
+            "mean_abs_prob_diff": round(float(np.mean(np.abs(p_fp32 - p_int8))), 6),
+            "fp32_ms_per_image": round(ms_fp32, 2),
+            "int8_ms_per_image": round(ms_int8, 2),
+            "fp32_size_mb": round(os.path.getsize(os.path.join(MODELS_DIR, fp32_file)) / 1e6, 2),
+            "int8_size_mb": round(os.path.getsize(os.path.join(MODELS_DIR, QUANTIZED_MODEL_FILES[arch])) / 1e6, 2),
+        }
+        m = report["models"][arch]
+        print(f"  {arch:8s} top-1 acuerdo={m['top1_agreement']:.2%}  "
+              f"{m['fp32_ms_per_image']}ms -> {m['int8_ms_per_image']}ms  "
+              f"{m['fp32_size_mb']}MB -> {m['int8_size_mb']}MB")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cuantiza los clasificadores de PawSense a INT8")
+    parser.add_argument("--images", required=True, help="Carpeta con fotos de perros de muestra")
+    parser.add_argument("--limit", type=int, default=300)
+    parser.add_argument("--eval-split", type=float, default=0.25, help="Fracción reservada para el informe")
+    parser.add_argument("--pytorch-mode", choices=["static", "dynamic"], default="static")
+    parser.add_argument("--report", default=os.path.join(MODELS_DIR, "quantization_report.json"))
+    parser.add_argument("--report-only", action="store_true", help="No reconvertir, solo generar el informe")
+    args = parser.parse_args()
+
+    images = _load_images(args.images, args.limit)
+    if len(images) < 2:
+        parser.error(f"Se necesitan al menos 2 imágenes en {args.images}")
+
+    in_mob, in_v1, in_pt = _dog_crops(images)
+    n_eval = max(1, int(len(in_mob) * args.eval_split))
+    calib = slice(n_eval, None)
+    evaluation = slice(0, n_eval)
+
+    if not args.report_only:
+        quantize_keras("mobile", in_mob[calib])
+        quantize_keras("keras", in_v1[calib])
+        quantize_pytorch(in_pt[calib], args.pytorch_mode)
+
+    print(f"\nInforme FP32 vs INT8 sobre {n_eval} recortes reservados")
+    report = build_report((in_mob[evaluation], in_v1[evaluation], in_pt[evaluation]))
+    if not args.report_only:
+        report["pytorch_mode"] = args.pytorch_mode
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Informe guardado en {args.report}")
+
+
+if __name__ == "__main__":
+    main()
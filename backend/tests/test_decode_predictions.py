@@ -0,0 +1,58 @@
+import unittest
+
+import numpy as np
+
+from app.services.prediction_service import LabelTable, PredictionService
+
+
+def _table(n: int) -> LabelTable:
+    labels = [f"breed_{i}" for i in range(n)]
+    return LabelTable.build(labels, {label: f"raza_{i}" for i, label in enumerate(labels)}, {})
+
+
+class DecodePredictionsTest(unittest.TestCase):
+    """El top-k con argpartition debe coincidir con un argsort completo."""
+
+    def setUp(self):
+        self.service = PredictionService(use_mock=True, load_on_init=False)
+
+    def test_matches_full_argsort(self):
+        rng = np.random.default_rng(0)
+        table = _table(120)
+        for _ in range(50):
+            preds = rng.random(120).astype(np.float32)
+            expected = np.argsort(-preds, kind="stable")[:3]
+            decoded = self.service._decode_predictions(preds, table, top_n=3)
+            self.assertEqual([r.breed_en for r in decoded], [table.breed_en[i] for i in expected])
+            self.assertEqual([r.confidence for r in decoded], [float(preds[i]) for i in expected])
+
+    def test_descending_order(self):
+        table = _table(6)
+        preds = np.array([0.05, 0.4, 0.1, 0.3, 0.0, 0.15])
+        decoded = self.service._decode_predictions(preds, table, top_n=4)
+        self.assertEqual([r.breed_en for r in decoded], ["breed_1", "breed_3", "breed_5", "breed_2"])
+
+    def test_ties(self):
+        table = _table(5)
+        preds = np.array([0.2, 0.3, 0.2, 0.1, 0.2])
+        decoded = self.service._decode_predictions(preds, table, top_n=3)
+        # Mismas confianzas que el argsort completo; el empate se resuelve con cualquiera de las empatadas
+        self.assertEqual([r.confidence for r in decoded], [0.3, 0.2, 0.2])
+        self.assertEqual(decoded[0].breed_en, "breed_1")
+        tied = {"breed_0", "breed_2", "breed_4"}
+        self.assertTrue({r.breed_en for r in decoded[1:]} <= tied)
+        self.assertEqual(len({r.breed_en for r in decoded}), 3)
+
+    def test_top_n_larger_than_classes(self):
+        table = _table(2)
+        decoded = self.service._decode_predictions(np.array([0.4, 0.6]), table, top_n=5)
+        self.assertEqual([r.breed_en for r in decoded], ["breed_1", "breed_0"])
+
+    def test_index_outside_table_is_unknown(self):
+        table = _table(2)
+        decoded = self.service._decode_predictions(np.array([0.1, 0.2, 0.7]), table, top_n=1)
+        self.assertEqual(decoded[0].breed_en, "Unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
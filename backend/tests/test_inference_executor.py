@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from fastapi import HTTPException
+
+from app.api.v1.endpoints import predict
+from app.services import inference_executor as executor_module
+from app.services.inference_executor import InferenceExecutor, InferenceOverloadedError
+
+
+class ServiceTimeEwmaTest(unittest.TestCase):
+    """La media móvil del tiempo de servicio se actualiza solo para la clase del trabajo."""
+
+    def _timed(self, executor, job_class, elapsed):
+        with mock.patch.object(executor_module.time, "perf_counter", side_effect=[0.0, elapsed]):
+            executor._timed(job_class, lambda: None)
+
+    def test_first_sample_then_ewma(self):
+        executor = InferenceExecutor(max_workers=1)
+        self._timed(executor, "video", 10.0)
+        self.assertEqual(executor._service_time_s["video"], 10.0)
+
+        self._timed(executor, "video", 20.0)
+        self.assertAlmostEqual(executor._service_time_s["video"], 10.0 + InferenceExecutor.EWMA_ALPHA * 10.0)
+        self.assertEqual(executor.completed, 2)
+        executor.shutdown()
+
+    def test_classes_are_independent(self):
+        executor = InferenceExecutor(max_workers=1)
+        self._timed(executor, "video", 30.0)
+        self._timed(executor, "photo", 0.1)
+
+        self.assertEqual(executor._service_time_s["video"], 30.0)
+        self.assertEqual(executor._service_time_s["photo"], 0.1)
+        self.assertIsNone(executor._service_time_s["batch"])
+        executor.shutdown()
+
+    def test_failed_call_still_counts(self):
+        executor = InferenceExecutor(max_workers=1)
+
+        def fail():
+            raise ValueError("boom")
+
+        with mock.patch.object(executor_module.time, "perf_counter", side_effect=[0.0, 2.0]):
+            with self.assertRaises(ValueError):
+                executor._timed("photo", fail)
+        self.assertEqual(executor._service_time_s["photo"], 2.0)
+        executor.shutdown()
+
+
+class AdmissionTest(unittest.IsolatedAsyncioTestCase):
+    """Rechazo con 429 + Retry-After cuando la espera estimada supera max_wait_s o la cola está llena."""
+
+    async def asyncSetUp(self):
+        self.release = threading.Event()
+        self.executor = InferenceExecutor(max_workers=1, max_queue_depth=10, max_wait_s=5.0)
+        self.executor._service_time_s["video"] = 4.0
+        self.running = []
+
+    async def asyncTearDown(self):
+        self.release.set()
+        await asyncio.gather(*self.running, return_exceptions=True)
+        self.executor.shutdown()
+
+    async def _occupy(self, n: int, job_class: str = "video"):
+        for _ in range(n):
+            self.running.append(asyncio.create_task(self.executor.run(self.release.wait, job_class=job_class)))
+        await asyncio.sleep(0)
+
+    async def test_rejects_when_estimated_wait_exceeds_bound(self):
+        # 1 en ejecución + 1 en cola a 4 s cada uno: la siguiente esperaría 8 s > 5 s
+        await self._occupy(2)
+        self.assertAlmostEqual(self.executor.estimated_wait(), 8.0)
+
+        with self.assertRaises(InferenceOverloadedError) as ctx:
+            await self.executor.run(lambda: None, job_class="photo")
+        self.assertEqual(ctx.exception.retry_after, 8)
+        self.assertEqual(self.executor.rejected, 1)
+        self.assertEqual(self.executor.stats()["pending"], 2)
+
+    async def test_accepts_within_bound(self):
+        await self._occupy(1)
+        self.assertAlmostEqual(self.executor.estimated_wait(), 4.0)
+        self.running.append(asyncio.create_task(self.executor.run(lambda: "ok", job_class="photo")))
+        await asyncio.sleep(0)
+        self.assertEqual(self.executor.rejected, 0)
+
+    async def test_unmeasured_classes_do_not_count(self):
+        # Sin medidas de "batch" la espera estimada es 0 y no se rechaza
+        await self._occupy(3, job_class="batch")
+        self.assertEqual(self.executor.estimated_wait(), 0.0)
+
+    async def test_queue_full(self):
+        self.executor.max_queue_depth = 1
+        self.executor._service_time_s["video"] = None
+        await self._occupy(2)
+        with self.assertRaises(InferenceOverloadedError) as ctx:
+            await self.executor.run(lambda: None, job_class="video")
+        self.assertEqual(ctx.exception.retry_after, 1)
+
+    async def test_endpoint_maps_to_429_with_retry_after(self):
+        await self._occupy(2)
+        with mock.patch.object(predict, "inference_executor", self.executor):
+            with self.assertRaises(HTTPException) as ctx:
+                await predict.run_inference(lambda: None, job_class="photo")
+        self.assertEqual(ctx.exception.status_code, 429)
+        self.assertEqual(ctx.exception.headers, {"Retry-After": "8"})
+
+
+if __name__ == "__main__":
+    unittest.main()
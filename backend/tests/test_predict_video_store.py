@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+from fastapi import HTTPException
+
+from app.api.v1.endpoints import predict
+from app.services.video_store import FRAMES_FILE, VideoFrameStore
+
+
+def _write_video(path: str, frames: int = 20, fps: int = 10, size=(160, 120)):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    for i in range(frames):
+        writer.write(np.full((size[1], size[0], 3), (i * 11) % 255, dtype=np.uint8))
+    writer.release()
+
+
+class PredictStoredVideoTest(unittest.IsolatedAsyncioTestCase):
+    """/predict/video?video_id=...: solo un artefacto ilegible se borra; los fallos de inferencia no."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        video_path = os.path.join(self.tmp_dir, "clip.mp4")
+        _write_video(video_path)
+        self.store = VideoFrameStore(os.path.join(self.tmp_dir, "store"), sample_fps=5)
+        self.video_id = self.store.ingest(video_path)["video_id"]
+
+        for patcher in (
+            mock.patch.object(predict, "video_store", self.store),
+            mock.patch.object(predict.prediction_service, "ensure_loaded"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    async def _predict(self, video_id: str):
+        return await predict.predict_video(
+            file=None, video_id=video_id, mode="full", sample_fps=None, max_frames=None,
+            early_stop=False, time_budget_ms=None, track=False,
+        )
+
+    async def _predict_failing_with(self, error: Exception) -> HTTPException:
+        with mock.patch.object(predict, "run_inference", mock.AsyncMock(side_effect=error)):
+            with self.assertRaises(HTTPException) as ctx:
+                await self._predict(self.video_id)
+        return ctx.exception
+
+    async def test_inference_timeout_is_503_and_keeps_video(self):
+        error = await self._predict_failing_with(TimeoutError())
+        self.assertEqual(error.status_code, 503)
+        self.assertTrue(self.store.exists(self.video_id))
+
+    async def test_inference_error_is_500_and_keeps_video(self):
+        error = await self._predict_failing_with(ValueError("forma de entrada no válida"))
+        self.assertEqual(error.status_code, 500)
+        self.assertTrue(self.store.exists(self.video_id))
+
+    async def test_source_is_passed_to_analysis(self):
+        run = mock.AsyncMock(return_value={"success": True})
+        with mock.patch.object(predict, "run_inference", run):
+            await self._predict(self.video_id)
+        source = run.call_args.kwargs["source"]
+        self.assertEqual(source.video_id, self.video_id)
+        self.assertEqual(run.call_args.kwargs["job_class"], "video")
+
+    async def test_corrupt_artifact_is_400_and_removed(self):
+        with open(os.path.join(self.store._path(self.video_id), FRAMES_FILE), "wb") as f:
+            f.write(b"no es un npy")
+        run = mock.AsyncMock()
+        with mock.patch.object(predict, "run_inference", run):
+            with self.assertRaises(HTTPException) as ctx:
+                await self._predict(self.video_id)
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertFalse(self.store.exists(self.video_id))
+        run.assert_not_called()
+
+    async def test_unknown_video_is_404(self):
+        with self.assertRaises(HTTPException) as ctx:
+            await self._predict("f" * 32)
+        self.assertEqual(ctx.exception.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import prediction_cache
+from app.services.prediction_cache import PredictionCache
+from app.services.prediction_service import PredictionService
+
+
+class PredictionCacheTest(unittest.TestCase):
+
+    def test_lru_eviction_order(self):
+        cache = PredictionCache(max_entries=2, ttl_seconds=60)
+        cache.put("a", {"v": 1})
+        cache.put("b", {"v": 2})
+        cache.get("a")              # "a" pasa a ser la más reciente
+        cache.put("c", {"v": 3})    # se expulsa "b"
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), {"v": 1})
+        self.assertEqual(cache.get("c"), {"v": 3})
+        self.assertEqual(cache.stats()["size"], 2)
+
+    def test_put_existing_key_refreshes_position(self):
+        cache = PredictionCache(max_entries=2, ttl_seconds=60)
+        cache.put("a", {"v": 1})
+        cache.put("b", {"v": 2})
+        cache.put("a", {"v": 10})
+        cache.put("c", {"v": 3})
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), {"v": 10})
+
+    def test_ttl_expiry(self):
+        cache = PredictionCache(max_entries=10, ttl_seconds=5)
+        with mock.patch.object(prediction_cache.time, "monotonic", return_value=100.0):
+            cache.put("a", {"v": 1})
+        with mock.patch.object(prediction_cache.time, "monotonic", return_value=104.9):
+            self.assertEqual(cache.get("a"), {"v": 1})
+        with mock.patch.object(prediction_cache.time, "monotonic", return_value=105.1):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["size"], 0)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_get_and_put_are_isolated_copies(self):
+        cache = PredictionCache()
+        value = {"success": True, "mobile": [{"breed_en": "Beagle", "confidence": 90.0}]}
+        cache.put("a", value)
+        value["mobile"][0]["confidence"] = 0.0      # modificar el original tras put
+
+        first = cache.get("a")
+        self.assertEqual(first["mobile"][0]["confidence"], 90.0)
+        first["cached"] = True                      # modificar lo devuelto por get
+        first["mobile"].clear()
+
+        second = cache.get("a")
+        self.assertNotIn("cached", second)
+        self.assertEqual(second["mobile"][0]["breed_en"], "Beagle")
+
+    def test_key_depends_on_pixels_and_model_version(self):
+        image = np.zeros((4, 4, 3), dtype=np.uint8)
+        other = image.copy()
+        other[0, 0, 0] = 1
+        key = PredictionCache.key_for(image, "v1")
+        self.assertEqual(key, PredictionCache.key_for(image.copy(), "v1"))
+        self.assertNotEqual(key, PredictionCache.key_for(other, "v1"))
+        self.assertNotEqual(key, PredictionCache.key_for(image, "v2"))
+
+
+class PredictionCacheReloadTest(unittest.TestCase):
+    """load_model() vacía la caché: los resultados de la versión anterior no se sirven."""
+
+    def test_clear_on_model_reload(self):
+        with mock.patch.multiple(settings, PREDICTION_CACHE_ENABLED=True, INFERENCE_SCHEDULER_ENABLED=False,
+                                 DETECTOR_CASCADE_ENABLED=False, MODEL_PROFILE="fp32", INFERENCE_ENGINE="native"):
+            service = PredictionService(load_on_init=False)
+            service.cache.put("a", {"success": True})
+
+            with mock.patch.object(PredictionService, "_load_native_models"), \
+                    mock.patch.object(PredictionService, "_load_labels"), \
+                    mock.patch.object(PredictionService, "_compute_model_version", return_value="v2"):
+                service.load_model()
+
+        self.assertEqual(service.state, "loaded")
+        self.assertEqual(service.model_version, "v2")
+        self.assertEqual(service.cache.stats()["size"], 0)
+        self.assertIsNone(service.cache.get("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
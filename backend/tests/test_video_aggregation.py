@@ -0,0 +1,195 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from app.services import video_analysis
+from app.services.prediction_service import PredictionService
+from app.services.video_analysis import ARCHITECTURES, DistributionAggregator, VideoAnalyzer
+from app.services.video_sampler import SampledFrame
+
+
+def _service() -> PredictionService:
+    service = PredictionService(load_on_init=False)
+    service._load_labels()
+    service.model_loaded = True
+    return service
+
+
+def _row(service, arch, leader, second=None, p_leader=0.8, p_second=0.1):
+    row = np.zeros(service.num_classes(arch), dtype=np.float32)
+    row[leader] = p_leader
+    if second is not None:
+        row[second] = p_second
+    return row
+
+
+class _FakeSource:
+    """Frames sintéticos con la interfaz de VideoFrameSampler (1 frame por segundo)."""
+
+    def __init__(self, count: int):
+        self.count = count
+        self.fps = 1.0
+        self.step = 1
+        self.total_frames = count
+        self.frames_sampled = 0
+
+    def __iter__(self):
+        for i in range(self.count):
+            self.frames_sampled += 1
+            yield SampledFrame(i, float(i), np.full((8, 8, 3), i, dtype=np.uint8))
+
+    def expected_samples(self):
+        return self.count
+
+    def stats(self):
+        return {"strategy": "fake", "frames_sampled": self.frames_sampled}
+
+    def close(self):
+        pass
+
+
+class DistributionAggregatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.service = _service()
+        patcher = mock.patch.object(video_analysis, "prediction_service", self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _rows(self, leader, second=None, **kwargs):
+        return {arch: _row(self.service, arch, leader, second, **kwargs) for arch in ARCHITECTURES}
+
+    def test_weighted_mean(self):
+        agg = DistributionAggregator(capacity=2)
+        agg.add_frame(0.0, 0.75, self._rows(1))
+        agg.add_frame(1.0, 0.25, self._rows(2))
+
+        mean = agg.mean("mobile")
+        self.assertAlmostEqual(mean[1], 0.6)
+        self.assertAlmostEqual(mean[2], 0.2)
+        self.assertIsNone(DistributionAggregator().mean("keras"))
+
+    def test_margin_and_lower_bound(self):
+        agg = DistributionAggregator()
+        agg.add_frame(0.0, 1.0, self._rows(3, 5))
+        # Un solo frame: sin varianza estimable, la cota es margen - z
+        leader, margin, lower = agg.margin("mobile", z=1.96)
+        self.assertEqual(leader, 3)
+        self.assertAlmostEqual(margin, 0.7, places=5)
+        self.assertAlmostEqual(lower, 0.7 - 1.96, places=5)
+
+        for t in range(1, 4):
+            agg.add_frame(float(t), 1.0, self._rows(3, 5))
+        # Frames idénticos: varianza nula, la cota coincide con el margen
+        _, margin, lower = agg.margin("mobile", z=1.96)
+        self.assertAlmostEqual(lower, margin, places=5)
+
+        agg.add_frame(4.0, 1.0, self._rows(5, 3, p_leader=0.5, p_second=0.4))
+        _, margin_after, lower_after = agg.margin("mobile", z=1.96)
+        self.assertLess(margin_after, margin)
+        self.assertLess(lower_after, margin_after)
+
+    def test_grows_past_capacity(self):
+        agg = DistributionAggregator(capacity=1, num_segments=1)
+        for t in range(5):
+            agg.add_frame(t * 10.0, 1.0, self._rows(2))
+        self.assertEqual(agg.frames_per_architecture["pytorch"], 5)
+        self.assertEqual(len(agg.timeline()), 5)
+
+    def test_timeline_segments(self):
+        agg = DistributionAggregator(segment_s=5.0, num_segments=1)
+        agg.add_frame(0.5, 1.0, self._rows(1))
+        agg.add_frame(4.0, 1.0, self._rows(1))
+        agg.add_frame(11.0, 1.0, self._rows(7))      # el segmento [5, 10) queda vacío
+
+        timeline = agg.timeline()
+        self.assertEqual([(s["start_s"], s["end_s"], s["frames"]) for s in timeline], [(0.0, 5.0, 2), (10.0, 15.0, 1)])
+        self.assertEqual(timeline[0]["mobile"]["breed_en"], self.service.label_table_355.breed_en[1])
+        self.assertEqual(timeline[1]["keras"]["breed_en"], self.service.label_table_120.breed_en[7])
+
+    def test_result_with_partial_architectures(self):
+        agg = DistributionAggregator()
+        self.assertFalse(agg.result()["success"])
+
+        # Modo adaptive: en este frame solo se ejecutó MobileNetV2
+        agg.add_frame(0.0, 1.0, {"mobile": _row(self.service, "mobile", 4)})
+        result = agg.result()
+        self.assertTrue(result["success"])
+        self.assertEqual(result["mobile"][0]["breed_en"], self.service.label_table_355.breed_en[4])
+        self.assertEqual(result["keras"], [])
+        self.assertEqual(result["frames_per_architecture"], {"mobile": 1, "keras": 0, "pytorch": 0})
+        self.assertIsNone(result["timeline"][0]["pytorch"])
+
+
+class EarlyStopTest(unittest.TestCase):
+    """VideoAnalyzer con early_stop sobre filas de probabilidades sintéticas."""
+
+    def setUp(self):
+        self.service = _service()
+        patcher = mock.patch.object(video_analysis, "prediction_service", self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _analyze(self, frames: int, row_for, dog=lambda i: True, **kwargs):
+        """row_for(i) -> (leader, second) del frame i; dog(i) indica si el frame tiene perro."""
+
+        def detect(images):
+            return [(0.9, [0, 0, 8, 8]) if dog(int(img[0, 0, 0])) else None for img in images]
+
+        def classify(images, boxes, mode):
+            out = {}
+            for arch in ARCHITECTURES:
+                rows = [_row(self.service, arch, *row_for(int(img[0, 0, 0]))) for img in images]
+                out[arch] = {"rows": list(range(len(images))), "probs": np.stack(rows)}
+            return out
+
+        self.service.detect_dog_boxes = detect
+        self.service.classify_probs = classify
+        analyzer = VideoAnalyzer(
+            None, batch_size=1, early_stop=True, min_frames=5, stable_frames=3, min_margin=0.15,
+            source=_FakeSource(frames), **kwargs
+        )
+        return analyzer.run()
+
+    def test_stops_when_leader_is_stable(self):
+        result = self._analyze(30, lambda i: (3, 5))
+
+        self.assertEqual(result["stop_reason"], "converged")
+        self.assertEqual(result["converged_at_frame"], 5)
+        self.assertEqual(result["frames_analyzed"], 5)
+        report = result["convergence"]["mobile"]
+        self.assertEqual(report["leader"], self.service.label_table_355.breed_en[3])
+        self.assertEqual(report["stable_frames"], 5)
+        self.assertAlmostEqual(report["margin"], 0.7, places=3)
+        self.assertEqual(result["timeline"][0]["frames"], 5)
+
+    def test_alternating_leader_does_not_converge(self):
+        result = self._analyze(12, lambda i: (3, 5) if i % 2 else (5, 3))
+
+        self.assertEqual(result["stop_reason"], "end_of_video")
+        self.assertIsNone(result["converged_at_frame"])
+        self.assertEqual(result["frames_analyzed"], 12)
+        self.assertLess(result["convergence"]["keras"]["margin_lower_bound"], 0.15)
+
+    def test_frames_without_dog_do_not_count(self):
+        result = self._analyze(30, lambda i: (3, 5), dog=lambda i: i % 2 == 0)
+
+        # Se necesitan 5 frames con perro: el 5º con perro es el frame 9 (índices 0, 2, 4, 6, 8)
+        self.assertEqual(result["stop_reason"], "converged")
+        self.assertEqual(result["converged_at_frame"], 9)
+        self.assertEqual(result["frames_per_architecture"]["mobile"], 5)
+        self.assertEqual(result["convergence"]["pytorch"]["stable_frames"], 5)
+
+    def test_leader_change_resets_streak(self):
+        # 4 frames con líder 5 y después siempre 3: la media cambia de líder en el 8º frame
+        result = self._analyze(40, lambda i: (5, 3) if i < 4 else (3,))
+
+        self.assertEqual(result["stop_reason"], "converged")
+        self.assertEqual(result["convergence"]["mobile"]["leader"], self.service.label_table_355.breed_en[3])
+        self.assertGreater(result["converged_at_frame"], 8)
+        # La racha cuenta desde el frame en que 3 pasó a ser líder
+        self.assertEqual(result["convergence"]["mobile"]["stable_frames"], result["converged_at_frame"] - 7)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from app.services import video_jobs
+from app.services.inference_executor import InferenceExecutor
+
+
+class VideoJobAdmissionTest(unittest.TestCase):
+    """Los trabajos de video analizan dentro del executor de inferencia compartido (clase "video")."""
+
+    def setUp(self):
+        self.jobs_dir = tempfile.mkdtemp()
+        self.executor = InferenceExecutor(max_workers=1, max_queue_depth=0, max_wait_s=10.0)
+        self.release = threading.Event()
+        self.analyzed = threading.Event()
+
+        def fake_analyze(video_path, on_progress=None, cancel_event=None, **params):
+            self.analyzed.set()
+            return {"success": True, "stop_reason": "end_of_video"}
+
+        for patcher in (
+            mock.patch.object(video_jobs, "inference_executor", self.executor),
+            mock.patch.object(video_jobs, "analyze_video", fake_analyze),
+            mock.patch.object(video_jobs.prediction_service, "ensure_loaded"),
+            mock.patch.object(video_jobs.VideoJobManager, "ADMISSION_RETRY_S", 0.05),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.manager = video_jobs.VideoJobManager(self.jobs_dir, max_workers=1, max_queue=2)
+        self.manager.start()
+
+    def tearDown(self):
+        self.release.set()
+        self.manager.shutdown()
+        self.executor.shutdown()
+        shutil.rmtree(self.jobs_dir, ignore_errors=True)
+
+    def _wait_status(self, job_id: str, status: str, timeout: float = 5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.manager.get(job_id)["status"] == status:
+                return
+            time.sleep(0.01)
+        self.fail(f"El trabajo no llegó a {status}: {self.manager.get(job_id)['status']}")
+
+    def test_job_waits_for_saturated_executor(self):
+        self.executor.submit(self.release.wait, job_class="photo")   # ocupa el único hilo
+        job = self.manager.submit(self.manager.new_job_dir(), None, {"video_id": "0" * 32})
+
+        self.assertFalse(self.analyzed.wait(0.2))
+        self._wait_status(job.id, "running")
+
+        self.release.set()
+        self._wait_status(job.id, "completed")
+        self.assertIsNotNone(self.executor.stats()["avg_service_s"]["video"])
+
+    def test_cancel_while_waiting_for_admission(self):
+        self.executor.submit(self.release.wait, job_class="photo")
+        job = self.manager.submit(self.manager.new_job_dir(), None, {"video_id": "0" * 32})
+        self._wait_status(job.id, "running")
+
+        self.manager.cancel(job.id)
+        self._wait_status(job.id, "cancelled")
+        self.assertFalse(self.analyzed.is_set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services import video_analysis
+from app.services.prediction_service import PredictionService
+
+
+def _write_video(path: str, frames: int = 30, fps: int = 10, size=(320, 240)):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    for i in range(frames):
+        frame = np.full((size[1], size[0], 3), (i * 7) % 255, dtype=np.uint8)
+        cv2.rectangle(frame, (60, 40), (220, 200), (40, 120, 200), -1)
+        writer.write(frame)
+    writer.release()
+
+
+class VideoAnalyzerWorkerPoolTest(unittest.TestCase):
+    """VideoAnalyzer con INFERENCE_WORKERS > 0: detección y clasificación en un proceso worker."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.video_path = os.path.join(cls.tmp_dir, "clip.mp4")
+        _write_video(cls.video_path)
+
+        cls.settings_patch = mock.patch.multiple(
+            settings, INFERENCE_WORKERS=1, INFERENCE_WORKER_PIN_CORES=False, INFERENCE_WORKER_START_TIMEOUT_S=300
+        )
+        cls.settings_patch.start()
+        cls.service = PredictionService(load_on_init=False)
+        cls.service.ensure_loaded()
+        if cls.service.worker_pool is None:
+            cls.tearDownClass()
+            raise unittest.SkipTest("Los workers de inferencia no arrancaron")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.service.shutdown()
+        cls.settings_patch.stop()
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def test_analyze_video_through_worker_pool(self):
+        with mock.patch.object(video_analysis, "prediction_service", self.service):
+            result = video_analysis.VideoAnalyzer(self.video_path, sample_fps=5, batch_size=4).run()
+
+        self.assertEqual(result["stop_reason"], "end_of_video")
+        self.assertEqual(result["frames_analyzed"], result["sampling"]["frames_sampled"])
+        self.assertGreater(result["frames_analyzed"], 0)
+        if result["success"]:
+            for arch in video_analysis.ARCHITECTURES:
+                for prediction in result[arch]:
+                    self.assertNotEqual(prediction["breed_en"], "Unknown")
+
+    def test_api_process_has_label_tables(self):
+        if not self.service.model_loaded:
+            self.skipTest("Workers en modo mock: no hay tablas de etiquetas que comprobar")
+        self.assertEqual(self.service.num_classes("mobile"), len(self.service.label_table_355.breed_en))
+        self.assertGreater(self.service.num_classes("mobile"), 1)
+        self.assertGreater(self.service.num_classes("keras"), 1)
+
+
+class LabelTablesTest(unittest.TestCase):
+
+    def test_load_labels_without_models(self):
+        service = PredictionService(load_on_init=False)
+        service._load_labels()
+        service.model_loaded = True
+
+        self.assertEqual(service.num_classes("mobile"), 355)
+        self.assertEqual(service.num_classes("pytorch"), 120)
+        probs = np.zeros(service.num_classes("keras"), dtype=np.float32)
+        probs[3] = 1.0
+        top = service.decode_probs("keras", probs, top_n=1)
+        self.assertEqual(top[0]["breed_en"], service.label_table_120.breed_en[3])
+
+
+if __name__ == "__main__":
+    unittest.main()